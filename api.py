@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import asyncio
+import contextvars
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+import requests
+from utils import (
+    make_client, search_video_content, search_across_videos, generate_chapters, generate_highlights,
+    generate_open_analysis, stream_open_analysis, get_or_create_snippet, get_video_url, create_supercut,
+    collect_time_ranges
+)
+from artifacts import ARTIFACT_QUOTA_BYTES, new_job_id, touch_artifact, disk_usage
+from scheduler import encode_context, get_scheduler_stats, PRIORITY_INTERACTIVE
+from encode_profiles import DEFAULT_PROFILE, get_encode_profile, get_encode_throughput
+from singleflight import get_single_flight_stats
+from semantic_cache import get_semantic_cache_stats
+from perf import get_perf_stats, render_prometheus
+from tracing import span, SPAN_KIND_SERVER
+from cancellation import CancelToken, OperationCancelled, cancel_scope
+
+# HTTP API over the same functions the Streamlit app uses.
+# Remote calls run in threads off the event loop, and identical concurrent requests
+# share one in-flight call. ffmpeg work (snippets, supercuts) goes to a bounded
+# worker pool and is polled as a job. With TWELVELABS_STUB set the service runs
+# against the offline stub client (see twelvelabs_stub.py).
+#
+#   uvicorn api:app --port 8000
+#
+# The application is built on first access of api.app (or with uvicorn --factory
+# api:create_app), so importing this module never creates a client.
+
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+JOB_TTL_SECONDS = 3600
+
+
+class SearchRequest(BaseModel):
+    query: str
+    video_id: Optional[str] = None
+    video_ids: Optional[List[str]] = None  # Fan out over these videos when no video_id is given
+    max_results: int = 5
+    search_mode: Literal["auto", "transcript", "remote"] = "auto"
+
+
+class AnalysisRequest(BaseModel):
+    prompt: str
+    temperature: float = 0.3
+
+
+class SnippetRequest(BaseModel):
+    start_time: float
+    end_time: float
+    title: str = "snippet"
+    snippet_type: str = "analysis"
+    profile: Optional[str] = None
+
+
+class SupercutRequest(BaseModel):
+    items: List[dict]  # Chapters, highlights or search hits (start_sec/end_sec or start_time/end_time)
+    title: str = "supercut"
+    profile: Optional[str] = None
+
+
+def _jsonable(value):
+    # Search metadata can hold SDK objects; store them by their string form as the caches do
+    return json.loads(json.dumps(value, default=str))
+
+
+class Coalescer:
+    """
+    Single-flight for the event loop: while a call with a given key is running,
+    identical requests await the same result instead of issuing their own.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    async def run(self, key, fn, *args, **kwargs):
+        self.stats['calls'] += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        # Shield so a disconnected client does not cancel the call for everyone else
+        return await asyncio.shield(future)
+
+
+class JobPool:
+    """
+    Bounded pool for ffmpeg jobs. Identical pending jobs are merged and finished
+    jobs are kept for JOB_TTL_SECONDS so clients can poll for the result. Each job
+    runs under its own cancellation token, so cancel() stops it wherever it is.
+    """
+
+    def __init__(self, workers=API_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self._prune()
+            job_id = self._by_key.get(key)
+            if job_id and self._jobs[job_id]['status'] in ("queued", "running"):
+                return self._jobs[job_id]
+            job = {'job_id': new_job_id(), 'status': "queued", 'result': None, 'error': None,
+                   'created': time.time(), 'finished': None, 'cancel_token': CancelToken()}
+            self._jobs[job['job_id']] = job
+            self._by_key[key] = job['job_id']
+        # Carry the request's trace into the job, so its ffmpeg spans belong to the request
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job['status'] = "running"
+        try:
+            with encode_context("api", PRIORITY_INTERACTIVE), cancel_scope(job['cancel_token']) as token:
+                token.raise_if_cancelled()
+                job['result'] = fn(*args, **kwargs)
+            job['status'] = "done"
+        except OperationCancelled as e:
+            job['error'] = str(e)
+            job['status'] = "cancelled"
+        except Exception as e:
+            job['error'] = str(e)
+            job['status'] = "error"
+        job['finished'] = time.time()
+
+    def _prune(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished'] and now - job['finished'] > JOB_TTL_SECONDS]
+        for job_id in expired:
+            del self._jobs[job_id]
+        self._by_key = {key: job_id for key, job_id in self._by_key.items() if job_id in self._jobs}
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; its ffmpeg run is killed and partial output removed."""
+        job = self.get(job_id)
+        if job is not None and job['status'] in ("queued", "running"):
+            job['cancel_token'].cancel("cancelled by client")
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job['cancel_token'].cancel("server shutting down")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _root_cause(error):
+    while (error.__cause__ or error.__context__) is not None:
+        error = error.__cause__ or error.__context__
+    return error
+
+
+def is_client_error(error):
+    """
+    Whether an error was caused by the request itself (a ValueError from validation).
+
+    utils wraps failures in a plain Exception with a readable message, so the original
+    error at the bottom of the chain decides.
+    """
+    return isinstance(_root_cause(error), ValueError)
+
+
+def is_upstream_error(error):
+    """
+    Whether an error came from TwelveLabs or the network rather than from this service:
+    API errors (anything with a status_code) and network or timeout errors at the bottom
+    of the chain. Everything else, including failed ffmpeg runs, is an internal error.
+    """
+    error = _root_cause(error)
+    return (hasattr(error, "status_code")
+            or isinstance(error, (requests.RequestException, ConnectionError, TimeoutError)))
+
+
+def _job_view(job):
+    return _jsonable({key: job[key] for key in ('job_id', 'status', 'result', 'error')})
+
+
+def _make_snippet(client, video_id, request):
+    return get_or_create_snippet(video_id, request.start_time, request.end_time, request.title,
+                                 request.snippet_type, profile=request.profile, client=client)
+
+
+def _make_supercut(client, video_id, request, job_id):
+    video_url = get_video_url(video_id, client=client)
+    if not video_url:
+        raise Exception("Failed to get video URL for indexed video")
+    return create_supercut(video_url, request.items, request.title, job_id=job_id, profile=request.profile)
+
+
+def create_app(client=None, workers=API_WORKERS):
+    """
+    Build the API application.
+
+    Args:
+        client: TwelveLabs client (or a stand-in with the same methods); created from the environment if None
+        workers: Size of the ffmpeg job pool
+
+    Returns:
+        FastAPI application
+    """
+    jobs = JobPool(workers)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        jobs.shutdown()
+
+    app = FastAPI(title="Hack_Rice video API", lifespan=lifespan)
+    app.state.client = client or make_client()
+    app.state.coalescer = Coalescer()
+    app.state.jobs = jobs
+
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        with span(f"{request.method} {request.url.path}", SPAN_KIND_SERVER,
+                  **{'http.method': request.method, 'http.target': request.url.path}) as request_span:
+            response = await call_next(request)
+            if request_span:
+                request_span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    @app.exception_handler(ValueError)
+    async def bad_request(request: Request, exc: ValueError):
+        return JSONResponse(status_code=400, content={'detail': str(exc)})
+
+    @app.exception_handler(Exception)
+    async def server_error(request: Request, exc: Exception):
+        if is_client_error(exc):
+            status_code = 400
+        else:
+            status_code = 502 if is_upstream_error(exc) else 500
+        return JSONResponse(status_code=status_code, content={'detail': str(exc)})
+
+    async def coalesced(key, fn, *args, **kwargs):
+        return _jsonable(await app.state.coalescer.run(key, fn, *args, **kwargs))
+
+    @app.get("/health")
+    async def health():
+        return {'status': "ok"}
+
+    # Plain def: walking the artifact store blocks, so FastAPI runs this in its thread pool
+    @app.get("/stats")
+    def stats():
+        return _jsonable({
+            'artifacts': {'disk_usage_bytes': disk_usage(), 'quota_bytes': ARTIFACT_QUOTA_BYTES},
+            'coalescing': app.state.coalescer.stats,
+            'scheduler': get_scheduler_stats(),
+            'encode_throughput': get_encode_throughput(),
+            'single_flight': get_single_flight_stats(),
+            'semantic_cache': get_semantic_cache_stats(),
+            'perf': get_perf_stats()
+        })
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+    @app.post("/search")
+    async def search(request: SearchRequest):
+        client = app.state.client
+        if not request.video_id and request.video_ids:
+            video_ids = tuple(sorted(set(request.video_ids)))
+            return await coalesced(("search_across", request.query, video_ids, request.max_results),
+                                   search_across_videos, client, request.query, list(video_ids), request.max_results)
+        key = ("search", request.video_id, request.query, request.max_results, request.search_mode)
+        return await coalesced(key, search_video_content, client, request.video_id, request.query,
+                               request.max_results, search_mode=request.search_mode)
+
+    @app.get("/videos/{video_id}/chapters")
+    async def chapters(video_id: str, prompt: Optional[str] = None, temperature: float = 0.3):
+        return await coalesced(("chapters", video_id, prompt, temperature),
+                               generate_chapters, app.state.client, video_id, prompt, temperature)
+
+    @app.get("/videos/{video_id}/highlights")
+    async def highlights(video_id: str, prompt: Optional[str] = None, temperature: float = 0.3):
+        return await coalesced(("highlights", video_id, prompt, temperature),
+                               generate_highlights, app.state.client, video_id, prompt, temperature)
+
+    @app.post("/videos/{video_id}/analysis")
+    async def analysis(video_id: str, request: AnalysisRequest):
+        return await coalesced(("analysis", video_id, request.prompt, request.temperature),
+                               generate_open_analysis, app.state.client, video_id, request.prompt,
+                               request.temperature)
+
+    @app.post("/videos/{video_id}/analysis/stream")
+    def analysis_stream(video_id: str, request: AnalysisRequest):
+        def events():
+            # One JSON object per line; errors after the first byte can only be reported in-band
+            try:
+                for text in stream_open_analysis(app.state.client, video_id, request.prompt, request.temperature):
+                    yield json.dumps({'type': "text", 'text': text}) + "\n"
+                yield json.dumps({'type': "end"}) + "\n"
+            except Exception as e:
+                yield json.dumps({'type': "error", 'error': str(e)}) + "\n"
+
+        # Starlette iterates a sync generator in its thread pool, off the event loop
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @app.post("/videos/{video_id}/snippets", status_code=202)
+    async def create_snippet(video_id: str, request: SnippetRequest):
+        get_encode_profile(request.profile)  # Reject unknown profiles before queuing
+        if request.end_time <= request.start_time:
+            raise ValueError("end_time must be greater than start_time")
+        key = ("snippet", video_id, round(request.start_time, 3), round(request.end_time, 3),
+               request.profile or DEFAULT_PROFILE)
+        return _job_view(app.state.jobs.submit(key, _make_snippet, app.state.client, video_id, request))
+
+    @app.post("/videos/{video_id}/supercut", status_code=202)
+    async def supercut(video_id: str, request: SupercutRequest):
+        get_encode_profile(request.profile)
+        # Reject unusable items now rather than in a job that fails later
+        if not collect_time_ranges(request.items):
+            raise ValueError("No time ranges given for the export")
+        key = ("supercut", video_id, json.dumps(request.items, sort_keys=True, default=str),
+               request.profile or DEFAULT_PROFILE)
+        return _job_view(app.state.jobs.submit(key, _make_supercut, app.state.client, video_id, request, new_job_id()))
+
+    @app.get("/jobs/{job_id}")
+    async def job_status(job_id: str):
+        job = app.state.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return _job_view(job)
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        job = app.state.jobs.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return _job_view(job)
+
+    @app.get("/jobs/{job_id}/file")
+    async def job_file(job_id: str):
+        job = app.state.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        if job['status'] != "done":
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+        path = job['result']['path']
+        if not os.path.exists(path):
+            raise HTTPException(status_code=410, detail="Output was evicted from the artifact store")
+        touch_artifact(path)
+        return FileResponse(path, media_type="video/mp4",
+                            filename=job['result'].get('download_name') or os.path.basename(path))
+
+    return app
+
+
+_app = None
+
+
+def __getattr__(name):
+    # Module-level `app` for "uvicorn api:app", created on first access
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
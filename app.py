@@ -1,21 +1,34 @@
 import streamlit as st
 import tempfile
 import os
-from twelvelabs import TwelveLabs
+import html
+import threading
+from contextlib import contextmanager
 
 # Try to import utils and handle configuration errors
 try:
     from utils import (
-        API_KEY, process_video, fetch_existing_videos,
+        make_client, process_video, fetch_existing_videos,
         get_video_url, get_hls_player_html, generate_timestamps,
         download_video_segment, create_video_segments,
-        search_video_content, create_qa_video_snippet, 
+        search_video_content,
         format_qa_results, format_qa_results_with_summary,
         get_video_qa_capabilities, seconds_to_mmss,
         generate_summary, generate_chapters, generate_highlights,
-        generate_open_analysis, create_analysis_video_snippet,
-        create_hls_snippet_alternative
+        generate_open_analysis, get_or_create_snippet, get_cached_snippet,
+        stream_qa_snippets, merge_search_segments, create_qa_highlight_reel,
+        create_supercut, search_across_videos, SNIPPET_CACHE_DIR
     )
+    from artifacts import JOBS_DIR, new_job_id
+    from scheduler import encode_context, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+    from ffmpeg_runner import ffmpeg_progress
+    from encode_profiles import ENCODE_PROFILES, get_encode_throughput
+    from semantic_cache import rerank_segments, add_context_texts
+    from thumbnails import build_thumbnail_sprite, crop_thumbnail
+    from file_server import start_file_server, get_file_url, public_base_url
+    from perf import timed, instrument, get_perf_stats, render_prometheus
+    from tracing import span
+    from cancellation import CancelToken, cancel_scope
 except ValueError as e:
     st.error(f"Configuration Error: {str(e)}")
     st.stop()
@@ -25,6 +38,9 @@ except Exception as e:
 
 import uuid 
 
+# Optional sidebar with timings, remote calls, bytes and cache hit rates
+PERF_PANEL = os.getenv("PERF_PANEL", "0") == "1"
+
 # Set up the Streamlit page configuration
 st.set_page_config(page_title="YouTube Chapter Timestamp Generator", layout="wide")
 
@@ -64,6 +80,8 @@ if 'qa_results' not in st.session_state:
     st.session_state.qa_results = []
 if 'qa_snippets' not in st.session_state:
     st.session_state.qa_snippets = []
+if 'qa_query' not in st.session_state:
+    st.session_state.qa_query = ""
 if 'chapters_result' not in st.session_state:
     st.session_state.chapters_result = None
 if 'highlights_result' not in st.session_state:
@@ -72,6 +90,127 @@ if 'chapter_snippets' not in st.session_state:
     st.session_state.chapter_snippets = []
 if 'highlight_snippets' not in st.session_state:
     st.session_state.highlight_snippets = []
+if 'opened_snippets' not in st.session_state:
+    st.session_state.opened_snippets = {}
+if 'player_seek' not in st.session_state:
+    # Where the shared player should start: {'video_id', 'time', 'count'}
+    st.session_state.player_seek = None
+if 'job_id' not in st.session_state:
+    # Every session writes into its own artifact directory
+    st.session_state.job_id = new_job_id()
+
+
+# Generated media is served by URL from disk, so reruns never re-read file bytes.
+# A session's URLs only reach its own job directory and the shared snippet cache.
+start_file_server({'job': os.path.join(JOBS_DIR, "{scope}"), 'snippets': SNIPPET_CACHE_DIR})
+
+
+def file_base_url():
+    """Base URL of the media file server as seen by this session's browser, or None."""
+    try:
+        request_host = st.context.headers.get("Host")
+    except Exception:
+        request_host = None
+    return public_base_url(request_host)
+
+
+def session_closed_check():
+    """
+    Cancellation check that fires once the browser session of this rerun is gone,
+    or None when the Streamlit runtime is not available (e.g. under AppTest).
+    """
+    try:
+        from streamlit.runtime import Runtime
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        session_id = get_script_run_ctx().session_id
+        runtime = Runtime.instance()
+    except Exception:
+        return None
+    return lambda: None if runtime.is_active_session(session_id) else "browser session closed"
+
+
+def display_video_file(file_name):
+    """Play a local video, by URL when the file endpoint can serve it."""
+    st.video(get_file_url(file_name, st.session_state.job_id, base_url=file_base_url()) or file_name)
+
+
+def display_file_download(file_name, label, download_name, key, help=None):
+    """Offer a local file for download without loading it into the script when possible."""
+    file_url = get_file_url(file_name, st.session_state.job_id, download_name=download_name,
+                            base_url=file_base_url())
+    if file_url:
+        st.markdown(
+            f'<a href="{file_url}" download="{html.escape(download_name)}" title="{html.escape(help or "")}" '
+            f'target="_blank">{html.escape(label)}</a>',
+            unsafe_allow_html=True
+        )
+        return
+    
+    # Fallback: file is outside the served roots, hand the bytes to Streamlit
+    with open(file_name, "rb") as file:
+        file_contents = file.read()
+    st.download_button(
+        label=label,
+        data=file_contents,
+        file_name=download_name,
+        mime="video/mp4",
+        key=key,
+        help=help
+    )
+
+
+def encode_profile_selector(label, key, default):
+    """Selectbox for an encode profile, with the speed measured in this process as help text."""
+    throughput = get_encode_throughput()
+    measured = [
+        f"{name}: {stats['speed']:.1f}x realtime over {stats['runs']} encode(s)"
+        for name, stats in throughput.items()
+    ]
+    names = list(ENCODE_PROFILES)
+    return st.selectbox(
+        label,
+        names,
+        index=names.index(default),
+        format_func=lambda name: ENCODE_PROFILES[name]['label'],
+        key=key,
+        help="Measured speed: " + ("; ".join(measured) if measured else "no encodes yet")
+    )
+
+
+@contextmanager
+def ffmpeg_progress_bar(label):
+    """Progress bar (percent, fps, speed, ETA) for the ffmpeg runs inside the block; removed afterwards."""
+    bar = st.progress(0.0, text=label)
+
+    def update(progress):
+        details = [f"{progress['fps']:.0f} fps"]
+        if progress['speed']:
+            details.append(f"{progress['speed']:.1f}x realtime")
+        if progress['eta_seconds'] is not None:
+            details.append(f"about {progress['eta_seconds']:.0f}s left")
+        bar.progress((progress['percent'] or 0.0) / 100, text=f"{label} ({', '.join(details)})")
+
+    try:
+        with ffmpeg_progress(update):
+            yield
+    finally:
+        bar.empty()
+
+
+def load_thumbnail_sprite(items, start_key, end_key, kind):
+    """Build (or load from cache) one sprite sheet of mid-range keyframes for a list of items."""
+    if not st.session_state.video_url or not items:
+        return None
+    try:
+        times = [(item[start_key] + item[end_key]) / 2 for item in items]
+        return build_thumbnail_sprite(
+            st.session_state.video_url,
+            times,
+            cache_key=f"{st.session_state.video_id}:{kind}"
+        )
+    except Exception as e:
+        st.caption(f"Thumbnails not available: {str(e)}")
+        return None
 
 
 def display_qa_snippet(file_name, query, snippet_info, snippet_index):
@@ -83,24 +222,16 @@ def display_qa_snippet(file_name, query, snippet_info, snippet_index):
         if snippet_info.get('text'):
             st.write(f"💬 **Content Preview:** {snippet_info['text'][:150]}...")
         
-        st.video(file_name)
-        
-        with open(file_name, "rb") as file:
-            file_contents = file.read()
+        display_video_file(file_name)
         
         unique_key = f"download_qa_{snippet_index}_{uuid.uuid4()}"
-        st.download_button(
-            label=f"Download QA Snippet",
-            data=file_contents,
-            file_name=file_name,
-            mime="video/mp4",
-            key=unique_key
-        )
+        display_file_download(file_name, "Download QA Snippet", os.path.basename(file_name), unique_key)
         st.markdown("---")
     else:
         st.warning(f"QA snippet file {file_name} not found.")
 
 
+@instrument
 def process_qa_search():
     """Process QA search and create video snippets."""
     
@@ -123,10 +254,31 @@ def process_qa_search():
         elif search_scope == "All videos in index":
             st.info("🌐 Searching across all videos in your TwelveLabs index")
     
+    # Cross-video options: a cap per video, and optionally only a chosen subset of the catalog
+    fanout_video_ids = None
+    per_video_k = 3
+    if search_scope == "All videos in index":
+        col_subset, col_per_video = st.columns([2, 1])
+        with col_per_video:
+            per_video_k = st.number_input("Max hits per video:", min_value=1, max_value=10, value=3, key="qa_per_video_k")
+        with col_subset:
+            if st.checkbox("Only search selected videos", key="qa_limit_videos"):
+                if 'video_catalog' not in st.session_state:
+                    try:
+                        st.session_state.video_catalog = {
+                            f"{video.system_metadata.filename} ({video.id})": video.id
+                            for video in fetch_existing_videos()
+                        }
+                    except Exception as e:
+                        st.warning(str(e))
+                        st.session_state.video_catalog = {}
+                chosen = st.multiselect("Videos:", list(st.session_state.video_catalog), key="qa_fanout_videos")
+                fanout_video_ids = [st.session_state.video_catalog[name] for name in chosen] or None
+    
     # Check search readiness for current video (if applicable)
     if search_scope == "Current video only":
         try:
-            client = TwelveLabs(api_key=API_KEY)
+            client = make_client()
             capabilities = get_video_qa_capabilities(client, st.session_state.video_id)
             
             if capabilities['ready_for_search']:
@@ -179,12 +331,29 @@ def process_qa_search():
         else:
             st.info("⚡ Fast search with basic content preview")
     
+    # Q&A snippets are for quick review, so they default to the fastest profile
+    qa_profile = encode_profile_selector("Snippet quality:", "qa_encode_profile", "preview")
+    
+    search_sources = {
+        "Auto": "auto",
+        "Transcript only (keywords, \"exact phrase\")": "transcript",
+        "Visual & audio search": "remote"
+    }
+    search_source = st.selectbox(
+        "Search source:",
+        list(search_sources),
+        key="qa_search_source",
+        disabled=not capabilities['ready_for_search'],
+        help="Auto answers keyword and quoted-phrase queries about the current video from its transcript, "
+             "and uses TwelveLabs search for visual or descriptive questions"
+    )
+    
     search_disabled = not capabilities['ready_for_search'] or not query
         
     if query and st.button("Search Video(s)", key="search_qa_button", disabled=search_disabled):
         try:
             with st.spinner("Searching video content and generating analysis..."):
-                client = TwelveLabs(api_key=API_KEY)
+                client = make_client()
                 
                 # Determine video_id based on search scope
                 target_video_id = st.session_state.video_id if search_scope == "Current video only" else None
@@ -198,17 +367,33 @@ def process_qa_search():
                         return
                 
                 # Search for relevant segments
-                search_results = search_video_content(client, target_video_id, query, max_results)
+                if search_scope == "All videos in index":
+                    search_results = search_across_videos(client, query, video_ids=fanout_video_ids,
+                                                          max_results=max_results, per_video_k=per_video_k)
+                else:
+                    search_results = search_video_content(client, target_video_id, query, max_results,
+                                                          search_mode=search_sources[search_source])
                 
                 if not search_results:
                     search_scope_text = "the current video" if search_scope == "Current video only" else "any videos in your index"
                     st.info(f"No relevant segments found for: '{query}' in {search_scope_text}")
                     return
                 
+                if all(segment.get('source') == 'transcript' for segment in search_results):
+                    st.caption("📝 Answered from the local transcript index")
+                elif search_results[0].get('cached_from'):
+                    st.caption(f"⚡ Answered from cache (same meaning as '{search_results[0]['cached_from']}')")
+                
+                # Re-rank with this video's chapter/highlight text when we have it
+                if search_scope == "Current video only":
+                    search_results = rerank_segments(query, search_results, analysis_context_items())
+                
                 st.session_state.qa_results = search_results
+                st.session_state.qa_query = query
                 
                 # Display search results based on analysis mode
-                scope_text = "current video" if search_scope == "Current video only" else "index"
+                scope_text = "current video" if search_scope == "Current video only" else \
+                    f"{len({segment['video_id'] for segment in search_results})} video(s)"
                 st.success(f"Found {len(search_results)} relevant segments in {scope_text}!")
                 
                 # Choose formatting based on analysis mode
@@ -221,42 +406,124 @@ def process_qa_search():
                 
                 st.markdown(formatted_results)
                 
+                # Keyframe previews of the hits, all from one sprite sheet
+                if search_scope == "Current video only":
+                    hits_sprite = load_thumbnail_sprite(search_results, 'start_time', 'end_time', f"search:{query}")
+                    if hits_sprite:
+                        st.image(
+                            [crop_thumbnail(hits_sprite, i) for i in range(len(search_results))],
+                            caption=[f"Result {i}: {seconds_to_mmss(segment['start_time'])}" for i, segment in enumerate(search_results, 1)]
+                        )
+                
                 # Show additional analysis options
                 if analysis_mode in ["Enhanced Analysis", "With Video Summary"]:
                     st.info("✨ Enhanced analysis powered by TwelveLabs multimodal understanding")
                 
-                # Option to create video snippets
                 # Note: Can only create snippets if we have video URLs
-                if search_scope == "Current video only" and st.session_state.video_url:
-                    if st.button("Create Video Snippets", key="create_qa_snippets_button"):
-                        create_qa_snippets(query, search_results)
-                elif search_scope == "Current video only" and not st.session_state.video_url:
+                if search_scope == "Current video only" and not st.session_state.video_url:
                     st.info("Video snippets require streaming URL. Try refreshing the video URL first.")
                 elif search_scope == "All videos in index":
                     st.info("💡 To create video snippets, search within a specific video that has streaming enabled.")
                     
         except Exception as e:
             st.error(f"Error during search: {str(e)}")
-def create_qa_snippets(query, search_results):
-    """Create video snippets from search results."""
+    
+    # Option to create video snippets; kept outside the search branch so the click survives its rerun
+    current_hits = [
+        segment for segment in st.session_state.qa_results
+        if segment['video_id'] == st.session_state.video_id
+    ]
+    if search_scope == "Current video only" and st.session_state.video_url and current_hits:
+        col_merge, col_gap = st.columns([1, 2])
+        with col_merge:
+            merge_hits = st.checkbox("Merge overlapping hits", value=True, key="merge_qa_hits",
+                                     help="Overlapping or nearby hits become one snippet, so no second is encoded twice")
+        with col_gap:
+            gap_tolerance = st.slider("Merge hits closer than (seconds):", 0.0, 10.0, 2.0, 0.5,
+                                      key="qa_gap_tolerance", disabled=not merge_hits)
+        if merge_hits:
+            current_hits = merge_search_segments(current_hits, gap_tolerance=gap_tolerance)
+            st.caption(f"{len(current_hits)} segment(s) after merging")
+        
+        col_snippets, col_reel = st.columns([1, 1])
+        with col_snippets:
+            create_clicked = st.button("Create Video Snippets", key="create_qa_snippets_button")
+        with col_reel:
+            reel_clicked = st.button("🎞️ Create Highlight Reel", key="create_qa_reel_button",
+                                     help="All segments in playback order, as one video from a single encode")
+        if reel_clicked:
+            create_qa_reel(st.session_state.qa_query, current_hits, qa_profile)
+        if create_clicked:
+            return create_qa_snippets(st.session_state.qa_query, current_hits, qa_profile)
+    return False
+
+
+@instrument
+def create_qa_reel(query, segments, profile=None):
+    """Create and show one highlight reel of all search hits for the current video."""
     try:
-        with st.spinner("Creating video snippets..."):
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            st.session_state.qa_snippets = []  # Reset QA snippets
-            
-            for i, segment in enumerate(search_results, 1):
-                status_text.text(f"Creating snippet {i}/{len(search_results)}...")
+        with ffmpeg_progress_bar("Creating highlight reel..."), \
+                encode_context(st.session_state.job_id, PRIORITY_INTERACTIVE):
+            reel_file = create_qa_highlight_reel(
+                st.session_state.video_url,
+                segments,
+                query,
+                job_id=st.session_state.job_id,
+                profile=profile
+            )
+        st.write(f"### 🎞️ Highlight reel: {query}")
+        display_video_file(reel_file)
+        display_file_download(reel_file, "Download Highlight Reel", os.path.basename(reel_file),
+                              key=f"download_qa_reel_{uuid.uuid4()}")
+    except Exception as e:
+        st.error(f"Error creating highlight reel: {str(e)}")
+
+
+def analysis_context_items():
+    """Chapters and highlights generated for the current video, as context for re-ranking."""
+    items = []
+    for result, key in ((st.session_state.chapters_result, 'chapters'), (st.session_state.highlights_result, 'highlights')):
+        if result and result.get('video_id') == st.session_state.video_id:
+            items += result[key]
+    return items
+
+
+@instrument
+def create_qa_snippets(query, search_results, profile=None):
+    """
+    Create video snippets from search results, showing each one as soon as it is ready.
+    
+    Returns:
+        True if the snippets were displayed here (so the caller does not list them again)
+    """
+    cancel_event = threading.Event()
+    st.session_state.qa_snippets = []  # Reset QA snippets
+    
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    # The callback runs before the rerun the click triggers, so no new cuts start after it
+    st.button("⏹ Stop creating snippets", key="stop_qa_snippets_button", on_click=cancel_event.set)
+    
+    snippets = stream_qa_snippets(
+        st.session_state.video_url,
+        search_results,
+        query,
+        job_id=st.session_state.job_id,
+        profile=profile,
+        cancel_event=cancel_event
+    )
+    try:
+        # Bulk work: queued behind interactive snippet requests from any session
+        with encode_context(st.session_state.job_id, PRIORITY_BATCH):
+            status_text.text(f"Creating {len(search_results)} snippets...")
+            for done, result in enumerate(snippets, 1):
+                segment = result['segment']
+                progress_bar.progress(done / len(search_results))
+                status_text.text(f"Finished {done}/{len(search_results)} snippets...")
                 
-                # Create video snippet
-                snippet_file = create_qa_video_snippet(
-                    st.session_state.video_url,
-                    segment['start_time'],
-                    segment['end_time'],
-                    query,
-                    i
-                )
+                if result['error']:
+                    st.warning(f"Could not create snippet {result['index']}: {result['error']}")
+                    continue
                 
                 # Prepare snippet info for display
                 snippet_info = {
@@ -267,18 +534,184 @@ def create_qa_snippets(query, search_results):
                     'text': segment.get('text', '')
                 }
                 
-                st.session_state.qa_snippets.append((snippet_file, query, snippet_info))
-                
-                progress = i / len(search_results)
-                progress_bar.progress(progress)
+                st.session_state.qa_snippets.append((result['path'], query, snippet_info))
+                display_qa_snippet(result['path'], query, snippet_info, result['index'] - 1)
             
+        if cancel_event.is_set() and len(st.session_state.qa_snippets) < len(search_results):
+            status_text.text(f"Stopped after {len(st.session_state.qa_snippets)} snippets.")
+        else:
             progress_bar.progress(1.0)
             status_text.text("All QA snippets created!")
             
     except Exception as e:
         st.error(f"Error creating QA snippets: {str(e)}")
+    finally:
+        snippets.close()
+    return True
+
+
+def display_analysis_items(snippet_type, items, created_snippets, profile=None):
+    """
+    Display chapters or highlights with metadata and a keyframe thumbnail each.
+    Playback goes through the shared player; a snippet is only rendered on first play or download.
+    """
+    icon = "📖" if snippet_type == "chapter" else "⭐"
+    label = snippet_type.capitalize()
+    thumbnail_sprite = load_thumbnail_sprite(items, 'start_sec', 'end_sec', f"{snippet_type}s")
+    
+    for index, item in enumerate(items):
+        start_time = seconds_to_mmss(item['start_sec'])
+        end_time = seconds_to_mmss(item['end_sec'])
+        duration = item['end_sec'] - item['start_sec']
+        
+        st.markdown(f"### {icon} {label} {item['number']}: {item['title']}")
+        st.write(f"**⏰ Time:** {start_time} - {end_time} ({duration:.1f}s)")
+        if item.get('summary'):
+            st.write(f"**📝 Summary:** {item['summary']}")
+        
+        col_video, col_download = st.columns([2, 1])
+        
+        # Key on the range itself so regenerated chapters/highlights never reuse stale entries
+        snippet_key = f"{st.session_state.video_id}:{snippet_type}:{item['start_sec']}:{item['end_sec']}:{profile}"
+        
+        with col_download:
+            # A range another session already rendered is shown right away
+            if snippet_key not in st.session_state.opened_snippets:
+                cached_snippet = get_cached_snippet(st.session_state.video_id, item['start_sec'], item['end_sec'],
+                                                    item['title'], snippet_type=snippet_type, profile=profile)
+                if cached_snippet:
+                    st.session_state.opened_snippets[snippet_key] = cached_snippet
+            # Snippets are rendered lazily: nothing is cut until the first play or download request
+            if snippet_key not in st.session_state.opened_snippets and st.button(
+                "🎬 Play / Download Snippet",
+                key=f"open_{snippet_type}_{item['number']}",
+                help=f"Render {label} {item['number']} as an MP4 (cached after the first time)",
+                disabled=not st.session_state.video_url
+            ):
+                try:
+                    with ffmpeg_progress_bar(f"Rendering {snippet_type} snippet..."), \
+                            encode_context(st.session_state.job_id, PRIORITY_INTERACTIVE):
+                        snippet = get_or_create_snippet(
+                            st.session_state.video_id,
+                            item['start_sec'],
+                            item['end_sec'],
+                            item['title'],
+                            snippet_type=snippet_type,
+                            profile=profile,
+                            video_url=st.session_state.video_url
+                        )
+                    st.session_state.opened_snippets[snippet_key] = snippet
+                    created_snippets.append({
+                        'filename': snippet['path'],
+                        'title': item['title'],
+                        f"{snippet_type}_number": item['number']
+                    })
+                except Exception as e:
+                    st.warning(f"Could not create snippet: {str(e)}")
+            
+            snippet = st.session_state.opened_snippets.get(snippet_key)
+            if snippet and os.path.exists(snippet['path']):
+                display_file_download(
+                    snippet['path'],
+                    "⬇️ Download",
+                    snippet['download_name'],
+                    key=f"download_{snippet_type}_{item['number']}",
+                    help=f"Download {label} {item['number']} snippet"
+                )
+        
+        # Filled after the button so a freshly rendered snippet plays in this same run
+        with col_video:
+            if snippet and os.path.exists(snippet['path']):
+                display_video_file(snippet['path'])
+            else:
+                if thumbnail_sprite:
+                    st.image(crop_thumbnail(thumbnail_sprite, index))
+                if st.button(f"▶️ Jump to {start_time}", key=f"seek_{snippet_type}_{item['number']}",
+                             help=f"Play {label} {item['number']} in the video player"):
+                    seek_player(item['start_sec'])
+        
+        st.markdown("---")
 
 
+def display_supercut_export():
+    """Export any mix of chapters, highlights and Q&A hits of the current video as one video."""
+    sources = {}
+    if st.session_state.chapters_result:
+        sources["Chapters"] = st.session_state.chapters_result['chapters']
+    if st.session_state.highlights_result:
+        sources["Highlights"] = st.session_state.highlights_result['highlights']
+    current_hits = [
+        segment for segment in st.session_state.qa_results
+        if segment['video_id'] == st.session_state.video_id
+    ]
+    if current_hits:
+        sources["Q&A hits"] = current_hits
+    if not sources or not st.session_state.video_url:
+        return
+    
+    st.subheader("🎞️ Export Supercut")
+    selected = st.multiselect("Include:", list(sources), default=list(sources)[:1], key="supercut_sources")
+    profile = encode_profile_selector("Export quality:", "supercut_encode_profile", "share")
+    
+    if st.button("Export as one video", key="export_supercut_btn", disabled=not selected):
+        try:
+            with ffmpeg_progress_bar("Exporting supercut..."), \
+                    encode_context(st.session_state.job_id, PRIORITY_INTERACTIVE):
+                export = create_supercut(
+                    st.session_state.video_url,
+                    [item for name in selected for item in sources[name]],
+                    " ".join(selected),
+                    job_id=st.session_state.job_id,
+                    profile=profile
+                )
+            mode_text = "stream-copied, no re-encode" if export['mode'] == 'copy' else "encoded in a single pass"
+            st.success(f"Exported {len(export['ranges'])} range(s) ({mode_text})")
+            display_video_file(export['path'])
+            display_file_download(export['path'], "⬇️ Download Supercut", os.path.basename(export['path']),
+                                  key=f"download_supercut_{uuid.uuid4()}")
+        except Exception as e:
+            st.error(f"Error exporting supercut: {str(e)}")
+
+
+def seek_player(seconds):
+    """Re-render the shared player at the given position of the current video."""
+    previous = st.session_state.player_seek
+    st.session_state.player_seek = {
+        'video_id': st.session_state.video_id,
+        'time': seconds,
+        'count': previous['count'] + 1 if previous else 1
+    }
+
+
+def display_shared_player():
+    """Render the one video player for the page, with chapters, highlights and Q&A hits as seek markers."""
+    if not st.session_state.video_url:
+        return
+    
+    markers = []
+    if st.session_state.chapters_result:
+        for chapter in st.session_state.chapters_result['chapters']:
+            markers.append({'time': chapter['start_sec'], 'label': f"📖 {chapter['chapter_title']}"})
+    if st.session_state.highlights_result:
+        for highlight in st.session_state.highlights_result['highlights']:
+            markers.append({'time': highlight['start_sec'], 'label': f"⭐ {highlight['highlight']}"})
+    for segment in st.session_state.qa_results:
+        if segment.get('video_id') == st.session_state.video_id:
+            markers.append({'time': segment['start_time'], 'label': f"🎯 Q&A result ({segment.get('score', segment.get('confidence', 0)) * 100:.0f}%)"})
+    
+    start_time, seek_count = 0, 0
+    seek = st.session_state.player_seek
+    if seek and seek['video_id'] == st.session_state.video_id:
+        start_time, seek_count = seek['time'], seek['count']
+    
+    st.subheader("🎬 Video Player")
+    player_height = 420 + (180 if markers else 0)
+    player_html = get_hls_player_html(st.session_state.video_url, markers=markers, start_time=start_time)
+    # The seek count makes a repeated jump to the same spot reload the player too
+    st.components.v1.html(f"{player_html}<!-- seek {seek_count} -->", height=player_height, scrolling=True)
+
+
+@instrument
 def display_video_analysis_section():
     """Display standalone video analysis options for the current video."""
     st.markdown("---")
@@ -295,7 +728,7 @@ def display_video_analysis_section():
         if st.button("📝 Generate Summary", key="gen_summary_btn"):
             try:
                 with st.spinner("Generating video summary..."):
-                    client = TwelveLabs(api_key=API_KEY)
+                    client = make_client()
                     summary_result = generate_summary(client, st.session_state.video_id)
                     
                     st.subheader("📝 Video Summary")
@@ -307,216 +740,73 @@ def display_video_analysis_section():
     with col2:
         if st.button("📑 Generate Chapters", key="gen_chapters_btn"):
             try:
-                with st.spinner("Generating video chapters and creating snippets..."):
-                    client = TwelveLabs(api_key=API_KEY)
-                    chapters_result = generate_chapters(client, st.session_state.video_id)
-                    
-                    st.subheader("📑 Video Chapters with Snippets")
-                    
-                    # Store chapters result in session state
-                    st.session_state.chapters_result = chapters_result
+                with st.spinner("Generating video chapters..."):
+                    client = make_client()
+                    # Store chapters result in session state; snippets are only cut on request
+                    st.session_state.chapters_result = generate_chapters(client, st.session_state.video_id)
                     st.session_state.chapter_snippets = []
-                    
-                    # Auto-create all snippets and display them
-                    for chapter in chapters_result['chapters']:
-                        start_time = seconds_to_mmss(chapter['start_sec'])
-                        end_time = seconds_to_mmss(chapter['end_sec'])
-                        duration = chapter['end_sec'] - chapter['start_sec']
-                        
-                        st.markdown(f"### 📖 Chapter {chapter['chapter_number']}: {chapter['chapter_title']}")
-                        st.write(f"**⏰ Time:** {start_time} - {end_time} ({duration:.1f}s)")
-                        st.write(f"**📝 Summary:** {chapter['chapter_summary']}")
-                        
-                        # Try to create snippet automatically
-                        snippet_created = False
-                        snippet_filename = None
-                        
-                        if st.session_state.video_url and st.session_state.video_id:
-                            try:
-                                # Try using HLS-compatible method first
-                                try:
-                                    snippet_filename = create_hls_snippet_alternative(
-                                        video_id=st.session_state.video_id,
-                                        start_time=chapter['start_sec'],
-                                        end_time=chapter['end_sec'],
-                                        title=chapter['chapter_title'],
-                                        snippet_type="chapter"
-                                    )
-                                    snippet_created = True
-                                except Exception as hls_error:
-                                    # Fallback to URL-based method
-                                    snippet_filename = create_analysis_video_snippet(
-                                        video_url=st.session_state.video_url,
-                                        start_time=chapter['start_sec'],
-                                        end_time=chapter['end_sec'],
-                                        title=chapter['chapter_title'],
-                                        snippet_type="chapter"
-                                    )
-                                    snippet_created = True
-                                
-                                # Store snippet info
-                                st.session_state.chapter_snippets.append({
-                                    'filename': snippet_filename,
-                                    'title': chapter['chapter_title'],
-                                    'chapter_number': chapter['chapter_number']
-                                })
-                                
-                            except Exception as e:
-                                st.warning(f"Could not create snippet: {str(e)}")
-                        
-                        # Display snippet or placeholder
-                        col_video, col_download = st.columns([2, 1])
-                        
-                        with col_video:
-                            if snippet_created and os.path.exists(snippet_filename):
-                                st.video(snippet_filename)
-                                st.success("✅ Snippet ready!")
-                            else:
-                                # Show placeholder or HLS stream if available
-                                if st.session_state.video_url:
-                                    st.info(f"📹 Video segment: {start_time} - {end_time}")
-                                    # Try to show the main video with timestamp info
-                                    try:
-                                        video_html = get_hls_player_html(st.session_state.video_url)
-                                        st.components.v1.html(video_html, height=300)
-                                        st.caption(f"⏰ Jump to {start_time} in the main video")
-                                    except:
-                                        st.warning("Video preview not available")
-                                else:
-                                    st.info("🎬 Snippet creation requires video URL")
-                        
-                        with col_download:
-                            if snippet_created and os.path.exists(snippet_filename):
-                                with open(snippet_filename, "rb") as file:
-                                    file_contents = file.read()
-                                st.download_button(
-                                    label=f"⬇️ Download",
-                                    data=file_contents,
-                                    file_name=snippet_filename,
-                                    mime="video/mp4",
-                                    key=f"download_chapter_{chapter['chapter_number']}",
-                                    help=f"Download Chapter {chapter['chapter_number']} snippet"
-                                )
-                            else:
-                                st.button(
-                                    "🔄 Retry Snippet",
-                                    key=f"retry_chapter_{chapter['chapter_number']}",
-                                    help="Try creating snippet again",
-                                    disabled=not st.session_state.video_url
-                                )
-                        
-                        st.markdown("---")
-                        
+                    add_context_texts([
+                        f"{chapter['chapter_title']} {chapter['chapter_summary']}"
+                        for chapter in st.session_state.chapters_result['chapters']
+                    ])
             except Exception as e:
                 st.error(f"Error generating chapters: {str(e)}")
     
     with col3:
         if st.button("✨ Generate Highlights", key="gen_highlights_btn"):
             try:
-                with st.spinner("Generating video highlights and creating snippets..."):
-                    client = TwelveLabs(api_key=API_KEY)
-                    highlights_result = generate_highlights(client, st.session_state.video_id)
-                    
-                    st.subheader("✨ Video Highlights with Snippets")
-                    
-                    # Store highlights result in session state
-                    st.session_state.highlights_result = highlights_result
+                with st.spinner("Generating video highlights..."):
+                    client = make_client()
+                    st.session_state.highlights_result = generate_highlights(client, st.session_state.video_id)
                     st.session_state.highlight_snippets = []
-                    
-                    # Auto-create all snippets and display them
-                    for i, highlight in enumerate(highlights_result['highlights'], 1):
-                        start_time = seconds_to_mmss(highlight['start_sec'])
-                        end_time = seconds_to_mmss(highlight['end_sec'])
-                        duration = highlight['end_sec'] - highlight['start_sec']
-                        
-                        st.markdown(f"### ⭐ Highlight {i}: {highlight['highlight']}")
-                        st.write(f"**⏰ Time:** {start_time} - {end_time} ({duration:.1f}s)")
-                        if highlight.get('highlight_summary'):
-                            st.write(f"**📝 Details:** {highlight['highlight_summary']}")
-                        
-                        # Try to create snippet automatically
-                        snippet_created = False
-                        snippet_filename = None
-                        
-                        if st.session_state.video_url and st.session_state.video_id:
-                            try:
-                                # Try using HLS-compatible method first
-                                try:
-                                    snippet_filename = create_hls_snippet_alternative(
-                                        video_id=st.session_state.video_id,
-                                        start_time=highlight['start_sec'],
-                                        end_time=highlight['end_sec'],
-                                        title=highlight['highlight'],
-                                        snippet_type="highlight"
-                                    )
-                                    snippet_created = True
-                                except Exception as hls_error:
-                                    # Fallback to URL-based method
-                                    snippet_filename = create_analysis_video_snippet(
-                                        video_url=st.session_state.video_url,
-                                        start_time=highlight['start_sec'],
-                                        end_time=highlight['end_sec'],
-                                        title=highlight['highlight'],
-                                        snippet_type="highlight"
-                                    )
-                                    snippet_created = True
-                                
-                                # Store snippet info
-                                st.session_state.highlight_snippets.append({
-                                    'filename': snippet_filename,
-                                    'title': highlight['highlight'],
-                                    'highlight_number': i
-                                })
-                                
-                            except Exception as e:
-                                st.warning(f"Could not create snippet: {str(e)}")
-                        
-                        # Display snippet or placeholder
-                        col_video, col_download = st.columns([2, 1])
-                        
-                        with col_video:
-                            if snippet_created and os.path.exists(snippet_filename):
-                                st.video(snippet_filename)
-                                st.success("✅ Snippet ready!")
-                            else:
-                                # Show placeholder or HLS stream if available
-                                if st.session_state.video_url:
-                                    st.info(f"📹 Video segment: {start_time} - {end_time}")
-                                    # Try to show the main video with timestamp info
-                                    try:
-                                        video_html = get_hls_player_html(st.session_state.video_url)
-                                        st.components.v1.html(video_html, height=300)
-                                        st.caption(f"⏰ Jump to {start_time} in the main video")
-                                    except:
-                                        st.warning("Video preview not available")
-                                else:
-                                    st.info("🎬 Snippet creation requires video URL")
-                        
-                        with col_download:
-                            if snippet_created and os.path.exists(snippet_filename):
-                                with open(snippet_filename, "rb") as file:
-                                    file_contents = file.read()
-                                st.download_button(
-                                    label=f"⬇️ Download",
-                                    data=file_contents,
-                                    file_name=snippet_filename,
-                                    mime="video/mp4",
-                                    key=f"download_highlight_{i}",
-                                    help=f"Download Highlight {i} snippet"
-                                )
-                            else:
-                                st.button(
-                                    "🔄 Retry Snippet",
-                                    key=f"retry_highlight_{i}",
-                                    help="Try creating snippet again",
-                                    disabled=not st.session_state.video_url
-                                )
-                        
-                        st.markdown("---")
-                        
+                    add_context_texts([
+                        f"{highlight['highlight']} {highlight.get('highlight_summary', '')}"
+                        for highlight in st.session_state.highlights_result['highlights']
+                    ])
             except Exception as e:
                 st.error(f"Error generating highlights: {str(e)}")
     
+    if st.session_state.chapters_result or st.session_state.highlights_result:
+        analysis_profile = encode_profile_selector("Snippet quality:", "analysis_encode_profile", "share")
+    
+    if st.session_state.chapters_result:
+        st.subheader("📑 Video Chapters")
+        display_analysis_items(
+            "chapter",
+            [
+                {
+                    'number': chapter['chapter_number'],
+                    'title': chapter['chapter_title'],
+                    'summary': chapter['chapter_summary'],
+                    'start_sec': chapter['start_sec'],
+                    'end_sec': chapter['end_sec']
+                }
+                for chapter in st.session_state.chapters_result['chapters']
+            ],
+            st.session_state.chapter_snippets,
+            profile=analysis_profile
+        )
+    
+    if st.session_state.highlights_result:
+        st.subheader("✨ Video Highlights")
+        display_analysis_items(
+            "highlight",
+            [
+                {
+                    'number': i,
+                    'title': highlight['highlight'],
+                    'summary': highlight.get('highlight_summary', ''),
+                    'start_sec': highlight['start_sec'],
+                    'end_sec': highlight['end_sec']
+                }
+                for i, highlight in enumerate(st.session_state.highlights_result['highlights'], 1)
+            ],
+            st.session_state.highlight_snippets,
+            profile=analysis_profile
+        )
+    
+    display_supercut_export()
+    
     # Custom analysis section
     st.subheader("🎯 Custom Analysis")
     custom_prompt = st.text_area(
@@ -530,7 +820,7 @@ def display_video_analysis_section():
         if st.button("🔍 Analyze", key="custom_analysis_btn", disabled=not custom_prompt):
             try:
                 with st.spinner("Performing custom analysis..."):
-                    client = TwelveLabs(api_key=API_KEY)
+                    client = make_client()
                     analysis_result = generate_open_analysis(
                         client, 
                         st.session_state.video_id, 
@@ -584,18 +874,22 @@ def display_qa_interface():
         - ✅ Access comprehensive search results
         """)
     
+    # Single shared player, filled in last so it sees this run's chapters, highlights and hits
+    player_slot = st.container()
+    
     # QA Search Interface
-    process_qa_search()
+    snippets_shown = process_qa_search()
     
     # Add video analysis section for current video
     if st.session_state.video_id:
         display_video_analysis_section()
     
-    # Display created QA snippets
+    # Display created QA snippets (unless they were just streamed in above)
     if st.session_state.qa_snippets:
-        st.subheader("📹 Q&A Video Snippets")
-        for index, (file_name, query, snippet_info) in enumerate(st.session_state.qa_snippets):
-            display_qa_snippet(file_name, query, snippet_info, index)
+        if not snippets_shown:
+            st.subheader("📹 Q&A Video Snippets")
+            for index, (file_name, query, snippet_info) in enumerate(st.session_state.qa_snippets):
+                display_qa_snippet(file_name, query, snippet_info, index)
         
         # Clear QA snippets button
         if st.button("Clear all QA snippets", key="clear_qa_snippets_button"):
@@ -607,6 +901,9 @@ def display_qa_interface():
             st.success("All QA snippet files have been cleared.")
             st.experimental_rerun()
     
+    with player_slot:
+        display_shared_player()
+    
     # Show helpful message when no video is selected but interface is accessible
     if not st.session_state.video_id:
         st.info("""
@@ -622,29 +919,23 @@ def display_qa_interface():
 def display_segment(file_name, description, segment_index):
     if os.path.exists(file_name):
         st.write(f"### {description}")
-        st.video(file_name)
-        with open(file_name, "rb") as file:
-            file_contents = file.read()
+        display_video_file(file_name)
         unique_key = f"download_{segment_index}_{uuid.uuid4()}"
-        st.download_button(
-            label=f"Download: {description}",
-            data=file_contents,
-            file_name=file_name,
-            mime="video/mp4",
-            key=unique_key
-        )
+        display_file_download(file_name, f"Download: {description}", os.path.basename(file_name), unique_key)
         st.markdown("---")
     else:
         st.warning(f"File {file_name} not found. It may have been deleted or moved.")
 
 
 # Function to process the segment
-def process_and_display_segments():
+@instrument
+def process_and_display_segments(profile=None):
     if not st.session_state.video_url:
         st.error("Video URL not found. Please reprocess the video.")
         return
 
-    segment_generator = create_video_segments(st.session_state.video_url, st.session_state.timestamps)
+    segment_generator = create_video_segments(st.session_state.video_url, st.session_state.timestamps,
+                                              job_id=st.session_state.job_id, profile=profile)
 
     progress_bar = st.progress(0)
     status_text = st.empty()
@@ -652,18 +943,20 @@ def process_and_display_segments():
     st.session_state.video_segments = []  # Reset video segments
     total_segments = len(st.session_state.timestamps.split('\n'))
 
-    for i, (file_name, description) in enumerate(segment_generator, 1):
-        st.session_state.video_segments.append((file_name, description))
-        display_segment(file_name, description, i-1)  # Pass the index here
-        progress = i / total_segments
-        progress_bar.progress(progress)
-        status_text.text(f"Processing segment {i}/{total_segments}...")
+    with encode_context(st.session_state.job_id, PRIORITY_BATCH):
+        for i, (file_name, description) in enumerate(segment_generator, 1):
+            st.session_state.video_segments.append((file_name, description))
+            display_segment(file_name, description, i-1)  # Pass the index here
+            progress = i / total_segments
+            progress_bar.progress(progress)
+            status_text.text(f"Processing segment {i}/{total_segments}...")
 
     progress_bar.progress(1.0)
     status_text.text("All segments processed!")
 
 
 # Uplaoding feature and the processing of the video
+@instrument
 def upload_and_process_video():
     video_type = st.selectbox("Select video type:", ["Basic Video (less than 30 mins)", "Podcast (30 mins to 1 hour)"])
     uploaded_file = st.file_uploader("Choose a video file", type=["mp4", "mov", "avi"])
@@ -674,18 +967,17 @@ def upload_and_process_video():
             video_path = tmp_file.name
         try:
             with st.spinner("Processing video..."):
-                client = TwelveLabs(api_key=API_KEY)
-                timestamps, video_id = process_video(client, video_path, video_type)
+                client = make_client()
+                timestamps, video_id = process_video(client, video_path, video_type, job_id=st.session_state.job_id)
             st.success("Video processed successfully!")
             st.session_state.timestamps = timestamps
             st.session_state.video_id = video_id
             st.session_state.video_url = get_video_url(video_id)
-            if st.session_state.video_url:
-                st.video(st.session_state.video_url)
-            else:
+            if not st.session_state.video_url:
                 st.info("Video processed successfully! Note: Video streaming is being prepared and may take a few moments to become available.")
         except ValueError as e:
-            st.error(f"Configuration Error: {str(e)}")
+            # Raised for uploads that cannot be processed, e.g. longer than an hour
+            st.error(f"Cannot process this video: {str(e)}")
         except Exception as e:
             st.error(f"Processing Error: {str(e)}")
             if "api_key" in str(e).lower():
@@ -694,6 +986,7 @@ def upload_and_process_video():
             os.unlink(video_path)
 
 # Selecting the existing video from the Index and generating timestamps highlight
+@instrument
 def select_existing_video():
     try:
         existing_videos = fetch_existing_videos()
@@ -706,17 +999,14 @@ def select_existing_video():
             st.session_state.video_id = video_id
             st.session_state.video_url = get_video_url(video_id)
             
-            if st.session_state.video_url:
-                st.markdown(f"### Selected Video: {selected_video}")
-                st.video(st.session_state.video_url)
-            else:
-                st.markdown(f"### Selected Video: {selected_video}")
+            st.markdown(f"### Selected Video: {selected_video}")
+            if not st.session_state.video_url:
                 st.info("Note: This video doesn't have a streaming URL available. You can still generate timestamps, but video segments cannot be created.")
             
             if st.button("Generate Timestamps", key="generate_timestamps_button"):
                 try:
                     with st.spinner("Generating timestamps..."):
-                        client = TwelveLabs(api_key=API_KEY)
+                        client = make_client()
                         timestamps, _ = generate_timestamps(client, video_id)
                     st.session_state.timestamps = timestamps
                 except ValueError as e:
@@ -749,9 +1039,10 @@ def display_timestamps_and_segments():
                     st.info("Video streaming is still being prepared. Please try again in a few moments.")
 
         if st.session_state.video_url:
+            segments_profile = encode_profile_selector("Segment quality:", "segments_encode_profile", "share")
             if st.button("Create Video Segments", key="create_segments_button"):
                 try:
-                    process_and_display_segments()
+                    process_and_display_segments(segments_profile)
                 except Exception as e:
                     st.error(f"Error creating video segments: {str(e)}")
                     st.exception(e)  # This will display the full traceback
@@ -771,11 +1062,78 @@ def display_timestamps_and_segments():
                 st.success("All segment files have been cleared.")
                 st.experimental_rerun()
 
+def display_perf_panel(before):
+    """
+    Sidebar breakdown of where time went: the calls made during this rerun (compared
+    with the snapshot taken when it started), then totals for the whole process.
+    """
+    stats = get_perf_stats()
+    previous = {(timing['metric'], tuple(sorted(timing['labels'].items()))): timing for timing in before['timings']}
+
+    rerun_rows = []
+    for timing in stats['timings']:
+        earlier = previous.get((timing['metric'], tuple(sorted(timing['labels'].items()))), {})
+        calls = timing['count'] - earlier.get('count', 0)
+        if calls and timing['metric'] != "rerun_seconds":
+            rerun_rows.append({
+                'what': " ".join(timing['labels'].values()) or timing['metric'],
+                'kind': timing['metric'].replace("_seconds", ""),
+                'calls': calls,
+                'seconds': round(timing['total_seconds'] - earlier.get('total_seconds', 0.0), 3)
+            })
+    rerun_rows.sort(key=lambda row: row['seconds'], reverse=True)
+
+    with st.sidebar:
+        st.subheader("⏱️ Performance")
+        st.caption("This rerun (other sessions in this process are included)")
+        if rerun_rows:
+            st.dataframe(rerun_rows[:15])
+        else:
+            st.caption("Nothing instrumented ran.")
+
+        st.caption("Process totals")
+        st.dataframe([
+            {
+                'what': " ".join(timing['labels'].values()) or timing['metric'],
+                'kind': timing['metric'].replace("_seconds", ""),
+                'calls': timing['count'],
+                'total s': timing['total_seconds'],
+                'p50 s': timing['p50_seconds'],
+                'p95 s': timing['p95_seconds']
+            }
+            for timing in stats['timings'][:20]
+        ])
+
+        remote_calls = {timing['labels']['endpoint']: timing['count']
+                        for timing in stats['timings'] if timing['metric'] == "remote_call_seconds"}
+        if remote_calls:
+            st.caption("Remote calls by endpoint")
+            st.dataframe([{'endpoint': endpoint, 'calls': calls} for endpoint, calls in remote_calls.items()])
+
+        transferred = [counter for counter in stats['counters'] if counter['metric'] == "bytes_total"]
+        if transferred:
+            st.caption("Bytes transferred")
+            st.dataframe([
+                {'direction': counter['labels']['direction'], 'source': counter['labels']['source'],
+                 'MB': round(counter['value'] / (1024 * 1024), 2)}
+                for counter in transferred
+            ])
+
+        if stats['cache_hit_rates']:
+            st.caption("Cache hit rates")
+            st.dataframe([dict(cache=cache, **rates) for cache, rates in stats['cache_hit_rates'].items()])
+
+        with st.expander("Prometheus metrics"):
+            if file_base_url():
+                st.caption(f"Also served at {file_base_url()}/metrics")
+            st.code(render_prometheus(), language="text")
+
+
 def main():
     # Configuration status check
     try:
         # Test if we can create a TwelveLabs client
-        client = TwelveLabs(api_key=API_KEY)
+        client = make_client()
         st.success("✅ TwelveLabs API configuration is valid!")
     except Exception as e:
         st.error(f"❌ TwelveLabs API configuration error: {str(e)}")
@@ -805,4 +1163,15 @@ def main():
     display_timestamps_and_segments()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    perf_before = get_perf_stats() if PERF_PANEL else None
+    # Work of a rerun (indexing polls, downloads, ffmpeg runs) stops once a newer rerun
+    # replaces it or the session closes, instead of running on in the background
+    if 'cancel_token' in st.session_state:
+        st.session_state.cancel_token.cancel("superseded by a newer rerun")
+    st.session_state.cancel_token = CancelToken(check=session_closed_check())
+    # One trace per rerun: every section, remote call and ffmpeg run below is a child span
+    with span("streamlit rerun", job_id=st.session_state.job_id), timed("rerun_seconds"), \
+            cancel_scope(st.session_state.cancel_token):
+        main()
+    if PERF_PANEL:
+        display_perf_panel(perf_before)
\ No newline at end of file
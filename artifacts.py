@@ -0,0 +1,270 @@
+import os
+import time
+import uuid
+import shutil
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Managed workspace for everything the app writes to disk (downloads, snippets,
+# segments). Each job gets its own directory, outputs are published with
+# temp-then-rename, and the whole store is kept under a disk quota by evicting
+# the least recently used files. Locks are lock files, so they hold across processes.
+
+ARTIFACT_ROOT = os.getenv("ARTIFACT_ROOT", ".artifacts")
+ARTIFACT_QUOTA_BYTES = int(os.getenv("ARTIFACT_QUOTA_MB", "5120")) * 1024 * 1024
+ARTIFACT_MAX_AGE_SECONDS = int(os.getenv("ARTIFACT_MAX_AGE_HOURS", "24")) * 3600
+
+JOBS_DIR = os.path.join(ARTIFACT_ROOT, "jobs")
+CACHE_DIR = os.path.join(ARTIFACT_ROOT, "cache")
+LOCKS_DIR = os.path.join(ARTIFACT_ROOT, ".locks")
+
+TEMP_MARKER = ".tmp"
+GC_INTERVAL_SECONDS = 60
+LOCK_POLL_SECONDS = 0.05
+
+# artifact_lock() names that are keyed per request and therefore pile up; collect_garbage()
+# removes only these. Other lock files (e.g. the scheduler's encode slots) are never touched.
+KEYED_LOCK_PREFIXES = ("singleflight-", "snippet-")
+
+_last_gc = 0
+
+
+def new_job_id():
+    return uuid.uuid4().hex[:12]
+
+
+def job_dir(job_id=None):
+    """
+    Return (and create) the directory for a job, e.g. one Streamlit session or one CLI run.
+    """
+    path = os.path.join(JOBS_DIR, job_id or new_job_id())
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def artifact_path(job_id, filename):
+    return os.path.join(job_dir(job_id), filename)
+
+
+def is_temp_artifact(path):
+    return TEMP_MARKER in os.path.basename(path)
+
+
+def temp_path_for(final_path):
+    # Keep the real extension last so ffmpeg still infers the container format
+    root, ext = os.path.splitext(final_path)
+    return f"{root}{TEMP_MARKER}-{os.getpid()}-{uuid.uuid4().hex[:6]}{ext}"
+
+
+@contextmanager
+def atomic_output(final_path):
+    """
+    Yield a temporary path next to final_path and rename it into place on success.
+    Readers never observe a half-written file; on failure the temp file is removed.
+    """
+    os.makedirs(os.path.dirname(final_path) or ".", exist_ok=True)
+    temp_path = temp_path_for(final_path)
+    try:
+        yield temp_path
+        os.replace(temp_path, final_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _lock_path(name):
+    return os.path.join(LOCKS_DIR, f"{name}.lock")
+
+
+def _try_lock(lock_file, blocking=True):
+    try:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        if blocking:
+            raise
+        return False
+
+
+def _unlock(lock_file):
+    if fcntl:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def is_current_lock_file(lock_file, path):
+    """
+    Whether an open (and locked) lock file is still the one at path. collect_garbage() may
+    unlink an idle lock file while we wait on it; holding the lock on an unlinked file
+    would not exclude anyone who opens the new one.
+    """
+    try:
+        return os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino
+    except OSError:
+        return False
+
+
+@contextmanager
+def artifact_lock(name="store", wait_check=None):
+    """
+    Cross-process exclusive lock backed by a lock file in the store.
+
+    Args:
+        name: Lock name; one lock file per name
+        wait_check: Called while another holder keeps us waiting (e.g. check_cancelled);
+            raising from it gives up on the lock
+    """
+    os.makedirs(LOCKS_DIR, exist_ok=True)
+    path = _lock_path(name)
+    while True:
+        lock_file = open(path, "a+")
+        try:
+            if wait_check is None:
+                _try_lock(lock_file)
+            else:
+                while not _try_lock(lock_file, blocking=False):
+                    wait_check()
+                    time.sleep(LOCK_POLL_SECONDS)
+        except BaseException:
+            lock_file.close()
+            raise
+        if not fcntl or is_current_lock_file(lock_file, path):
+            break
+        _unlock(lock_file)
+        lock_file.close()
+
+    # The lock file's mtime records its last use, so collect_garbage() keeps busy locks
+    touch_artifact(path)
+    try:
+        yield
+    finally:
+        _unlock(lock_file)
+        lock_file.close()
+
+
+def touch_artifact(path):
+    """Mark an artifact as recently used (atime is unreliable on noatime mounts)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _list_artifacts():
+    artifacts = []
+    for directory in (JOBS_DIR, CACHE_DIR):
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed by a concurrent collector
+                artifacts.append((stat.st_mtime, stat.st_size, path))
+    return artifacts
+
+
+def disk_usage():
+    """Total bytes of all job and cache artifacts (what the quota applies to)."""
+    return sum(size for _, size, _ in _list_artifacts())
+
+
+def collect_garbage(quota_bytes=ARTIFACT_QUOTA_BYTES, max_age_seconds=ARTIFACT_MAX_AGE_SECONDS, keep=()):
+    """
+    Evict least recently used artifacts until the store fits the quota.
+
+    Args:
+        quota_bytes: Maximum total size of the store
+        max_age_seconds: Artifacts unused for longer than this are always removed
+        keep: Paths that must not be evicted (e.g. files shown on the current page)
+
+    Returns:
+        Dictionary with the number of removed files and freed bytes
+    """
+    keep = {os.path.realpath(path) for path in keep}
+    removed, freed = 0, 0
+    now = time.time()
+
+    with artifact_lock("gc"):
+        artifacts = sorted(_list_artifacts())
+        total = sum(size for _, size, _ in artifacts)
+        for mtime, size, path in artifacts:
+            expired = now - mtime > max_age_seconds
+            # In-flight temp files are only reclaimed once they are clearly abandoned
+            if is_temp_artifact(path) and not expired:
+                continue
+            if total <= quota_bytes and not expired:
+                break
+            if os.path.realpath(path) in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            freed += size
+            removed += 1
+
+        removed_locks = _remove_idle_locks(now)
+
+        # Drop job directories that are now empty
+        if os.path.isdir(JOBS_DIR):
+            for job in os.listdir(JOBS_DIR):
+                path = os.path.join(JOBS_DIR, job)
+                # Skip fresh directories a job may be about to write into
+                if os.path.isdir(path) and not os.listdir(path) and now - os.path.getmtime(path) > GC_INTERVAL_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    return {'removed': removed, 'freed_bytes': freed, 'removed_locks': removed_locks}
+
+
+def _remove_idle_locks(now, idle_seconds=GC_INTERVAL_SECONDS):
+    # Keyed lock files (one per single-flight call, snippet range, ...) pile up unless
+    # removed. A lock file is only unlinked while we hold its lock; waiters that opened
+    # it before then notice and reopen (see artifact_lock).
+    if not fcntl or not os.path.isdir(LOCKS_DIR):
+        return 0  # Windows cannot unlink a file another process has open
+    removed = 0
+    for filename in os.listdir(LOCKS_DIR):
+        path = os.path.join(LOCKS_DIR, filename)
+        if not filename.endswith(".lock") or not filename.startswith(KEYED_LOCK_PREFIXES):
+            continue
+        try:
+            if now - os.path.getmtime(path) <= idle_seconds:
+                continue
+            with open(path, "a+") as lock_file:
+                if not _try_lock(lock_file, blocking=False):
+                    continue
+                try:
+                    if is_current_lock_file(lock_file, path):
+                        os.remove(path)
+                        removed += 1
+                finally:
+                    _unlock(lock_file)
+        except OSError:
+            continue  # Removed by a concurrent collector
+    return removed
+
+
+def maybe_collect_garbage(keep=()):
+    """Run collect_garbage() at most once per GC_INTERVAL_SECONDS in this process."""
+    global _last_gc
+    if time.time() - _last_gc < GC_INTERVAL_SECONDS:
+        return None
+    _last_gc = time.time()
+    return collect_garbage(keep=keep)
+
+
+def remove_job(job_id):
+    shutil.rmtree(os.path.join(JOBS_DIR, job_id), ignore_errors=True)
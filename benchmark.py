@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+# Offline end-to-end benchmarks for the ingest, search, analysis and snippet paths.
+# Everything runs against the TwelveLabs stub and ffmpeg-generated media served
+# from a local HTTP server, so numbers are reproducible without an API key.
+# Each run of a case happens in a fresh child process with its own artifact store,
+# which gives clean peak-RSS figures and cold caches.
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --cases search_and_format --compare bench.json
+
+BENCH_VIDEO_ID = "bench-video"
+RESULT_MARKER = "BENCHMARK_RESULT "
+SEARCH_QUERY = "where do they discuss the budget"
+
+# fMP4 segments by default: some static ffmpeg builds crash demuxing MPEG-TS, and
+# the snippet and download paths treat both segment types the same way
+DEFAULT_HLS_SEGMENT_TYPE = "fmp4"
+
+
+def _case_process_video(context, client, utils):
+    timestamps, video_id = utils.process_video(client, context['video_path'], "Basic Video (less than 30 mins)",
+                                               job_id="bench")
+    return {'outputs': len(timestamps.splitlines())}
+
+
+def _case_create_video_segments(context, client, utils):
+    step = context['duration'] // 4
+    segment_info = "\n".join(
+        f"{utils.seconds_to_mmss(i * step)}-Part {i + 1}" for i in range(4)
+    )
+    outputs = list(utils.create_video_segments(context['video_url'], segment_info, job_id="bench",
+                                               profile=context['profile']))
+    return {'outputs': len(outputs)}
+
+
+def _case_download_video_segment(context, client, utils):
+    data = utils.download_video_segment(BENCH_VIDEO_ID, "00:10", utils.seconds_to_mmss(min(30, context['duration'])))
+    return {'outputs': 1, 'output_bytes': len(data)}
+
+
+def _case_create_hls_snippet(context, client, utils):
+    # Cut from the stream start: some ffmpeg 7.0 builds drop every packet when
+    # input-seeking past the first fMP4 segment, which would leave an empty file
+    path = utils.create_hls_snippet_alternative(BENCH_VIDEO_ID, 0, min(20, context['duration']), "bench snippet",
+                                                job_id="bench", profile=context['profile'])
+    return {'outputs': 1, 'output_bytes': os.path.getsize(path)}
+
+
+def _case_search_and_format(context, client, utils):
+    segments = utils.search_video_content(client, BENCH_VIDEO_ID, SEARCH_QUERY, use_cache=False)
+    formatted = utils.format_qa_results(segments, SEARCH_QUERY, client)
+    return {'outputs': len(segments), 'output_bytes': len(formatted)}
+
+
+def _case_chapter_snippets(context, client, utils):
+    chapters = utils.generate_chapters(client, BENCH_VIDEO_ID)
+    return {'outputs': len(utils.batch_create_chapter_snippets(context['video_url'], chapters))}
+
+
+def _case_highlight_snippets(context, client, utils):
+    highlights = utils.generate_highlights(client, BENCH_VIDEO_ID)
+    return {'outputs': len(utils.batch_create_highlight_snippets(context['video_url'], highlights))}
+
+
+BENCHMARK_CASES = {
+    'process_video': _case_process_video,
+    'create_video_segments': _case_create_video_segments,
+    'download_video_segment': _case_download_video_segment,
+    'create_hls_snippet': _case_create_hls_snippet,
+    'search_and_format': _case_search_and_format,
+    'chapter_snippets': _case_chapter_snippets,
+    'highlight_snippets': _case_highlight_snippets
+}
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(name, context):
+    """
+    Run one case in this process (a child started by run_benchmarks) and measure it.
+
+    Returns:
+        Dictionary with wall/CPU seconds, peak RSS, API calls and case-specific outputs
+    """
+    # Imported here: utils reads its configuration from the environment the parent prepared
+    import utils
+    from twelvelabs_stub import StubTwelveLabs, install_stub_client
+
+    client = install_stub_client(StubTwelveLabs(
+        latency_ms=context['latency_ms'],
+        hls_url=context['hls_url'],
+        videos=[{'id': BENCH_VIDEO_ID, 'duration': context['duration'], 'filename': "bench.mp4"}]
+    ))
+
+    result = {'case': name, 'error': None}
+    cpu_before = os.times()
+    started = time.perf_counter()
+    try:
+        result.update(BENCHMARK_CASES[name](context, client, utils))
+    except Exception as e:
+        # ffmpeg errors carry the whole banner; the tail is what explains the failure
+        result['error'] = str(e)[-500:]
+    result['wall_seconds'] = round(time.perf_counter() - started, 4)
+    cpu_after = os.times()
+    # ffmpeg runs as a child process; its CPU time counts once it has been waited for
+    result['cpu_seconds'] = round(sum(cpu_after[:4]) - sum(cpu_before[:4]), 4)
+    result['peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    result['children_peak_rss_mb'] = _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    result['api_calls'] = dict(client.calls)
+    result['api_calls_total'] = sum(client.calls.values())
+    result['bytes_uploaded'] = client.bytes_uploaded
+    return result
+
+
+def _run_child(name, context, run_dir, timeout):
+    env = dict(
+        os.environ,
+        TWELVELABS_STUB="1",
+        ARTIFACT_ROOT=os.path.join(run_dir, "artifacts"),
+        VIDEO_CACHE_PATH=os.path.join(run_dir, "video_cache.json"),
+        SEMANTIC_CACHE_PATH=os.path.join(run_dir, "semantic_cache.json"),
+        SINGLE_FLIGHT_CROSS_PROCESS="0"
+    )
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-case", name, "--context", json.dumps(context)]
+    try:
+        completed = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=timeout,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        return {'case': name, 'error': f"Timed out after {timeout}s"}
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'case': name, 'error': f"Child exited with {completed.returncode}: {completed.stderr[-500:]}"}
+
+
+def _summarize(runs):
+    ok = [run for run in runs if not run.get('error')]
+    summary = {'runs': len(runs), 'errors': [run['error'] for run in runs if run.get('error')]}
+    if not ok:
+        return summary
+    for metric in ('wall_seconds', 'cpu_seconds'):
+        values = [run[metric] for run in ok]
+        summary[metric] = {'min': min(values), 'median': round(statistics.median(values), 4), 'max': max(values)}
+    for metric in ('peak_rss_mb', 'children_peak_rss_mb'):
+        values = [run[metric] for run in ok if run.get(metric) is not None]
+        summary[metric] = max(values) if values else None
+    for metric in ('bytes_downloaded', 'bytes_uploaded', 'api_calls_total', 'outputs', 'output_bytes'):
+        values = [run[metric] for run in ok if metric in run]
+        summary[metric] = round(statistics.median(values)) if values else None
+    summary['api_calls'] = ok[-1]['api_calls']
+    return summary
+
+
+def run_benchmarks(cases, repeat=3, duration=60, latency_ms=0.0, profile="share", work_dir=None, timeout=600,
+                   hls_segment_type=DEFAULT_HLS_SEGMENT_TYPE):
+    """
+    Generate the test media, serve it locally and run every case `repeat` times.
+
+    Returns:
+        Dictionary with run metadata and a summary per case
+    """
+    from stub_media import generate_test_video, generate_test_hls, HlsServer
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="bench-")
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    video_path = os.path.join(media_dir, "bench.mp4")
+    if not os.path.exists(video_path):
+        generate_test_video(video_path, duration)
+    hls_dir = f"hls-{hls_segment_type}"
+    generate_test_hls(os.path.join(media_dir, hls_dir), duration, segment_type=hls_segment_type)
+
+    server = HlsServer(media_dir).start()
+    context = {
+        'video_path': video_path,
+        'video_url': server.url("bench.mp4"),
+        'hls_url': server.url(f"{hls_dir}/master.m3u8"),
+        'duration': duration,
+        'latency_ms': latency_ms,
+        'profile': profile
+    }
+    results = {}
+    try:
+        for name in cases:
+            runs = []
+            for iteration in range(repeat):
+                run_dir = os.path.join(work_dir, "runs", f"{name}-{iteration}")
+                shutil.rmtree(run_dir, ignore_errors=True)
+                os.makedirs(run_dir)
+                server.reset_counters()
+                run = _run_child(name, context, run_dir, timeout)
+                run['bytes_downloaded'] = server.bytes_served
+                runs.append(run)
+            results[name] = _summarize(runs)
+            print(_format_line(name, results[name]))
+    finally:
+        server.stop()
+
+    return {
+        'meta': {
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+            'duration': duration,
+            'latency_ms': latency_ms,
+            'profile': profile,
+            'hls_segment_type': hls_segment_type
+        },
+        'results': results
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _format_line(name, summary):
+    if 'wall_seconds' not in summary:
+        return f"{name:24} FAILED: {summary['errors'][0] if summary['errors'] else 'no runs'}"
+    return (f"{name:24} wall {summary['wall_seconds']['median']:8.3f}s  cpu {summary['cpu_seconds']['median']:8.3f}s  "
+            f"rss {summary['peak_rss_mb']}MB  down {summary['bytes_downloaded']}B  "
+            f"api {summary['api_calls_total']}")
+
+
+def compare_results(baseline, current, threshold=0.15):
+    """
+    Compare two benchmark files case by case.
+
+    Returns:
+        List of regression messages (wall time beyond threshold, more API calls or bytes)
+    """
+    regressions = []
+    for name, now in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or 'wall_seconds' not in before or 'wall_seconds' not in now:
+            continue
+        old_wall, new_wall = before['wall_seconds']['median'], now['wall_seconds']['median']
+        change = (new_wall - old_wall) / old_wall if old_wall else 0.0
+        print(f"{name:24} wall {old_wall:8.3f}s -> {new_wall:8.3f}s ({change:+.1%})")
+        if change > threshold:
+            regressions.append(f"{name}: wall time {change:+.1%}")
+        for metric in ('api_calls_total', 'bytes_downloaded'):
+            if (now.get(metric) or 0) > (before.get(metric) or 0):
+                regressions.append(f"{name}: {metric} {before.get(metric)} -> {now.get(metric)}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run offline benchmarks and write the results as JSON.")
+    parser.add_argument("--cases", nargs="+", choices=list(BENCHMARK_CASES), default=list(BENCHMARK_CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (each in a fresh process)")
+    parser.add_argument("--duration", type=int, default=60, help="Length of the synthetic test video in seconds")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per API call")
+    parser.add_argument("--profile", default="share", help="Encode profile for cases that take one")
+    parser.add_argument("--work-dir", help="Keep media and run directories here (default: a temp dir)")
+    parser.add_argument("--timeout", type=int, default=600, help="Seconds before a single run is abandoned")
+    parser.add_argument("--hls-segment-type", choices=["mpegts", "fmp4"], default=DEFAULT_HLS_SEGMENT_TYPE,
+                        help="Segment format of the synthetic HLS stream")
+    parser.add_argument("--output", help="Write the results JSON to this file")
+    parser.add_argument("--compare", help="Baseline results JSON; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed wall-time increase for --compare")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--context", help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.run_case:
+        print(RESULT_MARKER + json.dumps(run_case(options.run_case, json.loads(options.context))))
+        return 0
+
+    report = run_benchmarks(options.cases, options.repeat, options.duration, options.latency_ms,
+                            options.profile, options.work_dir, options.timeout, options.hls_segment_type)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {options.output}")
+
+    if options.compare:
+        with open(options.compare, "r") as f:
+            regressions = compare_results(json.load(f), report, options.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+# Cooperative cancellation for long-running work.
+# A CancelToken is installed for a block with cancel_scope(); everything started inside
+# it (ffmpeg runs, indexing polls, snippet batches, thread-pool workers started through
+# contextvars.copy_context()) checks the current token and stops once it is cancelled
+# or its deadline passes. Child scopes inherit their parent's cancellation, so one
+# cancel() on a session or job stops all of its work.
+
+# Per-operation deadlines in seconds (0 disables one)
+OPERATION_DEADLINES = {
+    'process_video': float(os.getenv("DEADLINE_PROCESS_VIDEO_SECONDS", "5400")),
+    'video_segments': float(os.getenv("DEADLINE_VIDEO_SEGMENTS_SECONDS", "1800")),
+    'snippet': float(os.getenv("DEADLINE_SNIPPET_SECONDS", "600")),
+    'batch_snippets': float(os.getenv("DEADLINE_BATCH_SNIPPETS_SECONDS", "3600"))
+}
+
+# Longest a sleeping wait goes without re-checking parents, deadlines and checks
+CANCEL_POLL_SECONDS = 0.5
+
+_current_token = contextvars.ContextVar("cancel_token", default=None)
+
+
+class OperationCancelled(Exception):
+    """Raised when work notices that its token was cancelled or its deadline passed."""
+
+
+class CancelToken:
+    """
+    Cancellation flag with an optional deadline, parent token and external check.
+
+    Args:
+        timeout: Seconds from now after which the token counts as cancelled
+        parent: Token whose cancellation also cancels this one
+        check: Callable returning a truthy reason when the work should stop (e.g. the
+            Streamlit session is gone); polled whenever the token is inspected
+    """
+
+    def __init__(self, timeout=None, parent=None, check=None):
+        self._event = threading.Event()
+        self.reason = None
+        self.parent = parent
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._check = check
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        if self.parent is not None and self.parent.cancelled:
+            self.cancel(self.parent.reason)
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            self.cancel(f"deadline of {self.timeout:g}s exceeded")
+        elif self._check is not None:
+            reason = self._check()
+            if reason:
+                self.cancel(reason if isinstance(reason, str) else "cancelled")
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(f"Operation cancelled: {self.reason}")
+
+    def wait(self, seconds):
+        """Sleep up to seconds, waking early on cancellation. Returns True if cancelled."""
+        end = time.monotonic() + seconds
+        while not self.cancelled:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._event.wait(min(remaining, CANCEL_POLL_SECONDS))
+        return True
+
+
+def current_token():
+    return _current_token.get()
+
+
+def check_cancelled():
+    """Raise OperationCancelled if the current token is cancelled (no-op outside any scope)."""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def sleep_or_cancel(seconds):
+    """time.sleep() that raises OperationCancelled as soon as the current token is cancelled."""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def cancel_scope(token=None, timeout=None, operation=None):
+    """
+    Run the block under a cancellation token.
+
+    Args:
+        token: Token to install (e.g. one the UI or API can cancel); defaults to a child of the current token
+        timeout: Deadline in seconds for this block (a child token is created when set)
+        operation: Name in OPERATION_DEADLINES to take the deadline from when timeout is not given
+
+    Yields:
+        The token in effect inside the block
+    """
+    if timeout is None and operation:
+        timeout = OPERATION_DEADLINES.get(operation) or None
+    parent = token or _current_token.get()
+    scope_token = token if token is not None and not timeout else CancelToken(timeout, parent)
+    context_token = _current_token.set(scope_token)
+    try:
+        yield scope_token
+    finally:
+        _current_token.reset(context_token)
+
+
+def cancellable(operation):
+    """
+    Decorator: run the function in a child scope with the deadline configured for operation,
+    and let OperationCancelled through the function's own error wrapping.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with cancel_scope(operation=operation) as token:
+                token.raise_if_cancelled()
+                try:
+                    return fn(*args, **kwargs)
+                except Exception:
+                    # utils re-raises failures as plain Exceptions; report the cancellation itself
+                    token.raise_if_cancelled()
+                    raise
+        return wrapper
+    return decorator
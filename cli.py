@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import (
+    make_client, process_video, generate_chapters, generate_highlights,
+    trim_video, seconds_to_mmss
+)
+from probe import probe_duration
+from artifacts import atomic_output, remove_job
+from scheduler import encode_context, PRIORITY_BATCH
+from tracing import span
+from cancellation import CancelToken, cancel_scope
+from encode_profiles import ENCODE_PROFILES, DEFAULT_PROFILE
+
+# Headless batch pipeline: index a directory (or manifest) of local videos, generate
+# chapters/highlights and cut their snippets without the Streamlit UI.
+# Every finished video is appended to a JSONL results file, which doubles as the
+# checkpoint: re-running the same command skips videos that already succeeded.
+#
+#   python cli.py ./archive --workers 4 --highlights --snippets chapters
+#   python cli.py manifest.jsonl --output-dir backfill --profile preview
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v", ".webm")
+
+VIDEO_TYPES = {
+    'basic': "Basic Video (less than 30 mins)",
+    'podcast': "Podcast (30 mins to 1 hour)"
+}
+
+# Videos longer than this are indexed as podcasts (two halves) when the type is "auto"
+PODCAST_MIN_SECONDS = 1800
+
+
+def collect_inputs(source):
+    """
+    Resolve a directory or manifest into a list of jobs.
+
+    A manifest is either a text file with one path per line (# for comments) or a
+    JSONL file whose lines are {"path": ..., "video_type": "basic"|"podcast"|"auto"}.
+    Relative paths are resolved against the manifest's directory.
+
+    Returns:
+        List of dictionaries with an absolute 'path' and a 'video_type'
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths += [os.path.join(root, name) for name in files if name.lower().endswith(VIDEO_EXTENSIONS)]
+        return [{'path': os.path.abspath(path), 'video_type': None} for path in sorted(paths)]
+
+    if not os.path.isfile(source):
+        raise Exception(f"Input not found: {source}")
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    jobs = []
+    with open(source, "r") as manifest:
+        for line_number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    raise Exception(f"Invalid manifest line {line_number}: {str(e)}")
+            else:
+                entry = {'path': line}
+            if 'path' not in entry:
+                raise Exception(f"Manifest line {line_number} has no 'path'")
+            jobs.append({
+                'path': os.path.abspath(os.path.join(base_dir, os.path.expanduser(entry['path']))),
+                'video_type': entry.get('video_type')
+            })
+    return jobs
+
+
+def load_completed(results_path):
+    """
+    Source paths that already finished successfully according to a results file.
+    A torn last line from a crash is ignored, so that video simply runs again.
+    """
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, "r") as results_file:
+        for line in results_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('status') == "ok":
+                completed.add(record['source'])
+    return completed
+
+
+class ResultWriter:
+    """Append-only JSONL writer shared by the worker threads; each record is fsync'ed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Terminate a torn line left by a crash so the next record starts cleanly
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as results_file:
+                results_file.seek(-1, os.SEEK_END)
+                torn = results_file.read(1) != b"\n"
+            if torn:
+                with open(path, "a") as results_file:
+                    results_file.write("\n")
+
+    def write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as results_file:
+                results_file.write(line)
+                results_file.flush()
+                os.fsync(results_file.fileno())
+
+
+def resolve_video_type(path, video_type):
+    video_type = video_type or "auto"
+    if video_type == "auto":
+        video_type = "podcast" if probe_duration(path) > PODCAST_MIN_SECONDS else "basic"
+    if video_type not in VIDEO_TYPES:
+        raise Exception(f"Unknown video type '{video_type}'. Choose one of: auto, {', '.join(VIDEO_TYPES)}")
+    return video_type
+
+
+def cut_local_snippets(path, items, snippet_type, title_field, output_dir, profile=None):
+    """
+    Cut one snippet per chapter/highlight straight from the local source file.
+    The original upload is already on disk, so nothing is fetched from the HLS stream.
+
+    Returns:
+        List of snippet dictionaries (title, start_time, end_time, path or error)
+    """
+    snippets = []
+    for number, item in enumerate(items, 1):
+        title = str(item.get(title_field, ""))
+        clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        clean_title = clean_title.replace(' ', '_').lower()[:40]
+        start_mm_ss = seconds_to_mmss(item['start_sec']).replace(':', '_')
+        end_mm_ss = seconds_to_mmss(item['end_sec']).replace(':', '_')
+        output_filename = os.path.join(
+            output_dir, f"{snippet_type}_{number:02d}_{clean_title}_{start_mm_ss}-{end_mm_ss}.mp4"
+        )
+        snippet = {
+            'type': snippet_type,
+            'title': title,
+            'start_time': item['start_sec'],
+            'end_time': item['end_sec'],
+            'path': output_filename
+        }
+        if not os.path.exists(output_filename):
+            try:
+                with atomic_output(output_filename) as temp_output:
+                    trim_video(path, temp_output, item['start_sec'], item['end_sec'], profile=profile)
+            except Exception as e:
+                snippet['path'] = None
+                snippet['error'] = str(e)
+        snippets.append(snippet)
+    return snippets
+
+
+def process_one(client, job, options):
+    """
+    Run the full pipeline for one video and return its result record.
+    Errors are captured in the record so one bad file does not stop the batch.
+    """
+    path = job['path']
+    started = time.time()
+    video_key = hashlib.sha1(path.encode()).hexdigest()[:10]
+    job_id = f"cli-{video_key}"
+    record = {'source': path, 'status': "ok"}
+
+    try:
+        video_type = resolve_video_type(path, job['video_type'] or options.video_type)
+        record['video_type'] = video_type
+
+        timestamps, video_id = process_video(client, path, VIDEO_TYPES[video_type], job_id=job_id)
+        record['video_id'] = video_id
+        record['timestamps'] = timestamps
+
+        if options.chapters:
+            record['chapters'] = generate_chapters(client, video_id)['chapters']
+        if options.highlights:
+            record['highlights'] = generate_highlights(client, video_id)['highlights']
+
+        if options.snippets != "none":
+            video_dir = os.path.join(
+                options.output_dir, "snippets",
+                f"{os.path.splitext(os.path.basename(path))[0]}-{video_key}"
+            )
+            snippets = []
+            if options.snippets in ("chapters", "all") and record.get('chapters'):
+                snippets += cut_local_snippets(path, record['chapters'], "chapter", 'chapter_title',
+                                               video_dir, options.profile)
+            if options.snippets in ("highlights", "all") and record.get('highlights'):
+                snippets += cut_local_snippets(path, record['highlights'], "highlight", 'highlight',
+                                               video_dir, options.profile)
+            record['snippets'] = snippets
+            if any(snippet.get('error') for snippet in snippets):
+                record['status'] = "partial"
+
+    except Exception as e:
+        record['status'] = "error"
+        record['error'] = str(e)
+    finally:
+        # Upload intermediates (podcast halves) live in the job directory
+        remove_job(job_id)
+
+    record['elapsed_seconds'] = round(time.time() - started, 2)
+    record['finished_at'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return record
+
+
+def run_batch(client, jobs, options):
+    """
+    Process jobs with a pool of workers, writing each result as soon as it is ready.
+
+    Returns:
+        Dictionary with counts of ok, partial, error and skipped videos
+    """
+    results_path = os.path.join(options.output_dir, options.results)
+    writer = ResultWriter(results_path)
+    completed = load_completed(results_path) if options.resume else set()
+
+    pending = []
+    seen = set()
+    for job in jobs:
+        if job['path'] in completed or job['path'] in seen:
+            continue
+        seen.add(job['path'])
+        pending.append(job)
+    counts = {'ok': 0, 'partial': 0, 'error': 0, 'skipped': len(jobs) - len(pending)}
+    if counts['skipped']:
+        print(f"Skipping {counts['skipped']} video(s) already in {results_path}")
+
+    # Ctrl+C cancels this token: running ffmpeg runs are killed and indexing polls stop
+    token = CancelToken()
+
+    def worker(job):
+        # Batch encodes queue behind interactive app sessions sharing this host
+        with encode_context("cli", PRIORITY_BATCH), span("cli video", source=job['path']), cancel_scope(token):
+            return process_one(client, job, options)
+
+    executor = ThreadPoolExecutor(max_workers=max(options.workers, 1))
+    try:
+        futures = {executor.submit(worker, job): job for job in pending}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            writer.write(record)
+            counts[record['status']] += 1
+            detail = record.get('error') or f"{len(record.get('chapters', []))} chapters, {record['elapsed_seconds']}s"
+            print(f"[{done_count}/{len(pending)}] {record['status']}: {record['source']} ({detail})")
+    except KeyboardInterrupt:
+        print("Interrupted; stopping running videos. Re-run the same command to resume.")
+        token.cancel("interrupted")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return counts
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Index videos and generate chapters, highlights and snippets in bulk.")
+    parser.add_argument("source", help="Directory of videos, or a manifest (.txt with one path per line, or .jsonl)")
+    parser.add_argument("--output-dir", default="batch_output", help="Where results.jsonl and snippets are written")
+    parser.add_argument("--results", default="results.jsonl", help="Results file name inside the output directory")
+    parser.add_argument("--workers", type=int, default=2, help="Videos processed in parallel")
+    parser.add_argument("--video-type", choices=["auto"] + list(VIDEO_TYPES), default="auto",
+                        help="Indexing mode; auto picks podcast for videos over 30 minutes")
+    parser.add_argument("--no-chapters", dest="chapters", action="store_false", help="Skip chapter generation")
+    parser.add_argument("--highlights", action="store_true", help="Also generate highlights")
+    parser.add_argument("--snippets", choices=["none", "chapters", "highlights", "all"], default="none",
+                        help="Cut a video snippet for each chapter and/or highlight")
+    parser.add_argument("--profile", choices=list(ENCODE_PROFILES), default=DEFAULT_PROFILE,
+                        help="Encode profile for snippets that cannot be stream-copied")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="Process every video again even if it already succeeded")
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    if options.snippets in ("highlights", "all"):
+        options.highlights = True
+    if options.snippets in ("chapters", "all"):
+        options.chapters = True
+
+    try:
+        jobs = collect_inputs(options.source)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 2
+    if not jobs:
+        print(f"No videos found in {options.source}")
+        return 0
+
+    client = make_client()
+    counts = run_batch(client, jobs, options)
+    print(f"Done: {counts['ok']} ok, {counts['partial']} partial, {counts['error']} failed, {counts['skipped']} skipped")
+    return 1 if counts['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
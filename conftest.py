@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pytest
+
+# Offline mode before any test module imports utils, so no API key is needed
+os.environ.setdefault("TWELVELABS_STUB", "1")
+
+
+@pytest.fixture
+def isolated_store(tmp_path, monkeypatch):
+    """
+    Point the artifact store, its locks and every on-disk cache at tmp_path, and clear the
+    in-memory copies of those caches, so a test neither reads nor leaves state in the checkout.
+    """
+    import artifacts
+    import file_server
+    import scheduler
+    import semantic_cache
+    import singleflight
+    import thumbnails
+    import transcript_index
+    import utils
+
+    root = tmp_path / "artifacts"
+    cache = root / "cache"
+    locks = root / ".locks"
+    for module, name, path in [
+        (artifacts, "ARTIFACT_ROOT", root),
+        (artifacts, "JOBS_DIR", root / "jobs"),
+        (artifacts, "CACHE_DIR", cache),
+        (artifacts, "LOCKS_DIR", locks),
+        (scheduler, "LOCKS_DIR", locks),
+        (file_server, "LOCKS_DIR", locks),
+        (singleflight, "SINGLE_FLIGHT_DIR", cache / "singleflight"),
+        (utils, "SNIPPET_CACHE_DIR", cache / "snippets"),
+        (transcript_index, "TRANSCRIPT_CACHE_DIR", cache / "transcripts"),
+        (thumbnails, "THUMBNAIL_CACHE_DIR", cache / "thumbnails"),
+        (utils, "VIDEO_CACHE_PATH", tmp_path / "video_cache.json"),
+        (semantic_cache, "SEMANTIC_CACHE_PATH", tmp_path / "semantic_cache.json"),
+    ]:
+        monkeypatch.setattr(module, name, str(path))
+
+    monkeypatch.setattr(semantic_cache, "_loaded", False)
+    monkeypatch.setattr(semantic_cache, "_entries", [])
+    monkeypatch.setattr(semantic_cache, "_entry_tf", np.zeros((0, semantic_cache.HASH_DIMENSIONS), dtype=np.float32))
+    monkeypatch.setattr(semantic_cache, "_entry_embeddings", None)
+    monkeypatch.setattr(transcript_index, "_indexes", {})
+    monkeypatch.setattr(file_server, "_key", None)
+    return root
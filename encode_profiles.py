@@ -0,0 +1,126 @@
+import os
+import threading
+
+# Named speed/quality presets for every encode the app performs.
+# ffmpeg commands and MoviePy writes are both built from the same profile, and
+# each finished encode records how fast it ran so the UI can show real numbers.
+
+VIDEO_ENCODER = os.getenv("VIDEO_ENCODER", "libx264")
+AUDIO_ENCODER = "aac"
+
+ENCODE_PROFILES = {
+    'preview': {
+        'label': "Preview (fastest, 480p)",
+        'preset': "ultrafast",
+        'crf': 30,
+        'max_height': 480,
+        'max_video_bitrate': "1M",
+        'audio_bitrate': "96k"
+    },
+    'share': {
+        'label': "Share (fast, source resolution)",
+        'preset': "veryfast",
+        'crf': 23,
+        'max_height': None,
+        'max_video_bitrate': None,
+        'audio_bitrate': "128k"
+    },
+    'archive': {
+        'label': "Archive (slow, best quality)",
+        'preset': "slow",
+        'crf': 18,
+        'max_height': None,
+        'max_video_bitrate': None,
+        'audio_bitrate': "192k"
+    }
+}
+
+DEFAULT_PROFILE = os.getenv("DEFAULT_ENCODE_PROFILE", "share")
+
+_throughput_lock = threading.Lock()
+_throughput = {}
+
+
+def get_encode_profile(name=None):
+    name = name or DEFAULT_PROFILE
+    if name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode profile '{name}'. Choose one of: {', '.join(ENCODE_PROFILES)}")
+    return ENCODE_PROFILES[name]
+
+
+def scale_filter(profile_name=None):
+    """
+    ffmpeg scale filter for a profile, or None if it keeps the source resolution.
+    """
+    max_height = get_encode_profile(profile_name)['max_height']
+    if not max_height:
+        return None
+    # Only ever downscale; -2 keeps the width even as H.264 requires
+    return f"scale=-2:'min({max_height},ih)'"
+
+
+def ffmpeg_encode_args(profile_name=None, scale=True):
+    """
+    ffmpeg output arguments (codecs, preset, quality, scaling) for a profile.
+    Pass scale=False when the caller applies scale_filter() inside its own -filter_complex.
+    """
+    profile = get_encode_profile(profile_name)
+    args = ['-c:v', VIDEO_ENCODER]
+    if VIDEO_ENCODER == "libx264":
+        # Hardware encoders use their own preset names, so only x264 gets preset/CRF
+        args += ['-preset', profile['preset'], '-crf', str(profile['crf'])]
+    if profile['max_video_bitrate']:
+        args += ['-maxrate', profile['max_video_bitrate'], '-bufsize', profile['max_video_bitrate']]
+    if scale and scale_filter(profile_name):
+        args += ['-vf', scale_filter(profile_name)]
+    args += ['-c:a', AUDIO_ENCODER, '-b:a', profile['audio_bitrate']]
+    return args
+
+
+def moviepy_write_kwargs(profile_name=None):
+    """
+    Keyword arguments for MoviePy's write_videofile() matching a profile.
+    Scaling is done by ffmpeg itself, which is much cheaper than clip.resize().
+    """
+    profile = get_encode_profile(profile_name)
+    ffmpeg_params = []
+    if VIDEO_ENCODER == "libx264":
+        ffmpeg_params += ['-crf', str(profile['crf'])]
+    if profile['max_video_bitrate']:
+        ffmpeg_params += ['-maxrate', profile['max_video_bitrate'], '-bufsize', profile['max_video_bitrate']]
+    if scale_filter(profile_name):
+        ffmpeg_params += ['-vf', scale_filter(profile_name)]
+    kwargs = {
+        'codec': VIDEO_ENCODER,
+        'audio_codec': AUDIO_ENCODER,
+        'audio_bitrate': profile['audio_bitrate'],
+        'ffmpeg_params': ffmpeg_params
+    }
+    if VIDEO_ENCODER == "libx264":
+        kwargs['preset'] = profile['preset']
+    return kwargs
+
+
+def record_encode_throughput(profile_name, media_seconds, wall_seconds):
+    """Record one finished encode: media_seconds of output produced in wall_seconds."""
+    if media_seconds <= 0 or wall_seconds <= 0:
+        return
+    with _throughput_lock:
+        stats = _throughput.setdefault(profile_name or DEFAULT_PROFILE, {'runs': 0, 'media_seconds': 0.0, 'wall_seconds': 0.0})
+        stats['runs'] += 1
+        stats['media_seconds'] += media_seconds
+        stats['wall_seconds'] += wall_seconds
+
+
+def get_encode_throughput():
+    """
+    Measured throughput per profile in this process.
+
+    Returns:
+        Dictionary of profile name to runs, totals and speed (media seconds encoded per wall second)
+    """
+    with _throughput_lock:
+        return {
+            name: dict(stats, speed=stats['media_seconds'] / stats['wall_seconds'])
+            for name, stats in _throughput.items()
+        }
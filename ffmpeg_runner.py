@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+import subprocess
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from perf import increment
+from cancellation import current_token
+
+# Streaming ffmpeg runner.
+# ffmpeg is started with -progress pipe:1, so its key=value progress blocks are read
+# while it runs instead of collecting everything at exit. That lets callers show a real
+# progress bar (fps, speed, ETA), kills runs that exceed their deadline or stop making
+# progress, and keeps only the tail of stderr in memory however long the encode is.
+# A run is also killed as soon as the current cancellation token is cancelled.
+
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "3600"))
+FFMPEG_STALL_SECONDS = float(os.getenv("FFMPEG_STALL_SECONDS", "120"))
+
+# Lines of stderr kept for error messages
+STDERR_TAIL_LINES = 40
+PROGRESS_POLL_SECONDS = 0.25
+
+_progress_callback = contextvars.ContextVar("ffmpeg_progress_callback", default=None)
+
+
+@contextmanager
+def ffmpeg_progress(callback):
+    """
+    Report the progress of every ffmpeg run started inside the block to callback(progress).
+    The callback runs on the thread that started ffmpeg, so it may update Streamlit elements.
+    """
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+
+def _number(value):
+    try:
+        return float(value.rstrip("x"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_progress(fields, duration=None):
+    """
+    Turn one -progress block into a progress dictionary.
+
+    Args:
+        fields: key/value pairs of the block (frame, fps, out_time_us, speed, total_size, progress)
+        duration: Expected output length in seconds, if known
+
+    Returns:
+        Dictionary with frame, fps, speed (multiple of realtime), out_seconds, total_size, done,
+        and percent/eta_seconds when the duration is known
+    """
+    out_us = _number(fields.get('out_time_us') or fields.get('out_time_ms'))
+    progress = {
+        'frame': int(_number(fields.get('frame')) or 0),
+        'fps': _number(fields.get('fps')) or 0.0,
+        'speed': _number(fields.get('speed')),
+        'out_seconds': max(out_us / 1_000_000, 0.0) if out_us is not None else 0.0,
+        'total_size': int(_number(fields.get('total_size')) or 0),
+        'done': fields.get('progress') == "end",
+        'percent': None,
+        'eta_seconds': None
+    }
+    if duration:
+        progress['percent'] = 100.0 if progress['done'] else min(progress['out_seconds'] / duration * 100, 100.0)
+        if progress['done']:
+            progress['eta_seconds'] = 0.0
+        elif progress['speed']:
+            progress['eta_seconds'] = max(duration - progress['out_seconds'], 0.0) / progress['speed']
+    return progress
+
+
+def _read_progress(stream, state, duration):
+    fields = {}
+    for line in stream:
+        key, _, value = line.strip().partition("=")
+        fields[key] = value.strip()
+        if key == "progress":
+            snapshot = parse_progress(fields, duration)
+            with state['lock']:
+                state['progress'] = snapshot
+                state['updated'] = time.monotonic()
+                state['version'] += 1
+            fields = {}
+
+
+def _read_stderr(stream, tail):
+    for line in stream:
+        tail.append(line)
+
+
+def run_with_progress(cmd, duration=None, timeout=None, stall_timeout=None, on_progress=None):
+    """
+    Run an ffmpeg command, parsing its progress as it goes.
+
+    Args:
+        cmd: ffmpeg command (binary first); -progress pipe:1 -nostats is added
+        duration: Expected output length in seconds, for percent and ETA
+        timeout: Kill the run after this many seconds (default FFMPEG_TIMEOUT_SECONDS, 0 for none)
+        stall_timeout: Kill the run when no progress arrives for this long (default FFMPEG_STALL_SECONDS)
+        on_progress: Called with each new progress dictionary (defaults to the ffmpeg_progress callback)
+
+    Returns:
+        CompletedProcess whose stderr is the last STDERR_TAIL_LINES lines (plus the reason if the
+        run was killed) and whose .progress is the last progress dictionary
+    """
+    timeout = FFMPEG_TIMEOUT_SECONDS if timeout is None else timeout
+    stall_timeout = FFMPEG_STALL_SECONDS if stall_timeout is None else stall_timeout
+    on_progress = on_progress or _progress_callback.get()
+    token = current_token()
+    full_cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+
+    started = time.monotonic()
+    state = {'lock': threading.Lock(), 'progress': None, 'updated': started, 'version': 0}
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    process = subprocess.Popen(full_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, errors="replace")
+    readers = [
+        threading.Thread(target=_read_progress, args=(process.stdout, state, duration), daemon=True),
+        threading.Thread(target=_read_stderr, args=(process.stderr, tail), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    killed = None
+    delivered = 0
+    try:
+        while True:
+            try:
+                process.wait(timeout=PROGRESS_POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            with state['lock']:
+                version, progress, updated = state['version'], state['progress'], state['updated']
+            if on_progress and version != delivered:
+                delivered = version
+                on_progress(progress)
+            now = time.monotonic()
+            if token is not None and token.cancelled:
+                killed = ("cancelled", token.reason)
+            elif timeout and now - started > timeout:
+                killed = ("timeout", f"timed out after {timeout:.0f}s")
+            elif stall_timeout and now - updated > stall_timeout:
+                killed = ("stall", f"stalled: no progress for {stall_timeout:.0f}s")
+            if killed:
+                break
+    finally:
+        # Also reached when the progress callback raises (e.g. a Streamlit rerun)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for reader in readers:
+            reader.join(timeout=5)
+        process.stdout.close()
+        process.stderr.close()
+
+    stderr = "".join(tail)
+    if killed:
+        increment("ffmpeg_killed_total", reason=killed[0])
+        stderr += f"\nffmpeg killed: {killed[1]}"
+    progress = state['progress']
+    if on_progress and progress is not None and state['version'] != delivered:
+        on_progress(progress)
+
+    result = subprocess.CompletedProcess(full_cmd, process.returncode, "", stderr)
+    result.progress = progress
+    return result
@@ -0,0 +1,254 @@
+import os
+import re
+import hmac
+import json
+import errno
+import hashlib
+import secrets
+import mimetypes
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+from perf import render_prometheus, record_bytes
+from artifacts import LOCKS_DIR, artifact_lock
+
+# Minimal static file endpoint for generated media.
+# Streamlit's download_button/st.video need the file bytes in the script on every
+# rerun; serving by URL instead lets the browser fetch (and range-seek) files that
+# are streamed straight from disk with sendfile.
+# GET /metrics returns this process's perf metrics in the Prometheus text format.
+#
+# Every URL is scoped: it names a scope (e.g. a session's job id) and carries an
+# HMAC of it, and only the roots registered for that scope are reachable with it.
+# The key lives in the artifact store, so all app processes sharing the store (and
+# whichever of them owns the port) accept each other's URLs.
+
+FILE_SERVER_HOST = os.getenv("FILE_SERVER_HOST", "127.0.0.1")
+FILE_SERVER_PORT = int(os.getenv("FILE_SERVER_PORT", "8502"))
+# Where browsers reach the server; without it, URLs are only handed to local browsers
+FILE_SERVER_PUBLIC_URL = os.getenv("FILE_SERVER_PUBLIC_URL", "").rstrip("/")
+
+SERVICE_NAME = "hootqna-file-server"
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+SCOPE_PATTERN = re.compile(r"[A-Za-z0-9_-]+$")
+
+_server = None
+_server_available = False
+_server_lock = threading.Lock()
+_served_roots = {}  # URL name -> directory, may contain "{scope}"
+_key = None
+
+
+def _signing_key():
+    """Secret shared by the processes of one artifact store, created on first use."""
+    global _key
+    if _key is None:
+        path = os.path.join(LOCKS_DIR, "file_server.key")
+        with artifact_lock("file-server-key"):
+            if not os.path.exists(path):
+                descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(descriptor, "w") as f:
+                    f.write(secrets.token_hex(32))
+            with open(path, "r") as f:
+                _key = f.read().strip().encode()
+    return _key
+
+
+def _key_id():
+    # Lets a process recognise a server started by another process of the same store
+    return hashlib.sha256(b"key-id:" + _signing_key()).hexdigest()[:16]
+
+
+def scope_token(scope):
+    return hmac.new(_signing_key(), scope.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _scope_root(name, scope):
+    return os.path.realpath(_served_roots[name].format(scope=scope))
+
+
+class MediaFileHandler(BaseHTTPRequestHandler):
+    """Serves files below the registered roots, with HTTP Range support."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep the Streamlit console quiet
+
+    def _resolve(self):
+        parts = urlsplit(self.path)
+        # /files/<scope>/<token>/<root name>/<relative path>
+        segments = unquote(parts.path).lstrip("/").split("/", 4)
+        if len(segments) != 5 or segments[0] != "files" or segments[3] not in _served_roots:
+            return None, None
+        _, scope, token, name, relative = segments
+        if not SCOPE_PATTERN.match(scope) or not hmac.compare_digest(token, scope_token(scope)):
+            return None, None
+        root = _scope_root(name, scope)
+        path = os.path.realpath(os.path.join(root, relative))
+        # Never serve anything outside the registered root
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None, None
+        download_name = parse_qs(parts.query).get("download", [None])[0]
+        return path, download_name
+
+    def _send_file(self, include_body):
+        path, download_name = self._resolve()
+        if not path:
+            self.send_error(404, "File not found")
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header:
+            match = RANGE_PATTERN.match(range_header.strip())
+            if not match or (not match.group(1) and not match.group(2)):
+                self.send_error(416, "Invalid range")
+                return
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start = max(size - int(match.group(2)), 0)
+            end = min(end, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "private, max-age=3600")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        if download_name:
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(download_name)}")
+        self.end_headers()
+
+        if include_body:
+            self.wfile.flush()
+            with open(path, "rb") as f:
+                try:
+                    # Zero-copy from the page cache to the socket where the OS supports it
+                    self.connection.sendfile(f, offset=start, count=length)
+                    record_bytes("served", length, "file_server")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Browsers routinely abort media requests while seeking
+
+    def _send_metrics(self):
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_identity(self):
+        body = json.dumps({'service': SERVICE_NAME, 'key_id': _key_id()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._send_metrics()
+            return
+        if path == "/health":
+            self._send_identity()
+            return
+        self._send_file(include_body=True)
+
+    def do_HEAD(self):
+        self._send_file(include_body=False)
+
+
+def _is_our_server():
+    host = "127.0.0.1" if FILE_SERVER_HOST in ("0.0.0.0", "::", "") else FILE_SERVER_HOST
+    try:
+        with urllib.request.urlopen(f"http://{host}:{FILE_SERVER_PORT}/health", timeout=2) as response:
+            identity = json.loads(response.read().decode())
+    except Exception:
+        return False
+    return identity.get('service') == SERVICE_NAME and identity.get('key_id') == _key_id()
+
+
+def start_file_server(roots):
+    """
+    Start the file endpoint once per process (no-op if it is already running).
+
+    Args:
+        roots: Mapping of URL name to local directory; "{scope}" in a directory is
+            replaced by the URL's scope, e.g. {'job': '.artifacts/jobs/{scope}'}
+
+    Returns:
+        True if files can be served by URL, False if the endpoint is unavailable
+    """
+    global _server, _server_available
+    with _server_lock:
+        _served_roots.update(roots)
+        if _server_available:
+            return True
+        try:
+            _server = ThreadingHTTPServer((FILE_SERVER_HOST, FILE_SERVER_PORT), MediaFileHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="media-file-server", daemon=True).start()
+        except OSError as e:
+            # The port may be held by another app process of the same store; anything else
+            # owning it must not get our URLs
+            if e.errno != errno.EADDRINUSE or not _is_our_server():
+                print(f"Warning: media file server unavailable on port {FILE_SERVER_PORT}: {str(e)}")
+                return False
+        _server_available = True
+        return True
+
+
+def public_base_url(request_host=None):
+    """
+    Base URL browsers use to reach the server: FILE_SERVER_PUBLIC_URL when set, otherwise
+    the local port, but only for a browser on this machine (request_host is the Host header
+    of the page request). None means files have to be handed to the browser another way.
+    """
+    if FILE_SERVER_PUBLIC_URL:
+        return FILE_SERVER_PUBLIC_URL
+    hostname = urlsplit(f"//{request_host}").hostname if request_host else None
+    if hostname in LOCAL_HOSTS:
+        return f"http://{'[::1]' if hostname == '::1' else hostname}:{FILE_SERVER_PORT}"
+    return None
+
+
+def get_file_url(path, scope, download_name=None, base_url=None):
+    """
+    URL for a file below one of the roots served for scope, or None if it is not servable.
+
+    Args:
+        path: Local file path
+        scope: Scope the URL grants access to (e.g. the session's job id)
+        download_name: File name offered for download (adds Content-Disposition)
+        base_url: Result of public_base_url()
+    """
+    if not _server_available or not base_url or not SCOPE_PATTERN.match(scope or ""):
+        return None
+    real_path = os.path.realpath(path)
+    for name in _served_roots:
+        root = _scope_root(name, scope)
+        if real_path.startswith(root + os.sep):
+            relative = os.path.relpath(real_path, root).replace(os.sep, "/")
+            url = f"{base_url}/files/{scope}/{scope_token(scope)}/{name}/{quote(relative)}"
+            if download_name:
+                url += f"?download={quote(download_name)}"
+            return url
+    return None
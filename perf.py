@@ -0,0 +1,282 @@
+import os
+import time
+import bisect
+import inspect
+import threading
+import functools
+from contextlib import contextmanager, nullcontext
+from tracing import span, start_span, use_span, SPAN_KIND_CLIENT
+
+# In-process performance metrics.
+# Latency histograms for utils functions, remote calls and ffmpeg/ffprobe runs,
+# plus counters for bytes moved and cache hits/misses. Everything is kept in memory
+# per process and exposed as a dict (Streamlit perf panel) or in the Prometheus
+# text format (GET /metrics on the API and the media file server).
+# Instrumented functions and remote calls are also traced as spans (see tracing.py).
+
+PERF_METRICS = os.getenv("PERF_METRICS", "1") == "1"
+METRIC_PREFIX = "hootqna"
+
+# Upper bounds in seconds; wide enough for both cache lookups and indexing waits
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+METRIC_HELP = {
+    'function_seconds': "Time spent in instrumented functions",
+    'function_errors_total': "Instrumented function calls that raised",
+    'remote_call_seconds': "Latency of TwelveLabs API calls",
+    'remote_call_errors_total': "TwelveLabs API calls that raised",
+    'subprocess_seconds': "Run time of ffmpeg/ffprobe subprocesses (excluding encode slot wait)",
+    'subprocess_errors_total': "ffmpeg/ffprobe runs that exited non-zero or failed to start",
+    'encode_wait_seconds': "Time spent waiting for an encode slot",
+    'ffmpeg_media_seconds_total': "Seconds of media written by ffmpeg (divide by subprocess time for speed)",
+    'ffmpeg_killed_total': "ffmpeg runs killed for exceeding their timeout, stalling or being cancelled",
+    'rerun_seconds': "Streamlit script reruns",
+    'bytes_total': "Bytes transferred",
+    'cache_requests_total': "Cache lookups by result"
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_counters = {}  # (name, labels) -> value
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Add one observation to a latency histogram."""
+    if not PERF_METRICS:
+        return
+    key = (name, _labels(labels))
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+        histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def increment(name, amount=1, **labels):
+    """Add to a counter."""
+    if not PERF_METRICS:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def record_cache(cache, hit):
+    increment("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def record_bytes(direction, amount, source):
+    """direction is 'downloaded', 'uploaded' or 'served'."""
+    if amount:
+        increment("bytes_total", amount, direction=direction, source=source)
+
+
+@contextmanager
+def timed(name, errors=None, **labels):
+    """
+    Time the block into histogram `name`; exceptions also count towards `errors`
+    (defaults to the histogram name with _seconds replaced by _errors_total).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment(errors or name.replace("_seconds", "_errors_total"), **labels)
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def instrument(fn, name=None):
+    """
+    Decorator: record the latency and errors of every call to fn under function=name,
+    and run it in a span of that name. For generator functions only the time spent
+    producing items is counted, not the time the consumer spends between them.
+    """
+    if not PERF_METRICS:
+        return fn
+    name = name or fn.__name__
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            generator = fn(*args, **kwargs)
+            # The span is only current while the generator runs, never in the consumer
+            generator_span = start_span(name)
+            elapsed = 0.0
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        with use_span(generator_span) if generator_span else nullcontext():
+                            item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - started
+                    yield item
+            except Exception as e:
+                increment("function_errors_total", function=name)
+                if generator_span:
+                    generator_span.record_error(e)
+                raise
+            finally:
+                generator.close()
+                observe("function_seconds", elapsed, function=name)
+                if generator_span:
+                    generator_span.set_attribute("busy_seconds", round(elapsed, 6))
+                    generator_span.end()
+
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name), timed("function_seconds", function=name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument_module(namespace, exclude=()):
+    """
+    Wrap every function defined in a module (pass its globals()) with instrument().
+    Rebinding the module globals means calls between the module's own functions are
+    measured too.
+    """
+    if not PERF_METRICS:
+        return
+    for name, value in list(namespace.items()):
+        if (inspect.isfunction(value) and value.__module__ == namespace['__name__']
+                and not name.startswith("__") and name not in exclude):
+            namespace[name] = instrument(value)
+
+
+class InstrumentedClient:
+    """
+    Wrap a TwelveLabs client (or the offline stub) and time every API call by endpoint,
+    e.g. "search.query" or "indexes.videos.retrieve". Responses are returned unchanged.
+    Pages fetched lazily while iterating a pager are not counted separately.
+    """
+
+    def __init__(self, client, _prefix=""):
+        self._target = client
+        self._prefix = _prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if isinstance(attribute, (str, bytes, int, float, bool, type(None))):
+            return attribute
+        endpoint = f"{self._prefix}{name}"
+        if not callable(attribute):
+            return InstrumentedClient(attribute, f"{endpoint}.")
+
+        def call(*args, **kwargs):
+            video_file = kwargs.get('video_file')
+            if hasattr(video_file, "fileno"):
+                record_bytes("uploaded", os.fstat(video_file.fileno()).st_size, "twelvelabs")
+            with span(f"twelvelabs {endpoint}", SPAN_KIND_CLIENT, **{'twelvelabs.endpoint': endpoint}), \
+                    timed("remote_call_seconds", endpoint=endpoint):
+                return attribute(*args, **kwargs)
+
+        return call
+
+
+def _quantile(histogram, q):
+    # Upper bound of the bucket holding the q-th observation (Prometheus-style estimate)
+    target = q * histogram[-1]
+    seen = 0
+    for index, bucket_count in enumerate(histogram[:-2]):
+        seen += bucket_count
+        if seen >= target and bucket_count:
+            return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float("inf")
+    return 0.0
+
+
+def get_perf_stats():
+    """
+    Snapshot for display: per-histogram count/total/mean/p50/p95, counters, and
+    cache hit rates.
+
+    Returns:
+        Dictionary with 'timings', 'counters' and 'cache_hit_rates'
+    """
+    with _lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    timings = []
+    for (name, labels), histogram in histograms.items():
+        count, total = histogram[-1], histogram[-2]
+        timings.append({
+            'metric': name,
+            'labels': dict(labels),
+            'count': count,
+            'total_seconds': round(total, 4),
+            'mean_seconds': round(total / count, 4) if count else 0.0,
+            'p50_seconds': _quantile(histogram, 0.5),
+            'p95_seconds': _quantile(histogram, 0.95)
+        })
+    timings.sort(key=lambda timing: timing['total_seconds'], reverse=True)
+
+    caches = {}
+    for (name, labels), value in counters.items():
+        if name == "cache_requests_total":
+            labels = dict(labels)
+            caches.setdefault(labels['cache'], {'hit': 0, 'miss': 0})[labels['result']] += value
+    hit_rates = {
+        cache: {'hits': results['hit'], 'misses': results['miss'],
+                'hit_rate': round(results['hit'] / (results['hit'] + results['miss']), 3)}
+        for cache, results in caches.items()
+    }
+
+    return {
+        'timings': timings,
+        'counters': [{'metric': name, 'labels': dict(labels), 'value': value}
+                     for (name, labels), value in sorted(counters.items())],
+        'cache_hit_rates': hit_rates
+    }
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f"{key}=\"{value}\"" for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        full_name = f"{METRIC_PREFIX}_{name}"
+        lines += [f"# HELP {full_name} {METRIC_HELP.get(name, name)}", f"# TYPE {full_name} histogram"]
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), histogram[:-2]):
+                cumulative += bucket_count
+                lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {histogram[-1]}")
+
+    for name in sorted({name for name, _ in counters}):
+        full_name = f"{METRIC_PREFIX}_{name}"
+        lines += [f"# HELP {full_name} {METRIC_HELP.get(name, name)}", f"# TYPE {full_name} counter"]
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,467 @@
+import os
+import json
+import time
+import struct
+import threading
+import subprocess
+from collections import OrderedDict
+from urllib.parse import urljoin
+import m3u8
+from perf import timed, increment, record_cache
+from tracing import span
+
+# Lightweight media probing used before any cut or upload decision.
+# Nothing here decodes video frames: ffprobe only reads container/stream headers
+# (and keyframe flags), and the MP4 fallback parses the moov box directly.
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+
+# Codecs that can be stream-copied into an .mp4 container without re-encoding
+COPYABLE_VIDEO_CODECS = {"h264", "hevc"}
+COPYABLE_AUDIO_CODECS = {"aac", "mp3", None}
+
+# How far (in ms) a cut may drift to the previous keyframe before we re-encode instead
+KEYFRAME_TOLERANCE_MS = int(os.getenv("KEYFRAME_TOLERANCE_MS", "500"))
+
+# Keyframes in this leading window are sampled up front; cuts further in probe
+# the region around their start (keyframe spacing is not assumed to be fixed)
+KEYFRAME_SAMPLE_SECONDS = 60
+
+MP4_CODEC_NAMES = {
+    b"avc1": "h264", b"avc3": "h264",
+    b"hvc1": "hevc", b"hev1": "hevc",
+    b"mp4a": "aac", b".mp3": "mp3",
+    b"vp09": "vp9", b"av01": "av1",
+}
+
+# Probe and rendition results are kept in small LRU caches. Remote streams can change
+# (or their signed URLs expire), so entries also age out after PROBE_CACHE_TTL_SECONDS.
+PROBE_CACHE_MAX_ENTRIES = 256
+PROBE_CACHE_TTL_SECONDS = int(os.getenv("PROBE_CACHE_TTL_SECONDS", "900"))
+
+_probe_cache = OrderedDict()
+_rendition_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache, key):
+    """Cached value for key (refreshing its LRU position), or None if missing or expired."""
+    with _cache_lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache, key, value):
+    with _cache_lock:
+        cache[key] = (time.monotonic() + PROBE_CACHE_TTL_SECONDS, value)
+        cache.move_to_end(key)
+        while len(cache) > PROBE_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def is_hls_url(source):
+    return bool(source) and '.m3u8' in source
+
+
+def _empty_probe(source):
+    return {
+        'source': source,
+        'duration_ms': 0,
+        'bitrate': 0,
+        'video_codec': None,
+        'audio_codec': None,
+        'width': 0,
+        'height': 0,
+        'keyframe_interval_ms': None,
+        'keyframes_ms': [],
+        'probed_with': None
+    }
+
+
+def _keyframe_interval(keyframes_ms):
+    if len(keyframes_ms) < 2:
+        return None
+    gaps = [b - a for a, b in zip(keyframes_ms, keyframes_ms[1:]) if b > a]
+    if not gaps:
+        return None
+    return max(gaps)
+
+
+def _probe_with_ffprobe(source, sample_keyframes=True):
+    cmd = [
+        FFPROBE_BIN, '-v', 'error',
+        '-print_format', 'json',
+        '-show_format', '-show_streams',
+        source
+    ]
+    with span("ffprobe"), timed("subprocess_seconds", command="ffprobe"):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        increment("subprocess_errors_total", command="ffprobe")
+        raise Exception(f"ffprobe failed: {result.stderr.strip()}")
+
+    data = json.loads(result.stdout or "{}")
+    info = _empty_probe(source)
+    info['probed_with'] = 'ffprobe'
+
+    format_info = data.get('format', {})
+    info['duration_ms'] = int(float(format_info.get('duration') or 0) * 1000)
+    info['bitrate'] = int(format_info.get('bit_rate') or 0)
+
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') == 'video' and info['video_codec'] is None:
+            info['video_codec'] = stream.get('codec_name')
+            info['width'] = int(stream.get('width') or 0)
+            info['height'] = int(stream.get('height') or 0)
+        elif stream.get('codec_type') == 'audio' and info['audio_codec'] is None:
+            info['audio_codec'] = stream.get('codec_name')
+
+    if sample_keyframes and info['video_codec']:
+        try:
+            info['keyframes_ms'] = _probe_keyframes(source, f"%+{KEYFRAME_SAMPLE_SECONDS}")
+        except Exception:
+            pass  # Cuts fall back to probing around their start, or to re-encoding
+        info['keyframe_interval_ms'] = _keyframe_interval(info['keyframes_ms'])
+
+    return info
+
+
+def _probe_keyframes(source, read_intervals):
+    # -skip_frame nokey makes the decoder touch keyframes only
+    cmd = [
+        FFPROBE_BIN, '-v', 'error',
+        '-select_streams', 'v:0',
+        '-skip_frame', 'nokey',
+        '-read_intervals', read_intervals,
+        '-show_entries', 'frame=pts_time',
+        '-of', 'csv=p=0',
+        source
+    ]
+    with span("ffprobe"), timed("subprocess_seconds", command="ffprobe"):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        increment("subprocess_errors_total", command="ffprobe")
+        raise Exception(f"ffprobe failed: {result.stderr.strip()}")
+    keyframes = []
+    for line in result.stdout.splitlines():
+        line = line.strip().rstrip(',')
+        if line and line != 'N/A':
+            keyframes.append(int(float(line) * 1000))
+    return sorted(set(keyframes))
+
+
+def probe_keyframes_near(source, start_ms, window_ms=KEYFRAME_TOLERANCE_MS):
+    """
+    Keyframe positions (ms) from window_ms before start_ms up to start_ms.
+
+    The read interval seeks to the keyframe at or before its start, so the result
+    always includes the last keyframe before the window when there is one.
+    """
+    begin = max(start_ms - window_ms, 0) / 1000
+    return _probe_keyframes(source, f"{begin:.3f}%{start_ms / 1000 + 0.001:.3f}")
+
+
+def _iter_boxes(f, start, end):
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _find_box(f, start, end, box_type):
+    for found_type, body_start, body_end in _iter_boxes(f, start, end):
+        if found_type == box_type:
+            return body_start, body_end
+    return None
+
+
+def _read_full_box(f, body_start):
+    f.seek(body_start)
+    version = f.read(1)[0]
+    f.read(3)  # flags
+    return version
+
+
+def _parse_track(f, trak_start, trak_end):
+    mdia = _find_box(f, trak_start, trak_end, b"mdia")
+    if not mdia:
+        return None
+    track = {'handler': None, 'codec': None, 'timescale': 0, 'width': 0, 'height': 0,
+             'sync_samples': [], 'sample_delta': None}
+
+    mdhd = _find_box(f, mdia[0], mdia[1], b"mdhd")
+    if mdhd:
+        version = _read_full_box(f, mdhd[0])
+        if version == 1:
+            f.read(16)
+        else:
+            f.read(8)
+        track['timescale'] = struct.unpack(">I", f.read(4))[0]
+
+    hdlr = _find_box(f, mdia[0], mdia[1], b"hdlr")
+    if hdlr:
+        f.seek(hdlr[0] + 8)
+        track['handler'] = f.read(4)
+
+    minf = _find_box(f, mdia[0], mdia[1], b"minf")
+    stbl = _find_box(f, minf[0], minf[1], b"stbl") if minf else None
+    if not stbl:
+        return track
+
+    stsd = _find_box(f, stbl[0], stbl[1], b"stsd")
+    if stsd:
+        # stsd: full box header + entry count, then the first sample entry box
+        f.seek(stsd[0] + 8 + 4)
+        fourcc = f.read(4)
+        track['codec'] = MP4_CODEC_NAMES.get(fourcc, fourcc.decode('latin-1').strip())
+        if track['handler'] == b"vide":
+            # VisualSampleEntry: 6 reserved + 2 ref index + 16 predefined/reserved, then width/height
+            f.seek(stsd[0] + 8 + 8 + 24)
+            track['width'], track['height'] = struct.unpack(">HH", f.read(4))
+
+    stts = _find_box(f, stbl[0], stbl[1], b"stts")
+    if stts:
+        _read_full_box(f, stts[0])
+        entry_count = struct.unpack(">I", f.read(4))[0]
+        # Keyframe times are only derivable from sample numbers at a constant frame rate
+        if entry_count == 1:
+            _, delta = struct.unpack(">II", f.read(8))
+            track['sample_delta'] = delta
+
+    stss = _find_box(f, stbl[0], stbl[1], b"stss")
+    if stss:
+        _read_full_box(f, stss[0])
+        entry_count = struct.unpack(">I", f.read(4))[0]
+        # Sample numbers are enough to derive keyframe positions at a constant frame rate
+        count = min(entry_count, 1024)
+        track['sync_samples'] = list(struct.unpack(f">{count}I", f.read(4 * count)))
+
+    return track
+
+
+def _probe_mp4_header(path):
+    info = _empty_probe(path)
+    info['probed_with'] = 'mp4-header'
+    file_size = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        moov = _find_box(f, 0, file_size, b"moov")
+        if not moov:
+            raise Exception("No moov box found; not an MP4/MOV container")
+
+        mvhd = _find_box(f, moov[0], moov[1], b"mvhd")
+        if mvhd:
+            version = _read_full_box(f, mvhd[0])
+            if version == 1:
+                f.read(16)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.read(8)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            if timescale:
+                info['duration_ms'] = int(duration * 1000 / timescale)
+
+        for box_type, body_start, body_end in _iter_boxes(f, moov[0], moov[1]):
+            if box_type != b"trak":
+                continue
+            track = _parse_track(f, body_start, body_end)
+            if not track:
+                continue
+            if track['handler'] == b"vide" and info['video_codec'] is None:
+                info['video_codec'] = track['codec']
+                info['width'], info['height'] = track['width'], track['height']
+                if track['sync_samples'] and track['sample_delta'] and track['timescale']:
+                    frame_ms = track['sample_delta'] * 1000 / track['timescale']
+                    info['keyframes_ms'] = [int((sample - 1) * frame_ms) for sample in track['sync_samples']]
+                    info['keyframe_interval_ms'] = _keyframe_interval(info['keyframes_ms'])
+            elif track['handler'] == b"soun" and info['audio_codec'] is None:
+                info['audio_codec'] = track['codec']
+
+    if info['duration_ms']:
+        info['bitrate'] = int(file_size * 8 * 1000 / info['duration_ms'])
+    return info
+
+
+def _hls_segment_keyframes(playlist_url):
+    # HLS segments start on a keyframe, so segment boundaries are cut points for stream copy
+    playlist = m3u8.load(playlist_url)
+    if playlist.is_variant and playlist.playlists:
+        playlist = m3u8.load(urljoin(playlist_url, playlist.playlists[0].uri))
+
+    keyframes_ms = []
+    position = 0.0
+    for segment in playlist.segments:
+        keyframes_ms.append(int(position * 1000))
+        position += segment.duration
+    return keyframes_ms, int(position * 1000)
+
+
+def select_hls_rendition(playlist_url, max_height=None):
+    """
+    Pick the variant of an HLS master playlist that best fits a target resolution.
+
+    Args:
+        playlist_url: HLS master (or media) playlist URL
+        max_height: Target output height; the lowest rendition at or above it is
+            chosen, so nothing is upscaled. None picks the highest rendition.
+
+    Returns:
+        URL of the chosen media playlist, or playlist_url when there is nothing to choose
+    """
+    cache_key = (playlist_url, max_height)
+    cached = _cache_get(_rendition_cache, cache_key)
+    record_cache("hls_rendition", cached is not None)
+    if cached is not None:
+        return cached
+
+    selected = playlist_url
+    try:
+        playlist = m3u8.load(playlist_url)
+        # Audio-only variants carry no resolution and are skipped
+        variants = [variant for variant in playlist.playlists if variant.stream_info.resolution]
+        if variants:
+            by_size = sorted(variants, key=lambda v: (v.stream_info.resolution[1], v.stream_info.bandwidth or 0))
+            if max_height:
+                fitting = [v for v in by_size if v.stream_info.resolution[1] >= max_height]
+                chosen = fitting[0] if fitting else by_size[-1]
+            else:
+                chosen = by_size[-1]
+            # A variant with audio in a separate rendition group would lose its sound
+            # when read on its own, so keep the master playlist for those
+            external_audio = chosen.stream_info.audio and any(
+                media.type == "AUDIO" and media.group_id == chosen.stream_info.audio and media.uri
+                for media in playlist.media
+            )
+            if not external_audio:
+                selected = urljoin(playlist_url, chosen.uri)
+    except Exception:
+        pass  # Let ffmpeg choose from the master playlist
+
+    _cache_put(_rendition_cache, cache_key, selected)
+    return selected
+
+
+def probe_video(source, sample_keyframes=True):
+    """
+    Probe a local file or stream URL without decoding it.
+
+    Args:
+        source: Local path, HTTP URL or HLS (.m3u8) URL
+        sample_keyframes: Whether to collect keyframe positions (needed by plan_cut)
+
+    Returns:
+        Dictionary with duration_ms, bitrate (bits/s), video_codec, audio_codec,
+        width, height, keyframe_interval_ms and keyframes_ms
+    """
+    is_local = os.path.exists(source)
+    if is_local:
+        stat = os.stat(source)
+        cache_key = (source, stat.st_size, stat.st_mtime, sample_keyframes)
+    else:
+        cache_key = (source, sample_keyframes)
+    cached = _cache_get(_probe_cache, cache_key)
+    record_cache("probe", cached is not None)
+    if cached is not None:
+        return cached
+
+    try:
+        if is_hls_url(source):
+            # Codec details come from ffprobe; keyframes come from the playlist itself
+            info = _probe_with_ffprobe(source, sample_keyframes=False)
+            if sample_keyframes:
+                keyframes_ms, playlist_duration_ms = _hls_segment_keyframes(source)
+                info['keyframes_ms'] = keyframes_ms
+                info['keyframe_interval_ms'] = _keyframe_interval(keyframes_ms)
+                info['duration_ms'] = info['duration_ms'] or playlist_duration_ms
+        else:
+            info = _probe_with_ffprobe(source, sample_keyframes=sample_keyframes)
+    except Exception as e:
+        if not is_local:
+            raise Exception(f"Failed to probe {source}: {str(e)}")
+        # ffprobe missing or unhappy - fall back to reading the MP4 header ourselves
+        try:
+            info = _probe_mp4_header(source)
+        except Exception as header_error:
+            raise Exception(f"Failed to probe {source}: {str(e)}; header parse: {str(header_error)}")
+
+    _cache_put(_probe_cache, cache_key, info)
+    return info
+
+
+def probe_duration(source):
+    """Return the duration of a media source in seconds."""
+    return probe_video(source, sample_keyframes=False)['duration_ms'] / 1000
+
+
+def plan_cut(probe_info, start_time, end_time=None, tolerance_ms=KEYFRAME_TOLERANCE_MS):
+    """
+    Decide whether a cut can be stream-copied or needs a re-encode.
+
+    Copy is only chosen when the actual keyframe before the cut start is known: from
+    the probed keyframe list when it reaches that far, otherwise by probing the region
+    around the start. Anything else is re-encoded, so a copy never starts early.
+
+    Args:
+        probe_info: Result of probe_video()
+        start_time: Cut start in seconds
+        end_time: Cut end in seconds (None for end of media)
+        tolerance_ms: Maximum allowed distance from the cut start to the previous keyframe
+
+    Returns:
+        Dictionary with mode ('copy' or 'encode'), start_ms, end_ms and a reason
+    """
+    start_ms = int(start_time * 1000)
+    end_ms = int(end_time * 1000) if end_time is not None else probe_info['duration_ms']
+    plan = {'mode': 'encode', 'start_ms': start_ms, 'end_ms': end_ms, 'reason': ''}
+
+    if probe_info['video_codec'] not in COPYABLE_VIDEO_CODECS:
+        plan['reason'] = f"video codec {probe_info['video_codec']} is not copyable to MP4"
+        return plan
+    if probe_info['audio_codec'] not in COPYABLE_AUDIO_CODECS:
+        plan['reason'] = f"audio codec {probe_info['audio_codec']} is not copyable to MP4"
+        return plan
+
+    if start_ms == 0:
+        plan.update(mode='copy', reason="cut starts at the beginning of the media")
+        return plan
+
+    keyframes = probe_info['keyframes_ms']
+    if not keyframes or keyframes[-1] < start_ms:
+        # Beyond the sampled window: scene cuts and variable GOPs make any estimate unsafe
+        try:
+            keyframes = probe_keyframes_near(probe_info['source'], start_ms, tolerance_ms)
+        except Exception:
+            keyframes = []
+    previous = [k for k in keyframes if k <= start_ms]
+    if not previous:
+        plan['reason'] = "keyframe positions around the cut start unknown"
+        return plan
+    drift = start_ms - max(previous)
+
+    if drift <= tolerance_ms:
+        plan.update(mode='copy', start_ms=start_ms - drift,
+                    reason=f"start is {drift}ms after a keyframe")
+    else:
+        plan['reason'] = f"nearest keyframe is {drift}ms before the cut start"
+    return plan
@@ -0,0 +1,210 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from artifacts import LOCKS_DIR, is_current_lock_file
+from perf import observe, increment, timed
+from tracing import span
+from ffmpeg_runner import run_with_progress
+from cancellation import check_cancelled
+
+# Global encode scheduler.
+# Every ffmpeg/MoviePy encode runs inside encode_slot(). Inside one process,
+# waiting jobs are ordered by priority first and then by how many slots their
+# user already holds or has used, so one user's batch cannot starve others.
+# Across processes, a slot is one of ENCODE_SLOTS lock files held with flock,
+# which caps concurrent encoders for the whole host.
+
+ENCODE_SLOTS = int(os.getenv("ENCODE_SLOTS", str(max((os.cpu_count() or 2) // 2, 1))))
+SLOT_POLL_SECONDS = 0.2
+
+# Lower value runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+_condition = threading.Condition()
+# Slots used instead of lock files where flock is unavailable
+_process_slots = threading.BoundedSemaphore(ENCODE_SLOTS)
+_IN_PROCESS_SLOT = object()
+_waiting = []  # heap of (priority, user_share, sequence, ticket)
+_sequence = itertools.count()
+_active_by_user = {}
+_served_by_user = {}
+_encode_user = contextvars.ContextVar("encode_user", default="default")
+_encode_priority = contextvars.ContextVar("encode_priority", default=PRIORITY_BATCH)
+_stats = {
+    'queued': 0,
+    'running': 0,
+    'completed': 0,
+    'max_queue_depth': 0,
+    'total_wait_seconds': 0.0
+}
+
+
+def _try_acquire_host_slot():
+    """Grab any free host-wide slot; returns the open lock file (or in-process slot) or None."""
+    if fcntl is None:
+        # No flock on this platform: cap encodes per process instead of per host
+        return _IN_PROCESS_SLOT if _process_slots.acquire(blocking=False) else None
+    os.makedirs(LOCKS_DIR, exist_ok=True)
+    for slot in range(ENCODE_SLOTS):
+        path = os.path.join(LOCKS_DIR, f"encode-slot-{slot}.lock")
+        lock_file = open(path, "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        # A slot file removed from the store since we opened it would not exclude
+        # anyone who opens its replacement; treat the slot as busy and move on
+        if is_current_lock_file(lock_file, path):
+            return lock_file
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+    return None
+
+
+def _release_host_slot(lock_file):
+    if lock_file is _IN_PROCESS_SLOT:
+        _process_slots.release()
+        return
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    lock_file.close()
+
+
+@contextmanager
+def encode_context(user_id, priority=PRIORITY_BATCH):
+    """
+    Attribute all encodes started inside the block to user_id at the given priority.
+    Lets callers set fairness/priority once instead of threading it through every helper.
+    """
+    user_token = _encode_user.set(user_id)
+    priority_token = _encode_priority.set(priority)
+    try:
+        yield
+    finally:
+        _encode_user.reset(user_token)
+        _encode_priority.reset(priority_token)
+
+
+@contextmanager
+def encode_slot(user_id=None, priority=None):
+    """
+    Wait for a fair turn and a free host-wide encode slot, then run the body.
+
+    Args:
+        user_id: Who the work is for (e.g. the Streamlit session); used for fair queuing
+        priority: PRIORITY_INTERACTIVE for single on-demand snippets, PRIORITY_BATCH for bulk work
+            (both default to the surrounding encode_context)
+    """
+    user_id = user_id or _encode_user.get()
+    priority = _encode_priority.get() if priority is None else priority
+    queued_at = time.time()
+    ticket = object()
+    with _condition:
+        share = _active_by_user.get(user_id, 0) + _served_by_user.get(user_id, 0)
+        heapq.heappush(_waiting, (priority, share, next(_sequence), ticket))
+        _stats['queued'] += 1
+        _stats['max_queue_depth'] = max(_stats['max_queue_depth'], len(_waiting))
+
+    lock_file = None
+    try:
+        while lock_file is None:
+            with _condition:
+                # Only the head of the queue may try for a host slot
+                while _waiting[0][3] is not ticket:
+                    # Wake up now and then so cancelled work leaves the queue
+                    _condition.wait(SLOT_POLL_SECONDS)
+                    check_cancelled()
+                lock_file = _try_acquire_host_slot()
+                if lock_file is not None:
+                    heapq.heappop(_waiting)
+                    _active_by_user[user_id] = _active_by_user.get(user_id, 0) + 1
+                    _stats['running'] += 1
+                    _stats['total_wait_seconds'] += time.time() - queued_at
+                    _condition.notify_all()
+            if lock_file is None:
+                # Slots are held by other processes; they cannot notify us, so poll
+                time.sleep(SLOT_POLL_SECONDS)
+                check_cancelled()
+    except BaseException:
+        with _condition:
+            if lock_file is None:
+                _waiting[:] = [entry for entry in _waiting if entry[3] is not ticket]
+                heapq.heapify(_waiting)
+                _condition.notify_all()
+        raise
+
+    try:
+        yield
+    finally:
+        _release_host_slot(lock_file)
+        with _condition:
+            _active_by_user[user_id] -= 1
+            if not _active_by_user[user_id]:
+                del _active_by_user[user_id]
+            _served_by_user[user_id] = _served_by_user.get(user_id, 0) + 1
+            _stats['running'] -= 1
+            _stats['completed'] += 1
+            if not _waiting and not _stats['running']:
+                # Idle again: start the next burst with a clean fairness slate
+                _served_by_user.clear()
+            _condition.notify_all()
+
+
+def run_ffmpeg(cmd, duration=None, timeout=None, stall_timeout=None):
+    """
+    Run an ffmpeg command inside an encode slot and return the CompletedProcess.
+
+    Progress goes to the surrounding ffmpeg_progress() callback; runs that exceed the
+    timeout or stop making progress are killed and come back with a non-zero returncode
+    (see ffmpeg_runner.run_with_progress for the arguments). A failed run's partial output
+    is removed, and OperationCancelled is raised when the current token was cancelled.
+    The result's run_seconds is the time ffmpeg itself ran, without the wait for a slot.
+    """
+    check_cancelled()
+    queued_at = time.perf_counter()
+    output = cmd[-2] if cmd[-1] == '-y' else cmd[-1]
+    with span("ffmpeg", output=output) as ffmpeg_span, encode_slot():
+        wait_seconds = time.perf_counter() - queued_at
+        observe("encode_wait_seconds", wait_seconds)
+        started = time.perf_counter()
+        with timed("subprocess_seconds", command="ffmpeg"):
+            result = run_with_progress(cmd, duration, timeout, stall_timeout)
+        result.run_seconds = time.perf_counter() - started
+        if result.returncode != 0:
+            increment("subprocess_errors_total", command="ffmpeg")
+            if os.path.isfile(output):
+                os.remove(output)
+        if result.progress:
+            increment("ffmpeg_media_seconds_total", result.progress['out_seconds'])
+        if ffmpeg_span:
+            ffmpeg_span.set_attribute("encode.wait_seconds", round(wait_seconds, 6))
+            ffmpeg_span.set_attribute("process.exit_code", result.returncode)
+            if result.progress:
+                ffmpeg_span.set_attribute("ffmpeg.fps", result.progress['fps'])
+                ffmpeg_span.set_attribute("ffmpeg.speed", result.progress['speed'])
+    check_cancelled()
+    return result
+
+
+def get_scheduler_stats():
+    """
+    Snapshot of queue-depth and throughput metrics for this process.
+    """
+    with _condition:
+        stats = dict(_stats)
+        stats['queue_depth'] = len(_waiting)
+        stats['slots'] = ENCODE_SLOTS
+        stats['active_by_user'] = dict(_active_by_user)
+        stats['avg_wait_seconds'] = stats['total_wait_seconds'] / stats['completed'] if stats['completed'] else 0.0
+    return stats
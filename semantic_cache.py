@@ -0,0 +1,308 @@
+import os
+import re
+import copy
+import json
+import time
+import zlib
+import threading
+import numpy as np
+from artifacts import atomic_output, artifact_lock
+
+# Semantic cache and re-ranker for Q&A searches.
+# With a sentence-transformers model (SEMANTIC_MODEL, CPU) queries are embedded
+# locally, so "where do they discuss price" can be answered from the cached results
+# of "pricing discussion" without another remote search call. The hashed character
+# n-gram TF-IDF fallback cannot tell paraphrases from different questions ("red car"
+# vs "red cat"), so without a model only queries with the same words (ignoring case,
+# punctuation and stopwords) share results; TF-IDF is still used for re-ranking.
+
+SEMANTIC_MODEL = os.getenv("SEMANTIC_MODEL", "")
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", ".semantic_cache.json")
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_HOURS", "24")) * 3600
+SEMANTIC_CACHE_MAX_ENTRIES = 500
+
+# Minimum cosine similarity for reusing another query's results (model backend only)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+
+RERANK_WEIGHT = float(os.getenv("RERANK_WEIGHT", "0.3"))
+
+HASH_DIMENSIONS = 4096
+MIN_IDF_DOCUMENTS = 20
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "about",
+    "is", "are", "was", "were", "be", "do", "does", "did", "they", "he", "she", "it", "we",
+    "you", "i", "me", "show", "find", "where", "when", "what", "which", "who", "how",
+    "there", "this", "that", "any", "some", "video", "part", "parts"
+}
+
+_lock = threading.Lock()
+_entries = []  # dicts: scope, query, results, created
+_entry_tf = np.zeros((0, HASH_DIMENSIONS), dtype=np.float32)
+_entry_embeddings = None  # model embeddings, only when a model is loaded
+_context_tf = np.zeros((0, HASH_DIMENSIONS), dtype=np.float32)
+_model = None
+_model_checked = False
+_loaded = False
+_stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+
+def _get_model():
+    """Load the optional sentence-transformers model once; None means TF-IDF."""
+    global _model, _model_checked
+    if not _model_checked:
+        _model_checked = True
+        if SEMANTIC_MODEL:
+            try:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(SEMANTIC_MODEL, device="cpu")
+            except Exception as e:
+                print(f"Warning: semantic model '{SEMANTIC_MODEL}' unavailable, using TF-IDF: {str(e)}")
+    return _model
+
+
+def embedding_backend():
+    return 'model' if _get_model() is not None else 'tfidf'
+
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def normalize_query(text):
+    """Lowercased words without stopwords or punctuation; the TF-IDF backend's cache key."""
+    return " ".join(word for word in _words(text) if word not in STOPWORDS)
+
+
+def _features(text):
+    # Whole words plus character 3/4-grams, so "price"/"pricing" and "discuss"/"discussion" overlap
+    features = []
+    for word in _words(text):
+        if word in STOPWORDS:
+            continue
+        features.append(f"w:{word}")
+        padded = f"<{word}>"
+        for n in (3, 4):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return features
+
+
+def term_frequencies(texts):
+    """Hashed, sublinear term-frequency rows (one per text) as a NumPy matrix."""
+    matrix = np.zeros((len(texts), HASH_DIMENSIONS), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            matrix[row, zlib.crc32(feature.encode()) % HASH_DIMENSIONS] += 1
+    np.log1p(matrix, out=matrix)
+    return matrix
+
+
+def _idf():
+    corpus = np.vstack([_entry_tf, _context_tf])
+    if len(corpus) < MIN_IDF_DOCUMENTS:
+        # Too few documents for meaningful frequencies; unseen terms would dominate
+        return np.ones(HASH_DIMENSIONS, dtype=np.float32)
+    document_frequency = np.count_nonzero(corpus, axis=0)
+    return np.log((1 + len(corpus)) / (1 + document_frequency)) + 1
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def similarity(query, texts):
+    """
+    Cosine similarity of one query against a list of texts, computed in one matrix product.
+    """
+    if not texts:
+        return np.zeros(0, dtype=np.float32)
+    model = _get_model()
+    if model is not None:
+        vectors = model.encode([query] + list(texts), normalize_embeddings=True)
+        return vectors[1:] @ vectors[0]
+    with _lock:
+        idf = _idf()
+    weighted = _normalize(term_frequencies([query] + list(texts)) * idf)
+    return weighted[1:] @ weighted[0]
+
+
+def add_context_texts(texts):
+    """
+    Add chapter/highlight text to the TF-IDF corpus, so document frequencies reflect
+    the vocabulary of the indexed videos and not only past queries.
+    """
+    global _context_tf
+    texts = [text for text in texts if text]
+    if not texts:
+        return
+    with _lock:
+        _context_tf = np.vstack([_context_tf, term_frequencies(texts)])[-SEMANTIC_CACHE_MAX_ENTRIES:]
+
+
+def _read_entries():
+    if not os.path.exists(SEMANTIC_CACHE_PATH):
+        return []
+    try:
+        with open(SEMANTIC_CACHE_PATH, "r") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return []
+    now = time.time()
+    return [entry for entry in entries if now - entry['created'] < SEMANTIC_CACHE_TTL_SECONDS]
+
+
+def _load():
+    global _loaded, _entries, _entry_tf
+    if _loaded:
+        return
+    _loaded = True
+    _entries = _read_entries()
+    _entry_tf = term_frequencies([entry['query'] for entry in _entries])
+
+
+def _save():
+    # Other sessions and processes share the file: merge their newer entries in, under
+    # a lock, and publish with temp-then-rename so readers never see a partial file
+    try:
+        with artifact_lock("semantic-cache"):
+            merged = {(entry['scope'], entry['query']): entry for entry in _read_entries()}
+            for entry in _entries:
+                key = (entry['scope'], entry['query'])
+                if key not in merged or merged[key]['created'] <= entry['created']:
+                    merged[key] = entry
+            entries = sorted(merged.values(), key=lambda entry: entry['created'])[-SEMANTIC_CACHE_MAX_ENTRIES:]
+            with atomic_output(SEMANTIC_CACHE_PATH) as temp_path:
+                with open(temp_path, "w") as f:
+                    # SDK metadata objects are stored by their string form
+                    json.dump(entries, f, default=str)
+    except OSError as e:
+        print(f"Warning: could not save semantic cache: {str(e)}")
+
+
+def _entry_vectors(indices):
+    # Model embeddings of cached queries, computed once per change of the entry list
+    global _entry_embeddings
+    model = _get_model()
+    if _entry_embeddings is None or len(_entry_embeddings) != len(_entries):
+        _entry_embeddings = model.encode([entry['query'] for entry in _entries], normalize_embeddings=True)
+    return _entry_embeddings[indices]
+
+
+def lookup_query(scope, query, threshold=None):
+    """
+    Return cached results of an earlier query that means the same thing, or None.
+    Without an embedding model only queries with the same normalized words match.
+
+    Args:
+        scope: Cache partition, e.g. "<index_id>:<video_id or *>:<max_results>"
+        query: The new query text
+        threshold: Minimum cosine similarity for the model backend (default SEMANTIC_CACHE_THRESHOLD)
+
+    Returns:
+        Dictionary with a copy of the cached 'results', the 'matched_query' and its 'similarity', or None
+    """
+    threshold = threshold if threshold is not None else SEMANTIC_CACHE_THRESHOLD
+    with _lock:
+        _load()
+        now = time.time()
+        candidates = [
+            i for i, entry in enumerate(_entries)
+            if entry['scope'] == scope and now - entry['created'] < SEMANTIC_CACHE_TTL_SECONDS
+        ]
+        if not candidates:
+            _stats['misses'] += 1
+            return None
+
+        model = _get_model()
+        if model is not None:
+            query_vector = model.encode([query], normalize_embeddings=True)[0]
+            scores = _entry_vectors(candidates) @ query_vector
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+        else:
+            key = normalize_query(query)
+            matches = [i for i in candidates if normalize_query(_entries[i]['query']) == key]
+            best, score = (len(matches) - 1, 1.0) if key and matches else (None, 0.0)
+            candidates = matches
+        if best is None or score < threshold:
+            _stats['misses'] += 1
+            return None
+
+        _stats['hits'] += 1
+        entry = _entries[candidates[best]]
+        return {
+            'results': copy.deepcopy(entry['results']),
+            'matched_query': entry['query'],
+            'similarity': score
+        }
+
+
+def store_query(scope, query, results):
+    """Remember the results of a remote search for later near-duplicate queries."""
+    global _entries, _entry_tf, _entry_embeddings
+    with _lock:
+        _load()
+        # A repeated query replaces its old entry
+        keep = [i for i, entry in enumerate(_entries) if not (entry['scope'] == scope and entry['query'] == query)]
+        keep = keep[-(SEMANTIC_CACHE_MAX_ENTRIES - 1):]
+        _entries = [_entries[i] for i in keep] + [{
+            'scope': scope,
+            'query': query,
+            'results': copy.deepcopy(results),
+            'created': time.time()
+        }]
+        _entry_tf = np.vstack([_entry_tf[keep], term_frequencies([query])])
+        _entry_embeddings = None
+        _stats['stores'] += 1
+        _save()
+
+
+def rerank_segments(query, segments, context_items=(), weight=RERANK_WEIGHT):
+    """
+    Re-rank search hits by local text similarity to the query.
+
+    Each hit is described by its own text plus the title/summary of every chapter or
+    highlight that overlaps it in time. The final 'rerank_score' blends the remote
+    score (normalized to the best hit) with that similarity.
+
+    Args:
+        query: Search query
+        segments: Search results (start_time, end_time, video_id, score, text)
+        context_items: Chapter/highlight dicts with start_sec, end_sec and text fields
+        weight: Share of the local similarity in the blended score (0 keeps the remote order)
+
+    Returns:
+        New list of segments, best first, each with 'rerank_score' and 'text_similarity'
+    """
+    if not segments:
+        return []
+
+    descriptions = []
+    for segment in segments:
+        parts = [segment.get('text') or ""]
+        for item in context_items:
+            if item['start_sec'] < segment['end_time'] and item['end_sec'] > segment['start_time']:
+                parts += [str(item.get(field, "")) for field in
+                          ('chapter_title', 'chapter_summary', 'highlight', 'highlight_summary')]
+        descriptions.append(" ".join(part for part in parts if part))
+
+    if not any(descriptions):
+        # Nothing to compare against (e.g. purely visual hits without chapters)
+        return [dict(segment, rerank_score=segment.get('score') or 0, text_similarity=0.0) for segment in segments]
+
+    remote = np.array([segment.get('score') or 0 for segment in segments], dtype=np.float32)
+    remote = remote / remote.max() if remote.max() > 0 else remote
+    text_similarity = similarity(query, descriptions)
+    blended = (1 - weight) * remote + weight * text_similarity
+
+    reranked = [
+        dict(segment, rerank_score=float(score), text_similarity=float(sim))
+        for segment, score, sim in zip(segments, blended, text_similarity)
+    ]
+    reranked.sort(key=lambda x: x['rerank_score'], reverse=True)
+    return reranked
+
+
+def get_semantic_cache_stats():
+    with _lock:
+        return dict(_stats, entries=len(_entries), backend='model' if _model is not None else 'tfidf')
@@ -0,0 +1,147 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import inspect
+import threading
+import functools
+from artifacts import CACHE_DIR, artifact_lock, atomic_output
+from cancellation import CANCEL_POLL_SECONDS, check_cancelled
+
+# Single-flight for remote calls.
+# While a call with the same function and arguments is in flight, other callers wait
+# for it and get its result instead of issuing their own request. Threads in one
+# process share the leader's return value; other processes queue on a per-key lock
+# file and read the result the leader left behind, so a popular video costs one API
+# call per burst instead of one per session.
+
+SINGLE_FLIGHT_DIR = os.path.join(CACHE_DIR, "singleflight")
+SINGLE_FLIGHT_CROSS_PROCESS = os.getenv("SINGLE_FLIGHT_CROSS_PROCESS", "1") == "1"
+
+# Arguments that identify the caller rather than the request
+IGNORED_ARGUMENTS = ("client",)
+
+_lock = threading.Lock()
+_inflight = {}
+_stats = {'calls': 0, 'executed': 0, 'shared_in_process': 0, 'shared_across_processes': 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def call_key(fn, args, kwargs):
+    """Stable key for a call: the function plus its bound arguments, minus the client."""
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = {name: value for name, value in bound.arguments.items() if name not in IGNORED_ARGUMENTS}
+    # The index is implicit in most wrappers, and processes may be configured for different ones
+    raw = json.dumps([os.getenv("INDEX_ID"), fn.__module__, fn.__qualname__, arguments], sort_keys=True, default=repr)
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def _read_shared(path, not_before):
+    # Only a result that finished after this caller arrived counts: that call was in
+    # flight while we waited. Older files are stale and must not act as a cache.
+    try:
+        with open(path, "r") as f:
+            shared = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return shared if shared['finished'] >= not_before else None
+
+
+def _shareable(value):
+    # Only JSON-native results cross processes; anything else (SDK objects, tuples that
+    # would come back as lists) makes other processes run their own call
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _shareable(item) for key, item in value.items())
+    if isinstance(value, list):
+        return all(_shareable(item) for item in value)
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _write_shared(path, value):
+    if not _shareable(value):
+        return
+    payload = json.dumps({'finished': time.time(), 'value': value})
+    os.makedirs(SINGLE_FLIGHT_DIR, exist_ok=True)
+    with atomic_output(path) as temp_path:
+        with open(temp_path, "w") as f:
+            f.write(payload)
+
+
+def _run(fn, args, kwargs):
+    with _lock:
+        _stats['executed'] += 1
+    return fn(*args, **kwargs)
+
+
+def _execute(key, fn, args, kwargs, arrived):
+    if not SINGLE_FLIGHT_CROSS_PROCESS:
+        return _run(fn, args, kwargs)
+    path = os.path.join(SINGLE_FLIGHT_DIR, f"{key}.json")
+    with artifact_lock(f"singleflight-{key}", wait_check=check_cancelled):
+        shared = _read_shared(path, arrived)
+        if shared is not None:
+            with _lock:
+                _stats['shared_across_processes'] += 1
+            return shared['value']
+        value = _run(fn, args, kwargs)
+        _write_shared(path, value)
+        return value
+
+
+def single_flight(fn):
+    """
+    Decorator: concurrent identical calls of fn share one execution.
+
+    Only JSON-native results are shared with other processes; for anything else they
+    make their own call. Errors are raised to every caller waiting in this process;
+    other processes retry on their own. Waiting callers stop as soon as their own
+    cancellation token is cancelled, without affecting the leader.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        arrived = time.time()
+        key = call_key(fn, args, kwargs)
+        with _lock:
+            _stats['calls'] += 1
+            call = _inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _inflight[key] = _Call()
+
+        if not leader:
+            while not call.done.wait(CANCEL_POLL_SECONDS):
+                check_cancelled()
+            with _lock:
+                _stats['shared_in_process'] += 1
+            if call.error is not None:
+                raise call.error
+            # Every caller gets its own copy, so one cannot mutate another's result
+            return copy.deepcopy(call.value)
+
+        try:
+            value = _execute(key, fn, args, kwargs, arrived)
+            # Waiters copy from a snapshot the leader's caller cannot mutate
+            call.value = copy.deepcopy(value)
+            return value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with _lock:
+                del _inflight[key]
+            call.done.set()
+
+    return wrapper
+
+
+def get_single_flight_stats():
+    with _lock:
+        return dict(_stats, inflight=len(_inflight))
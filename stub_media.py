@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import threading
+import subprocess
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from probe import FFMPEG_BIN
+from artifacts import ARTIFACT_ROOT
+
+# Synthetic media for offline runs: ffmpeg-generated test videos, an HLS ladder cut
+# from them, and a local HTTP server for that ladder that counts the bytes it serves.
+# Together with twelvelabs_stub this replaces TwelveLabs' streaming URLs, so snippet
+# and download paths can be measured without network access.
+#
+#   python stub_media.py --duration 120 --port 9100
+
+HLS_SEGMENT_SECONDS = 2
+
+# (width, height, video bitrate) of each generated rendition
+HLS_RENDITIONS = ((1280, 720, "2M"), (640, 360, "600k"))
+
+
+def generate_test_video(output_path, duration=30, width=1280, height=720, fps=25, gop=50):
+    """
+    Write a synthetic H.264/AAC MP4 (moving test pattern plus a tone).
+
+    Args:
+        output_path: Where to write the MP4
+        duration: Length in seconds
+        width: Frame width in pixels
+        height: Frame height in pixels
+        fps: Frame rate
+        gop: Keyframe interval in frames (controls how often cuts can be stream-copied)
+
+    Returns:
+        output_path
+    """
+    cmd = [
+        FFMPEG_BIN, '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '96k', '-shortest', '-movflags', '+faststart',
+        output_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Could not generate test video: {result.stderr}")
+    return output_path
+
+
+def generate_test_hls(output_dir, duration=30, renditions=HLS_RENDITIONS, segment_seconds=HLS_SEGMENT_SECONDS,
+                      segment_type="mpegts"):
+    """
+    Write a multi-rendition VOD HLS stream (master.m3u8 plus v0/, v1/, ...) from a synthetic source.
+    segment_type is "mpegts" (.ts segments) or "fmp4" (.m4s segments with an init section).
+
+    Returns:
+        Path of the master playlist
+    """
+    master_path = os.path.join(output_dir, "master.m3u8")
+    if os.path.exists(master_path):
+        return master_path
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Keyframes exactly on segment boundaries, like TwelveLabs' own ladders
+    gop = 25 * segment_seconds
+    split = f"[0:v]split={len(renditions)}" + "".join(f"[s{i}]" for i in range(len(renditions)))
+    filters = [split] + [f"[s{i}]scale={width}:{height}[v{i}]" for i, (width, height, _) in enumerate(renditions)]
+    cmd = [
+        FFMPEG_BIN, '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size=1280x720:rate=25:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=44100:duration={duration}",
+        '-filter_complex', ";".join(filters)
+    ]
+    for i, (_, _, bitrate) in enumerate(renditions):
+        cmd += ['-map', f"[v{i}]", '-map', '1:a', f"-b:v:{i}", bitrate]
+    cmd += [
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', '96k',
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-hls_segment_type', segment_type,
+        '-hls_segment_filename', os.path.join(output_dir, "v%v", "seg%03d.m4s" if segment_type == "fmp4" else "seg%03d.ts"),
+        '-master_pl_name', "master.m3u8",
+        '-var_stream_map', " ".join(f"v:{i},a:{i}" for i in range(len(renditions))),
+        os.path.join(output_dir, "v%v", "index.m3u8")
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Could not generate test HLS stream: {result.stderr}")
+    return master_path
+
+
+class _CountingHandler(SimpleHTTPRequestHandler):
+    """Static file handler that adds every body byte it sends to the server's counters."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        while True:
+            chunk = source.read(64 * 1024)
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self.server.count(self.path, len(chunk))
+
+
+class HlsServer(ThreadingHTTPServer):
+    """
+    Local HTTP server for a directory of media, with per-path byte counters.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory, host="127.0.0.1", port=0):
+        super().__init__((host, port), partial(_CountingHandler, directory=directory))
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.bytes_by_path = {}
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # Players and yt-dlp routinely hang up mid-body; that is not a server error
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def count(self, path, size):
+        with self._lock:
+            self.bytes_by_path[path] = self.bytes_by_path.get(path, 0) + size
+
+    @property
+    def bytes_served(self):
+        with self._lock:
+            return sum(self.bytes_by_path.values())
+
+    def reset_counters(self):
+        with self._lock:
+            self.bytes_by_path.clear()
+
+    def url(self, relative_path="master.m3u8"):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{relative_path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def serve_test_hls(output_dir, duration=30, host="127.0.0.1", port=0, segment_type="mpegts"):
+    """
+    Generate (once) and serve a synthetic HLS stream.
+
+    Returns:
+        Running HlsServer; its url() is the master playlist
+    """
+    generate_test_hls(output_dir, duration, segment_type=segment_type)
+    return HlsServer(output_dir, host, port).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and serve a synthetic HLS stream for offline testing.")
+    parser.add_argument("--output-dir", default=os.path.join(ARTIFACT_ROOT, "stub_hls"))
+    parser.add_argument("--duration", type=int, default=60, help="Stream length in seconds")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--segment-type", choices=["mpegts", "fmp4"], default="mpegts")
+    options = parser.parse_args(argv)
+
+    server = serve_test_hls(options.output_dir, options.duration, options.host, options.port, options.segment_type)
+    print(f"Serving {server.url()} (set TWELVELABS_STUB_HLS_URL to this URL); Ctrl-C to stop")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        print(f"Served {server.bytes_served} bytes")
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,13 +13,12 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 load_dotenv()
 
-def test_analysis_functions():
+def test_analysis_functions(isolated_store):
     """Test the new analysis functions with basic functionality."""
     
     try:
-        from twelvelabs import TwelveLabs
         from utils import (
-            API_KEY, INDEX_ID, generate_summary, generate_chapters, 
+            API_KEY, INDEX_ID, make_client, generate_summary, generate_chapters, 
             generate_highlights, generate_open_analysis, 
             create_contextual_snippet_analysis, fetch_existing_videos
         )
@@ -27,7 +26,7 @@ def test_analysis_functions():
         print("✅ Successfully imported all required functions")
         
         # Initialize client
-        client = TwelveLabs(api_key=API_KEY)
+        client = make_client()
         print("✅ TwelveLabs client initialized successfully")
         
         # Test fetching existing videos
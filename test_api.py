@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import subprocess
+import pytest
+from fastapi.testclient import TestClient
+import api
+from twelvelabs_stub import StubTwelveLabs, StubApiError
+
+# Caches, locks and job outputs of every test go to its own tmp_path
+pytestmark = pytest.mark.usefixtures("isolated_store")
+
+
+def _wait_for_job(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job['status'] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_search_uses_the_given_client():
+    stub = StubTwelveLabs()
+    with TestClient(api.create_app(client=stub)) as client:
+        response = client.post("/search", json={'query': "pricing", 'video_id': "stub-video-1",
+                                                'search_mode': "remote"})
+    assert response.status_code == 200
+    assert stub.calls['search.query'] == 1
+
+
+def test_snippet_jobs_use_the_given_client():
+    # No streaming URL, so the job fails right after looking the video up
+    stub = StubTwelveLabs(videos=[{'id': "api-test-video", 'duration': 30}])
+    with TestClient(api.create_app(client=stub)) as client:
+        response = client.post("/videos/api-test-video/snippets", json={'start_time': 1, 'end_time': 3})
+        assert response.status_code == 202
+        job = _wait_for_job(client, response.json()['job_id'])
+        assert 'cancel_token' not in job
+    assert job['status'] == "error" and "video URL" in job['error']
+    assert stub.calls['indexes.videos.retrieve'] == 1
+
+
+def test_unknown_job_is_404():
+    with TestClient(api.create_app(client=StubTwelveLabs())) as client:
+        assert client.get("/jobs/missing").status_code == 404
+        assert client.delete("/jobs/missing").status_code == 404
+
+
+def test_upstream_failures_are_502():
+    stub = StubTwelveLabs(fail_endpoints=("search.query",))
+    with TestClient(api.create_app(client=stub), raise_server_exceptions=False) as client:
+        response = client.post("/search", json={'query': "pricing", 'video_id': "stub-video-1",
+                                                'search_mode': "remote", 'max_results': 3})
+    assert response.status_code == 502
+
+
+def test_error_classification():
+    try:
+        try:
+            raise StubApiError("rate limited", status_code=429)
+        except Exception as e:
+            raise Exception(f"Error searching video content: {str(e)}")
+    except Exception as wrapped:
+        assert api.is_upstream_error(wrapped) and not api.is_client_error(wrapped)
+    assert api.is_upstream_error(TimeoutError("read timed out"))
+    assert not api.is_upstream_error(Exception("FFmpeg failed"))
+    try:
+        try:
+            raise ValueError("No time ranges given for the export")
+        except Exception as e:
+            raise Exception(f"Error creating supercut: {str(e)}")
+    except Exception as wrapped:
+        assert api.is_client_error(wrapped) and not api.is_upstream_error(wrapped)
+    assert not api.is_upstream_error(TypeError("bad argument"))
+
+
+def test_invalid_requests_are_rejected():
+    with TestClient(api.create_app(client=StubTwelveLabs()), raise_server_exceptions=False) as client:
+        search = client.post("/search", json={'query': "pricing", 'search_mode': "visual"})
+        assert search.status_code == 422
+        supercut = client.post("/videos/stub-video-1/supercut", json={'items': [{'title': "no times"}]})
+        assert supercut.status_code == 400 and "start/end" in supercut.json()['detail']
+        empty = client.post("/videos/stub-video-1/supercut", json={'items': []})
+        assert empty.status_code == 400
+
+
+def test_app_is_built_on_first_access(isolated_store):
+    code = ("import api, utils\n"
+            "calls = []\n"
+            "utils.make_client = api.make_client = lambda: calls.append(1) or object()\n"
+            "assert api._app is None and not calls\n"
+            "assert api.app is api.app and calls == [1]\n")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            env=dict(os.environ, ARTIFACT_ROOT=str(isolated_store)))
+    assert result.returncode == 0, result.stderr
+
+
+def test_stats_report_artifact_disk_usage():
+    with TestClient(api.create_app(client=StubTwelveLabs())) as client:
+        stats = client.get("/stats").json()
+    assert stats['artifacts']['disk_usage_bytes'] >= 0
+    assert stats['artifacts']['quota_bytes'] == api.ARTIFACT_QUOTA_BYTES
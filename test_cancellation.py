@@ -0,0 +1,55 @@
+import time
+import pytest
+import cancellation
+from cancellation import (
+    CancelToken, OperationCancelled, cancel_scope, cancellable, check_cancelled, current_token, sleep_or_cancel
+)
+
+
+def test_cancelling_a_parent_cancels_its_children():
+    parent = CancelToken()
+    with cancel_scope(parent):
+        with cancel_scope(timeout=60) as child:
+            assert child is not parent and child.parent is parent
+            parent.cancel("session closed")
+            with pytest.raises(OperationCancelled, match="session closed"):
+                check_cancelled()
+    assert current_token() is None
+    check_cancelled()  # No-op outside any scope
+
+
+def test_deadline_and_external_check():
+    token = CancelToken(timeout=0.05)
+    assert not token.cancelled
+    time.sleep(0.1)
+    assert token.cancelled and "deadline" in token.reason
+
+    reasons = []
+    checked = CancelToken(check=lambda: reasons.pop() if reasons else None)
+    assert not checked.cancelled
+    reasons.append("browser tab gone")
+    assert checked.cancelled and checked.reason == "browser tab gone"
+
+
+def test_sleep_or_cancel_wakes_up_on_deadline():
+    started = time.monotonic()
+    with cancel_scope(timeout=0.1):
+        with pytest.raises(OperationCancelled):
+            sleep_or_cancel(30)
+    assert time.monotonic() - started < 2
+
+
+def test_cancellable_applies_the_operation_deadline(monkeypatch):
+    monkeypatch.setitem(cancellation.OPERATION_DEADLINES, 'snippet', 0.05)
+
+    @cancellable("snippet")
+    def render():
+        time.sleep(0.1)
+        # Callers wrap failures in plain exceptions; the cancellation is reported instead
+        try:
+            check_cancelled()
+        except OperationCancelled as e:
+            raise Exception(f"Error creating snippet: {str(e)}")
+
+    with pytest.raises(OperationCancelled, match="deadline of 0.05s exceeded"):
+        render()
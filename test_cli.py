@@ -0,0 +1,26 @@
+import json
+import cli
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(
+        json.dumps({'source': "a.mp4", 'status': "ok"}) + "\n"
+        + json.dumps({'source': "b.mp4", 'status': "error"}) + "\n"
+        + '{"source": "c.mp4", "sta'
+    )
+    assert cli.load_completed(str(path)) == {"a.mp4"}
+
+    writer = cli.ResultWriter(str(path))
+    writer.write({'source': "c.mp4", 'status': "ok"})
+    lines = path.read_text().splitlines()
+    assert lines[2] == '{"source": "c.mp4", "sta'
+    assert json.loads(lines[3]) == {'source': "c.mp4", 'status': "ok"}
+    assert cli.load_completed(str(path)) == {"a.mp4", "c.mp4"}
+
+
+def test_missing_results_file_means_nothing_completed(tmp_path):
+    assert cli.load_completed(str(tmp_path / "none.jsonl")) == set()
+    writer = cli.ResultWriter(str(tmp_path / "out" / "results.jsonl"))
+    writer.write({'source': "a.mp4", 'status': "ok"})
+    assert cli.load_completed(writer.path) == {"a.mp4"}
@@ -12,15 +12,21 @@ load_dotenv()
 
 API_KEY = os.getenv("TWELVE_LABS_API_KEY")
 INDEX_ID = os.getenv("TWELVE_LABS_INDEX_ID")
+# Set TWELVELABS_STUB=1 to run against the offline stub client instead
+TWELVELABS_STUB = os.getenv("TWELVELABS_STUB")
 
 def test_corrected_search():
     """Test the corrected search implementation."""
-    if not API_KEY or not INDEX_ID:
+    if not TWELVELABS_STUB and (not API_KEY or not INDEX_ID):
         print("❌ Missing API credentials")
         return False
     
     try:
-        client = TwelveLabs(api_key=API_KEY)
+        if TWELVELABS_STUB:
+            from twelvelabs_stub import get_stub_client
+            client = get_stub_client()
+        else:
+            client = TwelveLabs(api_key=API_KEY)
         print("✅ Client created successfully")
         
         # Get a video to test with
@@ -0,0 +1,27 @@
+import pytest
+from ffmpeg_runner import parse_progress
+
+
+def test_progress_with_known_duration():
+    progress = parse_progress({'frame': "250", 'fps': "50.0", 'out_time_us': "10000000", 'speed': "2.5x",
+                               'total_size': "1048576", 'progress': "continue"}, duration=40)
+    assert progress == {
+        'frame': 250, 'fps': 50.0, 'speed': 2.5, 'out_seconds': 10.0, 'total_size': 1048576,
+        'done': False, 'percent': 25.0, 'eta_seconds': pytest.approx(12.0)
+    }
+
+
+def test_progress_edge_cases():
+    # Before the first frame ffmpeg reports N/A and negative times
+    start = parse_progress({'frame': "0", 'out_time_us': "-5000", 'speed': "N/A", 'total_size': "N/A"}, duration=10)
+    assert start['out_seconds'] == 0.0 and start['speed'] is None and start['eta_seconds'] is None
+    assert start['percent'] == 0.0 and start['total_size'] == 0
+
+    # Older builds only send out_time_ms (which is in microseconds as well)
+    assert parse_progress({'out_time_ms': "3000000"})['out_seconds'] == 3.0
+    assert parse_progress({'out_time_us': "3000000"})['percent'] is None
+
+    done = parse_progress({'out_time_us': "9900000", 'speed': "3x", 'progress': "end"}, duration=10)
+    assert done['done'] and done['percent'] == 100.0 and done['eta_seconds'] == 0.0
+    # Output can run past the expected duration; percent is capped
+    assert parse_progress({'out_time_us': "12000000"}, duration=10)['percent'] == 100.0
@@ -0,0 +1,27 @@
+import os
+import file_server
+
+
+def test_urls_are_scoped_to_registered_roots(isolated_store, tmp_path, monkeypatch):
+    jobs = tmp_path / "jobs"
+    (jobs / "job-a").mkdir(parents=True)
+    (jobs / "job-b").mkdir()
+    (jobs / "job-a" / "clip.mp4").write_bytes(b"a")
+    (jobs / "job-b" / "clip.mp4").write_bytes(b"b")
+    monkeypatch.setattr(file_server, "_server_available", True)
+    monkeypatch.setattr(file_server, "_served_roots", {'job': os.path.join(str(jobs), "{scope}")})
+
+    url = file_server.get_file_url(str(jobs / "job-a" / "clip.mp4"), "job-a", base_url="http://localhost:8502")
+    assert url == f"http://localhost:8502/files/job-a/{file_server.scope_token('job-a')}/job/clip.mp4"
+    # Another session's files are not reachable with this session's scope
+    assert file_server.get_file_url(str(jobs / "job-b" / "clip.mp4"), "job-a", base_url="http://x") is None
+    assert file_server.scope_token("job-a") != file_server.scope_token("job-b")
+
+
+def test_public_url_only_for_local_browsers(monkeypatch):
+    monkeypatch.setattr(file_server, "FILE_SERVER_PUBLIC_URL", "")
+    assert file_server.public_base_url("localhost:8501") == f"http://localhost:{file_server.FILE_SERVER_PORT}"
+    assert file_server.public_base_url("app.example.com") is None
+    assert file_server.public_base_url(None) is None
+    monkeypatch.setattr(file_server, "FILE_SERVER_PUBLIC_URL", "https://media.example.com")
+    assert file_server.public_base_url("app.example.com") == "https://media.example.com"
@@ -0,0 +1,62 @@
+import probe
+
+
+def _info(keyframes_ms, duration_ms=600000):
+    info = probe._empty_probe("/media/source.mp4")
+    info.update(video_codec="h264", audio_codec="aac", duration_ms=duration_ms, keyframes_ms=keyframes_ms,
+                keyframe_interval_ms=probe._keyframe_interval(keyframes_ms))
+    return info
+
+
+def test_copy_inside_sampled_window_starts_on_previous_keyframe():
+    plan = probe.plan_cut(_info([0, 2000, 4000, 6000]), 4.3, 10)
+    assert plan['mode'] == 'copy' and plan['start_ms'] == 4000
+
+
+def test_far_from_keyframe_is_reencoded():
+    plan = probe.plan_cut(_info([0, 2000, 4000, 6000]), 5.0, 10)
+    assert plan['mode'] == 'encode'
+
+
+def test_beyond_window_uses_probed_keyframes(monkeypatch):
+    calls = []
+
+    def near(source, start_ms, window_ms):
+        calls.append((source, start_ms))
+        # A scene cut put a keyframe off the regular 2s grid
+        return [119300, 120900]
+
+    monkeypatch.setattr(probe, "probe_keyframes_near", near)
+    plan = probe.plan_cut(_info([0, 2000, 4000]), 121.0, 125.0)
+    assert calls == [("/media/source.mp4", 121000)]
+    assert plan['mode'] == 'copy' and plan['start_ms'] == 120900
+
+
+def test_beyond_window_without_keyframes_is_reencoded(monkeypatch):
+    def near(source, start_ms, window_ms):
+        raise Exception("ffprobe not found")
+
+    monkeypatch.setattr(probe, "probe_keyframes_near", near)
+    # A fixed-GOP guess would say 120000 is a keyframe
+    assert probe.plan_cut(_info([0, 2000, 4000]), 120.0, 125.0)['mode'] == 'encode'
+
+
+def test_keyframe_interval_needs_two_keyframes():
+    assert probe._keyframe_interval([]) is None
+    assert probe._keyframe_interval([0]) is None
+    assert probe._keyframe_interval([0, 2000, 5000]) == 3000
+
+
+def test_probe_caches_are_bounded_and_expire(monkeypatch):
+    from collections import OrderedDict
+    cache = OrderedDict()
+    monkeypatch.setattr(probe, "PROBE_CACHE_MAX_ENTRIES", 2)
+    probe._cache_put(cache, "a", 1)
+    probe._cache_put(cache, "b", 2)
+    assert probe._cache_get(cache, "a") == 1  # "a" is now the most recently used
+    probe._cache_put(cache, "c", 3)
+    assert list(cache) == ["a", "c"]
+
+    monkeypatch.setattr(probe, "PROBE_CACHE_TTL_SECONDS", -1)
+    probe._cache_put(cache, "d", 4)
+    assert probe._cache_get(cache, "d") is None and "d" not in cache
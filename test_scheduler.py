@@ -0,0 +1,65 @@
+import time
+import subprocess
+import threading
+import scheduler
+
+
+def test_without_flock_slots_are_capped_in_process(monkeypatch):
+    monkeypatch.setattr(scheduler, "fcntl", None)
+    monkeypatch.setattr(scheduler, "_process_slots", threading.BoundedSemaphore(1))
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def encode():
+        with scheduler.encode_slot(user_id="u"):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.05)
+            with lock:
+                running[0] -= 1
+
+    workers = [threading.Thread(target=encode) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    assert peak[0] == 1
+    # Every slot was handed back
+    assert scheduler._process_slots.acquire(blocking=False)
+
+
+def test_replaced_slot_file_is_not_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "LOCKS_DIR", str(tmp_path))
+    monkeypatch.setattr(scheduler, "ENCODE_SLOTS", 1)
+    real_flock = scheduler.fcntl.flock
+
+    def flock_after_replace(fd, operation):
+        # Another process removes and recreates the slot file between our open and flock
+        if operation & scheduler.fcntl.LOCK_EX:
+            path = tmp_path / "encode-slot-0.lock"
+            path.unlink()
+            path.touch()
+        real_flock(fd, operation)
+
+    monkeypatch.setattr(scheduler.fcntl, "flock", flock_after_replace)
+    assert scheduler._try_acquire_host_slot() is None
+
+
+def test_run_seconds_excludes_the_slot_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, "fcntl", None)
+    monkeypatch.setattr(scheduler, "_process_slots", threading.BoundedSemaphore(1))
+
+    def run(cmd, *args):
+        result = subprocess.CompletedProcess(cmd, 0, "", "")
+        result.progress = None
+        return result
+
+    monkeypatch.setattr(scheduler, "run_with_progress", run)
+
+    scheduler._process_slots.acquire()
+    threading.Timer(0.3, scheduler._process_slots.release).start()
+    started = time.perf_counter()
+    result = scheduler.run_ffmpeg(["ffmpeg"])
+    assert time.perf_counter() - started >= 0.3
+    assert result.run_seconds < 0.2
@@ -0,0 +1,44 @@
+import semantic_cache
+
+
+def _fresh_cache(monkeypatch):
+    # isolated_store gives an empty cache file; this forces the TF-IDF backend
+    monkeypatch.setattr(semantic_cache, "_model", None)
+    monkeypatch.setattr(semantic_cache, "_model_checked", True)
+
+
+def test_tfidf_backend_reuses_only_same_words(isolated_store, monkeypatch):
+    _fresh_cache(monkeypatch)
+    semantic_cache.store_query("scope", "Where is the red car?", [{'start_time': 1.0}])
+
+    hit = semantic_cache.lookup_query("scope", "red car")
+    assert hit is not None and hit['results'] == [{'start_time': 1.0}]
+    assert semantic_cache.lookup_query("other-scope", "red car") is None
+
+
+def test_tfidf_backend_rejects_different_questions(isolated_store, monkeypatch):
+    _fresh_cache(monkeypatch)
+    pairs = [
+        ("red car", "red cat"),
+        ("people walking", "people talking"),
+        ("CEO interview", "CFO interview"),
+        ("apple lunch event", "apple launch event"),
+        ("pricing discussion", "where do they discuss price"),
+    ]
+    for stored, asked in pairs:
+        semantic_cache.store_query("scope", stored, [{'query': stored}])
+        assert semantic_cache.lookup_query("scope", asked) is None, (stored, asked)
+
+
+def test_store_merges_entries_written_by_other_processes(isolated_store, tmp_path, monkeypatch):
+    _fresh_cache(monkeypatch)
+    semantic_cache.store_query("scope", "first query", [])
+    # Another process starts from the file, not from this process's memory
+    monkeypatch.setattr(semantic_cache, "_loaded", False)
+    monkeypatch.setattr(semantic_cache, "_entries", [])
+    monkeypatch.setattr(semantic_cache, "_entry_tf", semantic_cache.term_frequencies([]))
+    semantic_cache.store_query("scope", "second query", [])
+
+    queries = {entry['query'] for entry in semantic_cache._read_entries()}
+    assert queries == {"first query", "second query"}
+    assert not [name for name in tmp_path.iterdir() if ".tmp" in name.name]
@@ -0,0 +1,64 @@
+import os
+import time
+import threading
+import pytest
+import artifacts
+import singleflight
+from cancellation import CancelToken, OperationCancelled, cancel_scope
+
+
+def test_only_json_native_results_are_shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLE_FLIGHT_DIR", str(tmp_path))
+    path = str(tmp_path / "key.json")
+
+    singleflight._write_shared(path, [{'start': 1.0, 'tags': ["a"]}, None])
+    assert singleflight._read_shared(path, 0)['value'] == [{'start': 1.0, 'tags': ["a"]}, None]
+
+    os.remove(path)
+    for value in ([object()], {'when': (1, 2)}, {1: "non-string key"}, {'nested': [object()]}):
+        singleflight._write_shared(path, value)
+        assert not os.path.exists(path)
+
+
+def test_waiting_caller_honours_its_own_cancellation(monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLE_FLIGHT_CROSS_PROCESS", False)
+    release = threading.Event()
+
+    @singleflight.single_flight
+    def slow(value):
+        release.wait(5)
+        return value
+
+    leader = threading.Thread(target=slow, args=("x",))
+    leader.start()
+    while not singleflight.get_single_flight_stats()['inflight']:
+        time.sleep(0.01)
+
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    with cancel_scope(token):
+        with pytest.raises(OperationCancelled):
+            slow("x")
+    assert time.monotonic() - started < 2
+    release.set()
+    leader.join()
+
+
+def test_gc_removes_only_idle_keyed_lock_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "LOCKS_DIR", str(tmp_path))
+    for name in ("singleflight-idle", "singleflight-busy", "semantic-cache", "encode-slot-0"):
+        (tmp_path / f"{name}.lock").touch()
+    old = time.time() - 3600
+    for path in tmp_path.iterdir():
+        os.utime(path, (old, old))
+
+    with artifacts.artifact_lock("singleflight-busy"):
+        os.utime(tmp_path / "singleflight-busy.lock", (old, old))
+        assert artifacts._remove_idle_locks(time.time()) == 1
+    # Fixed-name locks and the scheduler's slot files are never removed
+    assert sorted(os.listdir(tmp_path)) == ["encode-slot-0.lock", "semantic-cache.lock", "singleflight-busy.lock"]
+
+    # The lock still works after its file was removed
+    with artifacts.artifact_lock("singleflight-idle"):
+        assert os.path.exists(tmp_path / "singleflight-idle.lock")
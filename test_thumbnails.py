@@ -0,0 +1,26 @@
+import subprocess
+import thumbnails
+
+
+def test_hls_variant_is_resolved_once_for_all_frames(tmp_path, monkeypatch):
+    resolved = []
+    commands = []
+
+    def select(url, max_height):
+        resolved.append((url, max_height))
+        return "https://cdn.example.com/v1/index.m3u8"
+
+    def run(cmd):
+        commands.append(cmd)
+        open(cmd[-2], "wb").close()
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(thumbnails, "select_hls_rendition", select)
+    monkeypatch.setattr(thumbnails, "run_ffmpeg", run)
+
+    thumbnails.build_thumbnail_sprite("https://cdn.example.com/master.m3u8", [1.0, 5.0, 9.0], cache_key="v1")
+
+    assert resolved == [("https://cdn.example.com/master.m3u8", thumbnails.THUMBNAIL_HEIGHT)]
+    inputs = [commands[0][i + 1] for i, arg in enumerate(commands[0]) if arg == '-i']
+    assert inputs == ["https://cdn.example.com/v1/index.m3u8"] * 3
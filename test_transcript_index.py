@@ -0,0 +1,71 @@
+import os
+import time
+from types import SimpleNamespace
+import transcript_index
+import utils
+
+
+SEGMENTS = [
+    {'start': 0.0, 'end': 4.0, 'text': "Welcome to the budget review"},
+    {'start': 4.0, 'end': 8.0, 'text': "the budget grew"},
+    {'start': 8.0, 'end': 12.0, 'text': "while hiring slowed down"},
+]
+
+
+def test_classify_query():
+    assert transcript_index.classify_query('"budget review"') == 'phrase'
+    assert transcript_index.classify_query("budget") == 'keyword'
+    assert transcript_index.classify_query("hiring budget") == 'keyword'
+    assert transcript_index.classify_query("where do they discuss the budget") == 'semantic'
+    assert transcript_index.classify_query("budget growth hiring plans") == 'semantic'
+
+
+def test_find_phrase_in_order_and_across_segments():
+    index = transcript_index.build_transcript_index(SEGMENTS)
+
+    hits = transcript_index.find_phrase(index, "v1", "the budget")
+    assert [hit['start_time'] for hit in hits] == [0.0, 3.0]
+    assert transcript_index.find_phrase(index, "v1", "budget the") == []
+    # "grew while" runs over the boundary between the second and third segment
+    spanning = transcript_index.find_phrase(index, "v1", "grew while")
+    assert len(spanning) == 1 and spanning[0]['end_time'] == 13.0
+    assert transcript_index.find_phrase(index, "v1", "budget cuts") == []
+
+
+class _Videos:
+    def __init__(self, transcription):
+        self.transcription = transcription
+        self.calls = 0
+
+    def retrieve(self, index_id, video_id, transcription):
+        self.calls += 1
+        return SimpleNamespace(transcription=self.transcription)
+
+
+def test_empty_transcript_is_fetched_again_after_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_index, "TRANSCRIPT_CACHE_DIR", str(tmp_path))
+    videos = _Videos([])
+    client = SimpleNamespace(indexes=SimpleNamespace(videos=videos))
+
+    assert transcript_index.get_transcript(client, "idx", "v1") == []
+    assert transcript_index.get_transcript(client, "idx", "v1") == []
+    assert videos.calls == 1
+
+    old = time.time() - transcript_index.EMPTY_TRANSCRIPT_TTL_SECONDS - 1
+    os.utime(transcript_index._transcript_path("idx", "v1"), (old, old))
+    videos.transcription = [SimpleNamespace(start=0.0, end=2.0, value="ready now")]
+    assert transcript_index.get_transcript(client, "idx", "v1") == [{'start': 0.0, 'end': 2.0, 'text': "ready now"}]
+    assert videos.calls == 2
+
+
+def test_auto_mode_merges_keyword_hits_with_remote_results(isolated_store, monkeypatch):
+    transcript_hit = dict(transcript_index._hit(transcript_index.build_transcript_index(SEGMENTS), "v1", 1, 1, 1.0))
+    remote_hit = {'start_time': 30.0, 'end_time': 35.0, 'score': 0.9, 'video_id': "v1", 'text': "", 'metadata': {},
+                  'confidence': "high", 'duration': 5.0}
+    monkeypatch.setattr(utils, "search_transcript", lambda *args: [transcript_hit])
+    monkeypatch.setattr(utils, "_search_remote", lambda *args: [remote_hit])
+
+    keyword = utils.search_video_content(None, "v1", "budget", use_cache=False)
+    assert sorted(hit['start_time'] for hit in keyword) == [3.0, 30.0]
+    phrase = utils.search_video_content(None, "v1", '"the budget"', use_cache=False)
+    assert [hit['start_time'] for hit in phrase] == [3.0]
@@ -0,0 +1,116 @@
+import io
+import json
+import time
+import threading
+import pytest
+from types import SimpleNamespace
+import utils
+from cancellation import CancelToken, OperationCancelled, cancel_scope
+from twelvelabs_stub import StubTwelveLabs
+
+
+def test_indexed_video_cache_evicts_deleted_videos(isolated_store, tmp_path):
+    client = StubTwelveLabs(videos=[{'id': "kept", 'duration': 60, 'filename': "a.mp4"}])
+    utils.remember_indexed_video("fp-kept", "basic", "kept", "00:00-Intro")
+    utils.remember_indexed_video("fp-gone", "basic", "deleted", "00:00-Intro")
+
+    assert utils.lookup_indexed_video("fp-kept", "basic", client)['video_id'] == "kept"
+    assert utils.lookup_indexed_video("fp-gone", "basic", client) is None
+    with open(tmp_path / "video_cache.json") as f:
+        assert list(json.load(f)) == [utils._video_cache_key("fp-kept", "basic")]
+
+
+def test_wait_for_task_stops_sleeping_when_cancelled():
+    client = StubTwelveLabs(indexing_seconds=60)
+    task = client.tasks.create(index_id="i", video_file=io.BytesIO(b"video"))
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    with cancel_scope(token):
+        with pytest.raises(OperationCancelled):
+            utils.wait_for_task(client, task.id, sleep_interval=30)
+    assert time.monotonic() - started < 5
+
+
+def test_wait_for_task_logs_failed_polls_and_retries(monkeypatch, caplog):
+    client = StubTwelveLabs()
+    task = client.tasks.create(index_id="i", video_file=io.BytesIO(b"video"))
+    polls = iter([SimpleNamespace(status="indexing"), ConnectionError("reset")])
+
+    def flaky_retrieve(task_id):
+        poll = next(polls, None)
+        if isinstance(poll, Exception):
+            raise poll
+        return poll or client._tasks_retrieve(task_id)
+
+    monkeypatch.setattr(client.tasks, "retrieve", flaky_retrieve)
+    with caplog.at_level("WARNING", logger="utils"):
+        assert utils.wait_for_task(client, task.id, sleep_interval=0).status == "ready"
+    assert [record.getMessage() for record in caplog.records] == [f"Retrieving task {task.id} failed, retrying: reset"]
+
+
+def test_cached_snippet_is_found_without_rendering(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "SNIPPET_CACHE_DIR", str(tmp_path))
+    assert utils.get_cached_snippet("v1", 10, 20, "Intro", "chapter") is None
+
+    path = utils.snippet_cache_path("v1", 10, 20)
+    with open(path, "wb") as f:
+        f.write(b"mp4")
+    snippet = utils.get_or_create_snippet("v1", 10, 20, "Intro", "chapter")
+    assert snippet == utils.get_cached_snippet("v1", 10, 20, "Intro", "chapter")
+    assert snippet['path'] == path and snippet['download_name'] == "chapter_intro_00_10-00_20.mp4"
+
+
+def _hit(start, end, score, video_id="v1", text=""):
+    return {'start_time': start, 'end_time': end, 'score': score, 'video_id': video_id, 'text': text}
+
+
+def test_merge_search_segments_joins_overlapping_hits_per_video():
+    hits = [_hit(0, 5, 0.4, text="first"), _hit(4, 8, 0.9, text="best"), _hit(8.5, 10, 0.2),
+            _hit(20, 25, 0.5), _hit(3, 6, 0.7, video_id="v2")]
+
+    merged = utils.merge_search_segments(hits, gap_tolerance=1.0)
+
+    assert [(m['video_id'], m['start_time'], m['end_time'], m['merged_count']) for m in merged] == [
+        ("v1", 0, 10, 3), ("v2", 3, 6, 1), ("v1", 20, 25, 1)
+    ]
+    # Descriptive fields come from the best member
+    assert merged[0]['text'] == "best" and merged[0]['duration'] == 10
+    assert [m['start_time'] for m in utils.merge_search_segments(hits, gap_tolerance=0)][:2] == [0, 3]
+
+
+def test_merge_search_segments_score_aggregations():
+    hits = [_hit(0, 2, 0.2), _hit(1, 9, 0.6)]
+    scores = {agg: utils.merge_search_segments(hits, score_agg=agg)[0]['score']
+              for agg in ("max", "mean", "sum", "duration_weighted")}
+    assert scores == pytest.approx({'max': 0.6, 'mean': 0.4, 'sum': 0.8, 'duration_weighted': 0.52})
+    with pytest.raises(ValueError):
+        utils.merge_search_segments(hits, score_agg="median")
+
+
+def test_collect_time_ranges_sorts_and_joins():
+    items = [
+        {'start_sec': 30, 'end_sec': 40},
+        {'start_time': 0.0, 'end_time': 10.0},
+        {'start_sec': 9, 'end_sec': 12},
+        {'start_time': 13.0, 'end_time': 15.0},
+        {'start_sec': 50, 'end_sec': 50},  # Empty ranges are dropped
+    ]
+    assert utils.collect_time_ranges(items) == [(0.0, 12.0), (13.0, 15.0), (30.0, 40.0)]
+    assert utils.collect_time_ranges(items, gap_tolerance=1.0) == [(0.0, 15.0), (30.0, 40.0)]
+
+
+def test_merge_top_k_caps_and_discounts_each_video():
+    hits_by_video = {
+        'long': [_hit(i, i + 1, score, video_id="long") for i, score in enumerate([0.95, 0.94, 0.93, 0.92])],
+        'short': [_hit(0, 1, 0.8, video_id="short")],
+        'empty': [],
+    }
+    merged = utils.merge_top_k(hits_by_video, max_results=4, per_video_k=3, diversity=0.8)
+    # long's second hit competes with 0.94 * 0.8 = 0.752, so short's 0.8 comes first
+    assert [(hit['video_id'], hit['score']) for hit in merged] == [
+        ("long", 0.95), ("short", 0.8), ("long", 0.94), ("long", 0.93)
+    ]
+
+    plain = utils.merge_top_k(hits_by_video, max_results=10, per_video_k=3, diversity=1.0)
+    assert [hit['score'] for hit in plain] == [0.95, 0.94, 0.93, 0.8]
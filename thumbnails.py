@@ -0,0 +1,126 @@
+import os
+import json
+import math
+import hashlib
+from probe import FFMPEG_BIN, is_hls_url, select_hls_rendition
+from artifacts import CACHE_DIR, atomic_output
+from scheduler import run_ffmpeg
+from perf import record_cache
+
+# Keyframe thumbnails for chapters, highlights and search hits.
+# All frames for one list of timestamps come out of a single ffmpeg run and are
+# packed into one sprite sheet, so a results page loads one small image instead
+# of one video player per item.
+
+THUMBNAIL_CACHE_DIR = os.path.join(CACHE_DIR, "thumbnails")
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_HEIGHT = 136  # ~16:9 tiles, kept even for yuv420p; other aspect ratios are letterboxed
+SPRITE_COLUMNS = 5
+SPRITE_FORMAT = os.getenv("THUMBNAIL_FORMAT", "jpg")  # "jpg" or "webp"
+
+
+def _sprite_cache_key(cache_key, times, width, height, columns):
+    raw = json.dumps([cache_key, [round(t, 2) for t in times], width, height, columns, SPRITE_FORMAT])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def build_thumbnail_sprite(source, times, cache_key=None, width=THUMBNAIL_WIDTH,
+                           height=THUMBNAIL_HEIGHT, columns=SPRITE_COLUMNS):
+    """
+    Extract one keyframe per timestamp and pack them into a cached sprite sheet.
+
+    Args:
+        source: Local video path, video URL or HLS URL
+        times: List of timestamps in seconds, one thumbnail each
+        cache_key: Stable identifier for the source (e.g. the video_id); HLS URLs
+            can carry expiring tokens, so the URL itself is a poor cache key
+        width: Tile width in pixels
+        height: Tile height in pixels
+        columns: Number of tiles per sprite row
+
+    Returns:
+        Dictionary with the sprite path and one tile box (x, y, width, height) per timestamp
+    """
+    if not times:
+        raise Exception("No timestamps given for thumbnail extraction")
+
+    os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+    key = _sprite_cache_key(cache_key or source, times, width, height, columns)
+    sprite_path = os.path.join(THUMBNAIL_CACHE_DIR, f"{key}.{SPRITE_FORMAT}")
+    manifest_path = os.path.join(THUMBNAIL_CACHE_DIR, f"{key}.json")
+
+    cached = os.path.exists(sprite_path) and os.path.exists(manifest_path)
+    record_cache("thumbnail_sprite", cached)
+    if cached:
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+
+    columns = min(columns, len(times))
+    rows = math.ceil(len(times) / columns)
+
+    # Every input would otherwise fetch the master playlist and let ffmpeg pick a
+    # variant; resolve the smallest rendition that still fills a tile once for all frames
+    if is_hls_url(source):
+        source = select_hls_rendition(source, height)
+
+    # One input per timestamp; -ss before -i with -noaccurate_seek lands on the
+    # nearest keyframe without decoding anything in between
+    cmd = [FFMPEG_BIN, '-v', 'error']
+    for t in times:
+        cmd += ['-noaccurate_seek', '-ss', f"{max(t, 0):.3f}", '-i', source]
+
+    filters = []
+    for i in range(len(times)):
+        filters.append(
+            f"[{i}:v:0]trim=end_frame=1,"
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease:force_divisible_by=2,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,setpts=N/TB[t{i}]"
+        )
+    tile_inputs = "".join(f"[t{i}]" for i in range(len(times)))
+    filters.append(f"{tile_inputs}concat=n={len(times)}:v=1:a=0,tile={columns}x{rows}[sprite]")
+
+    with atomic_output(sprite_path) as temp_path:
+        cmd += [
+            '-filter_complex', ";".join(filters),
+            '-map', '[sprite]',
+            '-frames:v', '1',
+            '-q:v', '4',
+            temp_path,
+            '-y'
+        ]
+
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0 or not os.path.exists(temp_path):
+            raise Exception(f"Thumbnail extraction failed: {result.stderr}")
+
+    sprite = {
+        'sprite': sprite_path,
+        'columns': columns,
+        'rows': rows,
+        'tiles': [
+            {
+                'time': t,
+                'x': (i % columns) * width,
+                'y': (i // columns) * height,
+                'width': width,
+                'height': height
+            }
+            for i, t in enumerate(times)
+        ]
+    }
+    with atomic_output(manifest_path) as temp_manifest:
+        with open(temp_manifest, "w") as manifest_file:
+            json.dump(sprite, manifest_file)
+
+    return sprite
+
+
+def crop_thumbnail(sprite, index):
+    """
+    Cut a single tile out of a sprite sheet as a PIL image.
+    """
+    from PIL import Image
+
+    tile = sprite['tiles'][index]
+    with Image.open(sprite['sprite']) as sheet:
+        return sheet.crop((tile['x'], tile['y'], tile['x'] + tile['width'], tile['y'] + tile['height']))
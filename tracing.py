@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import atexit
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Span-based tracing with an OpenTelemetry-compatible file exporter.
+# The current span lives in a context variable, so nested calls (a Q&A search, its
+# remote calls and ffmpeg runs) become parent/child spans of one trace, including
+# work handed to thread pools through contextvars.copy_context(). Finished traces
+# are appended to TRACE_FILE as OTLP/JSON lines, the format the OpenTelemetry
+# Collector's otlpjsonfile receiver reads (and Jaeger/Tempo import through it).
+# Tracing is off unless TRACE_FILE is set.
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "hootqna")
+
+# Spans are written when their trace's root ends, or once this many are buffered
+TRACE_BUFFER_SPANS = 512
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_buffer = []
+
+
+class Span:
+    def __init__(self, name, parent=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = str(error)[:500]
+        self.attributes['exception.type'] = type(error).__name__
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _export(self)
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans):
+    """OTLP/JSON ExportTraceServiceRequest for a list of finished spans."""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': "service.name", 'value': {'stringValue': SERVICE_NAME}},
+                {'key': "process.pid", 'value': {'intValue': str(os.getpid())}}
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': "tracing"},
+                'spans': [{
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_span_id or "",
+                    'name': span.name,
+                    'kind': span.kind,
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': [{'key': key, 'value': _attribute_value(value)}
+                                   for key, value in span.attributes.items() if value is not None],
+                    'status': {'code': span.status, 'message': span.status_message}
+                } for span in spans]
+            }]
+        }]
+    }
+
+
+def _export(span):
+    with _lock:
+        _buffer.append(span)
+        if span.parent_span_id is not None and len(_buffer) < TRACE_BUFFER_SPANS:
+            return
+        spans = _buffer[:]
+        _buffer.clear()
+    _write(spans)
+
+
+def _write(spans):
+    if not spans:
+        return
+    line = json.dumps(to_otlp(spans)) + "\n"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(TRACE_FILE)), exist_ok=True)
+        # One append per batch; O_APPEND keeps lines from concurrent processes whole
+        with open(TRACE_FILE, "a") as trace_file:
+            trace_file.write(line)
+    except OSError as e:
+        print(f"Warning: could not write traces to {TRACE_FILE}: {str(e)}")
+
+
+def flush():
+    """Write buffered spans (e.g. of traces whose root is still open) to TRACE_FILE."""
+    with _lock:
+        spans = _buffer[:]
+        _buffer.clear()
+    _write(spans)
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def use_span(span):
+    """Make span the parent of spans started inside the block, without ending it."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def start_span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Start a child of the current span (or a new trace). The caller ends it, so this
+    suits spans that outlive one block, such as generators. None when tracing is off.
+    """
+    if not TRACE_FILE:
+        return None
+    return Span(name, _current_span.get(), kind, attributes)
+
+
+@contextmanager
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Run the block in a new span, a child of the current one. Exceptions mark the
+    span as failed and propagate. Yields the Span (None when tracing is off).
+    """
+    if not TRACE_FILE:
+        yield None
+        return
+    current = Span(name, _current_span.get(), kind, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+if TRACE_FILE:
+    atexit.register(flush)
@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from artifacts import CACHE_DIR, atomic_output
+from perf import record_cache
+
+# Local keyword search over video transcripts.
+# Each video's transcription is fetched from TwelveLabs once, stored on disk, and
+# turned into a positional inverted index (token -> global token positions), so
+# exact-phrase and keyword lookups are answered in-process in milliseconds.
+
+TRANSCRIPT_CACHE_DIR = os.path.join(CACHE_DIR, "transcripts")
+
+# Queries with at most this many content words (and no question words) are treated as keyword lookups
+KEYWORD_MAX_TERMS = 2
+
+# Seconds of context added around a phrase or keyword hit
+HIT_PADDING_SECONDS = 1.0
+
+# An empty transcript is usually one that is not ready yet, so it is fetched again after this long
+EMPTY_TRANSCRIPT_TTL_SECONDS = int(os.getenv("EMPTY_TRANSCRIPT_TTL_SECONDS", "300"))
+
+QUESTION_WORDS = {"who", "what", "when", "where", "why", "how", "which", "show", "find", "is", "are", "does", "do"}
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "about", "is", "are",
+    "i", "we", "you", "he", "she", "it", "they", "them", "me", "us"
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [token.strip("'") for token in TOKEN_PATTERN.findall((text or "").lower()) if token.strip("'")]
+
+
+def tokenize_content(query):
+    """Distinct query tokens without stopwords or question words, in order."""
+    return [token for token in dict.fromkeys(tokenize(query)) if token not in STOPWORDS and token not in QUESTION_WORDS]
+
+
+def classify_query(query):
+    """
+    Decide how a query should be answered.
+
+    Returns:
+        'phrase' for a quoted exact phrase, 'keyword' for short keyword lookups,
+        'semantic' for natural-language or visual questions (remote search)
+    """
+    stripped = query.strip()
+    if len(stripped) > 2 and stripped[0] == stripped[-1] and stripped[0] in ('"', "'"):
+        return 'phrase'
+    tokens = tokenize(stripped)
+    content = tokenize_content(stripped)
+    if content and len(content) <= KEYWORD_MAX_TERMS and not QUESTION_WORDS.intersection(tokens):
+        return 'keyword'
+    return 'semantic'
+
+
+def _transcript_path(index_id, video_id):
+    key = hashlib.sha1(f"{index_id}:{video_id}".encode()).hexdigest()[:20]
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.json")
+
+
+def _read_cached_transcript(path):
+    try:
+        with open(path, "r") as f:
+            segments = json.load(f)
+        if not segments and time.time() - os.path.getmtime(path) > EMPTY_TRANSCRIPT_TTL_SECONDS:
+            return None
+        return segments
+    except (OSError, ValueError):
+        return None
+
+
+def get_transcript(client, index_id, video_id):
+    """
+    Return a video's transcript segments, fetching them from TwelveLabs only the first time.
+
+    Returns:
+        List of dictionaries with start, end and text
+    """
+    path = _transcript_path(index_id, video_id)
+    segments = _read_cached_transcript(path)
+    record_cache("transcript", segments is not None)
+    if segments is not None:
+        return segments
+
+    try:
+        video = client.indexes.videos.retrieve(index_id=index_id, video_id=video_id, transcription=True)
+    except Exception as e:
+        raise Exception(f"Error fetching transcript: {str(e)}")
+
+    segments = [
+        {'start': item.start or 0.0, 'end': item.end or item.start or 0.0, 'text': item.value or ""}
+        for item in (getattr(video, 'transcription', None) or [])
+        if item.value
+    ]
+    os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+    with atomic_output(path) as temp_path:
+        with open(temp_path, "w") as f:
+            json.dump(segments, f)
+    return segments
+
+
+def build_transcript_index(segments):
+    """
+    Build a positional inverted index over transcript segments.
+
+    Token positions are global across the whole transcript, so a phrase that
+    runs over a segment boundary is still found.
+    """
+    postings = defaultdict(list)
+    token_segment = []  # global position -> segment number
+    for segment_number, segment in enumerate(segments):
+        for token in tokenize(segment['text']):
+            postings[token].append(len(token_segment))
+            token_segment.append(segment_number)
+    segment_frequency = {
+        token: len({token_segment[position] for position in positions})
+        for token, positions in postings.items()
+    }
+    return {
+        'segments': segments,
+        'postings': dict(postings),
+        'token_segment': token_segment,
+        'segment_frequency': segment_frequency
+    }
+
+
+def get_transcript_index(client, index_id, video_id):
+    """Inverted index for one video, built once per process from the cached transcript."""
+    with _indexes_lock:
+        if (index_id, video_id) in _indexes:
+            return _indexes[(index_id, video_id)]
+    index = build_transcript_index(get_transcript(client, index_id, video_id))
+    # An empty transcript may still arrive; keep going through get_transcript()'s TTL
+    if index['segments']:
+        with _indexes_lock:
+            _indexes[(index_id, video_id)] = index
+    return index
+
+
+def _hit(index, video_id, first_segment, last_segment, score):
+    segments = index['segments']
+    start_time = max(segments[first_segment]['start'] - HIT_PADDING_SECONDS, 0)
+    end_time = segments[last_segment]['end'] + HIT_PADDING_SECONDS
+    return {
+        'start_time': start_time,
+        'end_time': end_time,
+        'confidence': "high" if score >= 0.75 else "medium",
+        'score': score,
+        'video_id': video_id,
+        'text': " ".join(segment['text'] for segment in segments[first_segment:last_segment + 1]),
+        'metadata': {},
+        'duration': end_time - start_time,
+        'source': 'transcript'
+    }
+
+
+def find_phrase(index, video_id, phrase, max_results=5):
+    """All occurrences of an exact phrase (in order), as search-result dictionaries."""
+    tokens = tokenize(phrase)
+    if not tokens or any(token not in index['postings'] for token in tokens):
+        return []
+
+    # Intersect shifted position sets, rarest token first
+    candidates = None
+    for offset, token in sorted(enumerate(tokens), key=lambda item: len(index['postings'][item[1]])):
+        starts = {position - offset for position in index['postings'][token]}
+        candidates = starts if candidates is None else candidates & starts
+        if not candidates:
+            return []
+
+    hits = []
+    for start in sorted(candidates)[:max_results]:
+        first_segment = index['token_segment'][start]
+        last_segment = index['token_segment'][start + len(tokens) - 1]
+        hits.append(_hit(index, video_id, first_segment, last_segment, 1.0))
+    return hits
+
+
+def find_keywords(index, video_id, query, max_results=5):
+    """
+    Transcript segments ranked by TF-IDF over the query terms, favoring segments that contain all of them.
+    """
+    query_terms = tokenize_content(query)
+    terms = [term for term in query_terms if term in index['postings']]
+    if not terms:
+        return []
+
+    segment_count = len(index['segments'])
+    scores = defaultdict(float)
+    matched = defaultdict(set)
+    for term in terms:
+        idf = math.log(1 + segment_count / index['segment_frequency'][term])
+        for position in index['postings'][term]:
+            segment_number = index['token_segment'][position]
+            scores[segment_number] += idf
+            matched[segment_number].add(term)
+
+    total_terms = len(query_terms)
+    best = max(scores.values())
+    ranked = sorted(scores, key=lambda number: (len(matched[number]), scores[number]), reverse=True)
+    return [
+        # Coverage of the query terms dominates; TF-IDF orders segments with equal coverage
+        _hit(index, video_id, number, number,
+             round(len(matched[number]) / total_terms * (0.5 + 0.5 * scores[number] / best), 4))
+        for number in ranked[:max_results]
+    ]
+
+
+def search_transcript(client, index_id, video_id, query, max_results=5):
+    """
+    Answer a phrase or keyword query from the local transcript index of one video.
+
+    Args:
+        client: TwelveLabs client (used only the first time a transcript is needed)
+        index_id: Index the video belongs to
+        video_id: Video to search
+        query: Keywords, or an exact phrase in quotes
+        max_results: Maximum number of hits
+
+    Returns:
+        Search-result dictionaries shaped like search_video_content() results, with source='transcript'
+    """
+    index = get_transcript_index(client, index_id, video_id)
+    if classify_query(query) == 'phrase':
+        return find_phrase(index, video_id, query.strip()[1:-1], max_results)
+    phrase_hits = find_phrase(index, video_id, query, max_results)
+    return phrase_hits or find_keywords(index, video_id, query, max_results)
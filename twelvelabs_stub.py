@@ -0,0 +1,464 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from probe import probe_duration
+
+# Offline stand-in for the TwelveLabs client.
+# StubTwelveLabs answers the calls the app makes (search.query, summarize, analyze,
+# analyze_stream, tasks.*, indexes.videos.*) from recorded fixtures when one matches
+# and from deterministic synthetic data otherwise, with configurable latency and
+# injected errors. RecordingClient wraps a real client and writes its responses as
+# fixtures, so a live session can be replayed later without an API key.
+#
+# utils.make_client() returns the shared stub when TWELVELABS_STUB is set
+# ("1" for synthetic data only, or a fixture directory).
+
+STUB_LATENCY_MS = float(os.getenv("TWELVELABS_STUB_LATENCY_MS", "0"))
+STUB_ERROR_RATE = float(os.getenv("TWELVELABS_STUB_ERROR_RATE", "0"))
+STUB_SEED = int(os.getenv("TWELVELABS_STUB_SEED", "0"))
+STUB_HLS_URL = os.getenv("TWELVELABS_STUB_HLS_URL", "")
+
+PAGE_SIZE = 10
+SYNTHETIC_HITS_PER_VIDEO = 5
+TRANSCRIPT_SEGMENT_SECONDS = 5
+TOPIC_WORDS = [
+    "pricing", "recursion", "budget", "roadmap", "security", "latency", "onboarding", "revenue",
+    "database", "design", "hiring", "marketing", "testing", "deployment", "feedback", "strategy"
+]
+
+# Request arguments that do not change the response (or cannot be serialized)
+UNKEYED_ARGUMENTS = ("index_id", "video_file", "request_options", "sleep_interval", "callback")
+
+
+class StubApiError(Exception):
+    """Error raised by the stub in place of a failed API call."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def to_data(value):
+    """Convert an SDK response (pydantic models, pagers, streams) into plain JSON data."""
+    if hasattr(value, "model_dump"):
+        return to_data(value.model_dump())
+    if isinstance(value, SimpleNamespace):
+        return to_data(vars(value))
+    if isinstance(value, dict):
+        return {str(key): to_data(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_data(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "dict") and callable(value.dict):
+        return to_data(value.dict())
+    if hasattr(value, "__iter__") and not isinstance(value, (bytes, str)):
+        return [to_data(item) for item in value]
+    return str(value)
+
+
+def to_object(data):
+    """Plain data as attribute-accessible objects, like SDK responses."""
+    if isinstance(data, dict):
+        return SimpleNamespace(**{key: to_object(item) for key, item in data.items()})
+    if isinstance(data, list):
+        return [to_object(item) for item in data]
+    return data
+
+
+def request_key(kwargs):
+    keyed = {name: value for name, value in kwargs.items() if name not in UNKEYED_ARGUMENTS}
+    return hashlib.sha1(json.dumps(keyed, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class FixtureStore:
+    """
+    Recorded responses, one JSON file per endpoint: {"responses": {request_key: data}, "default": data}.
+    The "default" entry (the first recording, unless edited) answers requests without an exact match.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def _path(self, endpoint):
+        return os.path.join(self.directory, f"{endpoint}.json")
+
+    def _load(self, endpoint):
+        if endpoint not in self._files:
+            try:
+                with open(self._path(endpoint), "r") as f:
+                    self._files[endpoint] = json.load(f)
+            except (OSError, ValueError):
+                self._files[endpoint] = {'responses': {}, 'default': None}
+        return self._files[endpoint]
+
+    def lookup(self, endpoint, kwargs):
+        with self._lock:
+            fixture = self._load(endpoint)
+            return fixture['responses'].get(request_key(kwargs), fixture['default'])
+
+    def record(self, endpoint, kwargs, data):
+        with self._lock:
+            fixture = self._load(endpoint)
+            fixture['responses'][request_key(kwargs)] = data
+            if fixture['default'] is None:
+                fixture['default'] = data
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{self._path(endpoint)}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(fixture, f, indent=1)
+            os.replace(temp_path, self._path(endpoint))
+
+
+class _Namespace:
+    """Attribute group (client.search, client.indexes.videos, ...) bound to the stub's methods."""
+
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class StubTwelveLabs:
+    """
+    In-process double of the TwelveLabs client.
+
+    Args:
+        fixtures_dir: Directory of recorded fixtures (None for synthetic responses only)
+        latency_ms: Delay added to every remote call (and to every further search page)
+        jitter: Random +/- fraction applied to the latency
+        error_rate: Probability that a call fails with StubApiError
+        fail_endpoints: Endpoint names (e.g. "summarize") that always fail
+        seed: Seed for synthetic data, jitter and injected errors
+        hls_url: Streaming URL reported for every video (e.g. from stub_media.serve_test_hls)
+        indexing_seconds: Simulated time until an upload task is ready
+        videos: Initial catalog as dicts with id, duration and filename
+            (defaults to one 120 second video)
+    """
+
+    def __init__(self, fixtures_dir=None, latency_ms=0.0, jitter=0.0, error_rate=0.0, fail_endpoints=(),
+                 seed=0, hls_url=None, indexing_seconds=0.0, videos=None):
+        self.fixtures = FixtureStore(fixtures_dir) if fixtures_dir else None
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail_endpoints = set(fail_endpoints)
+        self.seed = seed
+        self.hls_url = hls_url
+        self.indexing_seconds = indexing_seconds
+        self.calls = Counter()
+        self.bytes_uploaded = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._tasks = {}
+        self._videos = {}
+        for number, video in enumerate(videos if videos is not None else
+                                       [{'id': "stub-video-1", 'duration': 120, 'filename': "sample_lecture.mp4"}]):
+            self._add_video(video['id'], video.get('duration', 120), video.get('filename', f"video_{number}.mp4"))
+
+        self.search = _Namespace(query=self._search_query)
+        self.tasks = _Namespace(create=self._tasks_create, retrieve=self._tasks_retrieve,
+                                wait_for_done=self._tasks_wait_for_done)
+        self.indexes = _Namespace(videos=_Namespace(list=self._videos_list, retrieve=self._videos_retrieve))
+
+
+    def _remote(self, endpoint):
+        """Account for one remote call: count it, wait the configured latency, maybe fail."""
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency_ms / 1000 * (1 + self._random.uniform(-self.jitter, self.jitter))
+            fail = endpoint in self.fail_endpoints or self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise StubApiError(f"Injected error on {endpoint}")
+
+    def _fixture(self, endpoint, kwargs):
+        if self.fixtures is None:
+            return None
+        return self.fixtures.lookup(endpoint, kwargs)
+
+    def _rng(self, *parts):
+        return random.Random(":".join(str(part) for part in (self.seed,) + parts))
+
+    def _add_video(self, video_id, duration, filename):
+        self._videos[video_id] = {
+            'id': video_id,
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'indexed_at': time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'duration': float(duration),
+            'filename': filename
+        }
+
+    def _video(self, video_id):
+        video = self._videos.get(video_id)
+        if video is None:
+            raise StubApiError(f"Video {video_id} not found", status_code=404)
+        return video
+
+    def _pages(self, endpoint, items, page_limit=None):
+        # The real pagers fetch lazily page by page; each further page is another call
+        page_limit = page_limit or PAGE_SIZE
+        for position, item in enumerate(items):
+            if position and position % page_limit == 0:
+                self._remote(endpoint)
+            yield to_object(item)
+
+
+    def _search_query(self, index_id=None, query_text=None, search_options=None, filter=None,
+                      page_limit=None, group_by=None, **kwargs):
+        request = dict(kwargs, query_text=query_text, search_options=search_options, filter=filter,
+                       page_limit=page_limit, group_by=group_by)
+        self._remote("search.query")
+        recorded = self._fixture("search.query", request)
+        if recorded is not None:
+            return self._pages("search.query", recorded, page_limit)
+
+        video_ids = json.loads(filter).get("id", []) if filter else list(self._videos)
+        clips = []
+        for video_id in video_ids:
+            if video_id in self._videos:
+                clips += self._synthetic_clips(query_text or kwargs.get("query") or "", self._videos[video_id])
+        clips.sort(key=lambda clip: clip['score'], reverse=True)
+        for rank, clip in enumerate(clips, 1):
+            clip['rank'] = rank
+
+        if group_by == "video":
+            groups = {}
+            for clip in clips:
+                groups.setdefault(clip['video_id'], []).append(clip)
+            return self._pages("search.query", [{'id': video_id, 'clips': group} for video_id, group in groups.items()],
+                               page_limit)
+        return self._pages("search.query", clips, page_limit)
+
+    def _synthetic_clips(self, query, video):
+        rng = self._rng("search", query.lower().strip(), video['id'])
+        clips = []
+        for _ in range(SYNTHETIC_HITS_PER_VIDEO):
+            start = round(rng.uniform(0, max(video['duration'] - 10, 0)), 2)
+            end = round(min(start + rng.uniform(3, 10), video['duration']), 2)
+            score = round(rng.uniform(0.3, 0.95), 4)
+            clips.append({
+                'video_id': video['id'],
+                'start': start,
+                'end': end,
+                'score': score,
+                'confidence': "high" if score >= 0.75 else "medium" if score >= 0.5 else "low",
+                'thumbnail_url': None
+            })
+        return clips
+
+
+    def summarize(self, video_id=None, type=None, prompt=None, temperature=None, **kwargs):
+        request = dict(kwargs, video_id=video_id, type=type, prompt=prompt, temperature=temperature)
+        self._remote("summarize")
+        recorded = self._fixture("summarize", request)
+        if recorded is not None:
+            return to_object(recorded)
+
+        video = self._video(video_id)
+        rng = self._rng("summarize", video_id, type, prompt)
+        response = {'id': f"stub-{type}-{video_id}", 'usage': {'output_tokens': 0}}
+        if type == "chapter":
+            count = int(min(max(video['duration'] // 30, 2), 8))
+            length = video['duration'] / count
+            response['chapters'] = [
+                {
+                    'chapter_number': number,
+                    'start': round(number * length, 2),
+                    'end': round((number + 1) * length, 2),
+                    'start_sec': round(number * length, 2),
+                    'end_sec': round((number + 1) * length, 2),
+                    'chapter_title': f"Discussion of {rng.choice(TOPIC_WORDS)}",
+                    'chapter_summary': f"The speaker covers {rng.choice(TOPIC_WORDS)} and {rng.choice(TOPIC_WORDS)}."
+                }
+                for number in range(count)
+            ]
+        elif type == "highlight":
+            response['highlights'] = []
+            for _ in range(3):
+                start = round(rng.uniform(0, max(video['duration'] - 8, 0)), 2)
+                response['highlights'].append({
+                    'highlight': f"Key point about {rng.choice(TOPIC_WORDS)}",
+                    'start': start,
+                    'end': round(start + 6, 2),
+                    'start_sec': start,
+                    'end_sec': round(start + 6, 2)
+                })
+            response['highlights'].sort(key=lambda item: item['start_sec'])
+        else:
+            response['summary'] = f"A {int(video['duration'])} second video about {rng.choice(TOPIC_WORDS)}."
+        return to_object(response)
+
+    def _analysis_text(self, video_id, prompt):
+        rng = self._rng("analyze", video_id, prompt)
+        return " ".join(
+            f"Segment {number + 1} focuses on {rng.choice(TOPIC_WORDS)} and {rng.choice(TOPIC_WORDS)}."
+            for number in range(4)
+        )
+
+    def analyze(self, video_id=None, prompt=None, temperature=None, **kwargs):
+        request = dict(kwargs, video_id=video_id, prompt=prompt, temperature=temperature)
+        self._remote("analyze")
+        recorded = self._fixture("analyze", request)
+        if recorded is not None:
+            return to_object(recorded)
+        self._video(video_id)
+        return to_object({'id': f"stub-analysis-{video_id}", 'data': self._analysis_text(video_id, prompt),
+                          'usage': {'output_tokens': 0}})
+
+    def analyze_stream(self, video_id=None, prompt=None, temperature=None, **kwargs):
+        request = dict(kwargs, video_id=video_id, prompt=prompt, temperature=temperature)
+        self._remote("analyze_stream")
+        recorded = self._fixture("analyze_stream", request)
+        if recorded is not None:
+            return iter(to_object(recorded))
+        self._video(video_id)
+        words = self._analysis_text(video_id, prompt).split(" ")
+        events = [{'event_type': "stream_start"}]
+        events += [{'event_type': "text_generation", 'text': word + " "} for word in words]
+        events.append({'event_type': "stream_end"})
+        return iter(to_object(events))
+
+
+    def _tasks_create(self, index_id=None, video_file=None, enable_video_stream=True, **kwargs):
+        self._remote("tasks.create")
+        digest = hashlib.sha1()
+        size = 0
+        # Read the whole upload like the real client does, so benchmarks see its cost
+        for chunk in iter(lambda: video_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        path = getattr(video_file, "name", None)
+        try:
+            duration = probe_duration(path) if path and os.path.exists(path) else 60.0
+        except Exception:
+            duration = 60.0
+
+        video_id = f"stub-{digest.hexdigest()[:12]}"
+        with self._lock:
+            self.bytes_uploaded += size
+            self._add_video(video_id, duration, os.path.basename(path or "upload.mp4"))
+            task_id = f"task-{len(self._tasks) + 1}"
+            self._tasks[task_id] = {'id': task_id, 'video_id': video_id, 'created': time.time()}
+        return to_object({'id': task_id, 'video_id': video_id, 'status': "pending"})
+
+    def _tasks_retrieve(self, task_id, **kwargs):
+        self._remote("tasks.retrieve")
+        task = self._tasks.get(task_id)
+        if task is None:
+            raise StubApiError(f"Task {task_id} not found", status_code=404)
+        ready = time.time() - task['created'] >= self.indexing_seconds
+        return to_object({'id': task_id, 'video_id': task['video_id'], 'status': "ready" if ready else "indexing"})
+
+    def _tasks_wait_for_done(self, task_id, sleep_interval=5.0, callback=None, **kwargs):
+        # Polls like the SDK, but never sleeps past the simulated indexing time
+        while True:
+            task = self._tasks_retrieve(task_id)
+            if callback:
+                callback(task)
+            if task.status in ("ready", "failed"):
+                return task
+            remaining = self.indexing_seconds - (time.time() - self._tasks[task_id]['created'])
+            time.sleep(max(min(sleep_interval, remaining), 0.01))
+
+
+    def _video_response(self, video, transcription=False):
+        response = {
+            'id': video['id'],
+            'created_at': video['created_at'],
+            'indexed_at': video['indexed_at'],
+            'duration': video['duration'],
+            'metadata': {'filename': video['filename'], 'duration': video['duration']},
+            'hls': {'video_url': self.hls_url, 'status': "COMPLETE"} if self.hls_url else None
+        }
+        if transcription:
+            rng = self._rng("transcript", video['id'])
+            response['transcription'] = [
+                {
+                    'start': float(start),
+                    'end': float(min(start + TRANSCRIPT_SEGMENT_SECONDS, video['duration'])),
+                    'value': f"Now we talk about {rng.choice(TOPIC_WORDS)} and why {rng.choice(TOPIC_WORDS)} matters."
+                }
+                for start in range(0, int(video['duration']), TRANSCRIPT_SEGMENT_SECONDS)
+            ]
+        return response
+
+    def _videos_retrieve(self, index_id=None, video_id=None, transcription=False, **kwargs):
+        request = dict(kwargs, video_id=video_id, transcription=transcription)
+        self._remote("indexes.videos.retrieve")
+        recorded = self._fixture("indexes.videos.retrieve", request)
+        if recorded is not None:
+            return to_object(recorded)
+        return to_object(self._video_response(self._video(video_id), transcription))
+
+    def _videos_list(self, index_id=None, page=1, page_limit=None, **kwargs):
+        request = dict(kwargs, page=page, page_limit=page_limit)
+        self._remote("indexes.videos.list")
+        recorded = self._fixture("indexes.videos.list", request)
+        if recorded is not None:
+            return self._pages("indexes.videos.list", recorded, page_limit)
+        videos = sorted(self._videos.values(), key=lambda video: video['created_at'], reverse=True)
+        return self._pages("indexes.videos.list", [self._video_response(video) for video in videos], page_limit)
+
+
+class RecordingClient:
+    """
+    Wrap a real client and save every response as a fixture for StubTwelveLabs.
+    Responses are returned in replayed form, so a recording run behaves like a replay.
+    """
+
+    def __init__(self, client, fixtures_dir, _prefix="", _store=None):
+        self._target = client
+        self._prefix = _prefix
+        self._store = _store or FixtureStore(fixtures_dir)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        endpoint = f"{self._prefix}{name}"
+        if not callable(attribute):
+            return RecordingClient(attribute, None, f"{endpoint}.", self._store)
+
+        def call(*args, **kwargs):
+            data = to_data(attribute(*args, **kwargs))
+            self._store.record(endpoint, kwargs, data)
+            replayed = to_object(data)
+            return iter(replayed) if isinstance(replayed, list) else replayed
+
+        return call
+
+
+_stub_client = None
+_stub_lock = threading.Lock()
+
+
+def get_stub_client():
+    """
+    Process-wide stub configured from the environment, so every part of the app
+    (including helpers that build their own client) sees the same uploads.
+    """
+    global _stub_client
+    with _stub_lock:
+        if _stub_client is None:
+            setting = os.getenv("TWELVELABS_STUB", "")
+            _stub_client = StubTwelveLabs(
+                fixtures_dir=setting if setting not in ("", "1") else None,
+                latency_ms=STUB_LATENCY_MS,
+                error_rate=STUB_ERROR_RATE,
+                seed=STUB_SEED,
+                hls_url=STUB_HLS_URL or None
+            )
+        return _stub_client
+
+
+def install_stub_client(client):
+    """Make utils.make_client() return this stub in the current process (benchmarks, tests)."""
+    global _stub_client
+    with _stub_lock:
+        _stub_client = client
+    return client
@@ -1,4 +1,13 @@
 import os
+import json
+import time
+import logging
+import hashlib
+import heapq
+import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 from moviepy.editor import VideoFileClip
 from twelvelabs import TwelveLabs
@@ -7,12 +16,40 @@ import io
 import m3u8
 from urllib.parse import urljoin
 import yt_dlp
+from probe import FFMPEG_BIN, probe_video, probe_duration, plan_cut, is_hls_url, select_hls_rendition
+from scheduler import ENCODE_SLOTS, encode_slot, run_ffmpeg
+from encode_profiles import (
+    DEFAULT_PROFILE, get_encode_profile, ffmpeg_encode_args, scale_filter, moviepy_write_kwargs,
+    record_encode_throughput
+)
+from semantic_cache import lookup_query, store_query
+from transcript_index import classify_query, search_transcript
+from singleflight import single_flight
+from perf import InstrumentedClient, instrument_module, record_cache, record_bytes
+from cancellation import (
+    OPERATION_DEADLINES, OperationCancelled, CancelToken, cancel_scope, cancellable, check_cancelled, current_token,
+    sleep_or_cancel
+)
+from artifacts import (
+    CACHE_DIR, job_dir, artifact_path, atomic_output, temp_path_for, artifact_lock,
+    touch_artifact, maybe_collect_garbage
+)
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-API_KEY = os.getenv("API_KEY") or os.getenv("TWELVE_LABS_API_KEY")
-INDEX_ID = os.getenv("INDEX_ID")
+# Offline mode: "1" (synthetic responses) or a fixture directory; see twelvelabs_stub.py
+TWELVELABS_STUB = os.getenv("TWELVELABS_STUB", "")
+TWELVELABS_RECORD_DIR = os.getenv("TWELVELABS_RECORD_DIR", "")
+
+API_KEY = os.getenv("API_KEY") or os.getenv("TWELVE_LABS_API_KEY") or ("stub" if TWELVELABS_STUB else None)
+INDEX_ID = os.getenv("INDEX_ID") or ("stub-index" if TWELVELABS_STUB else None)
+VIDEO_CACHE_PATH = os.getenv("VIDEO_CACHE_PATH", ".video_cache.json")
+FINGERPRINT_CHUNK_SIZE = 4 * 1024 * 1024  # Bytes hashed from the start, middle and end of a file
+SNIPPET_CACHE_DIR = os.path.join(CACHE_DIR, "snippets")
+TASK_POLL_SECONDS = 5  # Between status checks while a video is being indexed
 
 # Validate required environment variables
 if not API_KEY:
@@ -31,6 +68,21 @@ if not INDEX_ID:
         "INDEX_ID=your_index_id_here"
     )
 
+def make_client():
+    """
+    TwelveLabs client for this process: the offline stub when TWELVELABS_STUB is set,
+    otherwise the real client (recording fixtures when TWELVELABS_RECORD_DIR is set).
+    """
+    if TWELVELABS_STUB:
+        from twelvelabs_stub import get_stub_client
+        return InstrumentedClient(get_stub_client())
+    client = TwelveLabs(api_key=API_KEY)
+    if TWELVELABS_RECORD_DIR:
+        from twelvelabs_stub import RecordingClient
+        client = RecordingClient(client, TWELVELABS_RECORD_DIR)
+    return InstrumentedClient(client)
+
+
 def seconds_to_mmss(seconds):
     minutes, seconds = divmod(int(seconds), 60)
     return f"{minutes:02d}:{seconds:02d}"
@@ -47,25 +99,61 @@ def generate_timestamps(client, video_id, start_time=0):
     except Exception as e:
         raise Exception(f"An error occurred while generating timestamps: {str(e)}")
 
+# Utility function to cut a range out of a local file without re-encoding it
+def stream_copy_video(input_path, output_path, start_time, end_time=None):
+    cmd = [FFMPEG_BIN, '-ss', str(start_time), '-i', input_path]
+    if end_time is not None:
+        cmd += ['-t', str(end_time - start_time)]
+    cmd += [
+        '-map', '0:v:0?', '-map', '0:a:0?',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        '-movflags', '+faststart',
+        output_path,
+        '-y'
+    ]
+    result = run_ffmpeg(cmd, duration=end_time - start_time if end_time is not None else None)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg stream copy failed: {result.stderr}")
+
 # Utitily function to trim the video based on the time stamps
-def trim_video(input_path, output_path, start_time, end_time):
-    with VideoFileClip(input_path) as video:
-        new_video = video.subclip(start_time, end_time)
-        new_video.write_videofile(output_path, codec="libx264", audio_codec="aac")
+def trim_video(input_path, output_path, start_time, end_time, allow_stream_copy=True, profile=None):
+    # Cuts that land on a keyframe of an MP4-friendly source are stream-copied instead of re-encoded
+    if allow_stream_copy:
+        try:
+            plan = plan_cut(probe_video(input_path), start_time, end_time)
+            if plan['mode'] == 'copy':
+                stream_copy_video(input_path, output_path, plan['start_ms'] / 1000, end_time)
+                return
+        except OperationCancelled:
+            raise
+        except Exception:
+            pass  # Fall back to the full MoviePy re-encode below
+
+    with encode_slot():
+        # A MoviePy encode cannot be interrupted once started; check before committing to it
+        check_cancelled()
+        encode_started = time.time()
+        with VideoFileClip(input_path) as video:
+            new_video = video.subclip(start_time, end_time)
+            new_video.write_videofile(output_path, **moviepy_write_kwargs(profile))
+            record_encode_throughput(profile, new_video.duration, time.time() - encode_started)
 
 # Based on the speicific Index_ID, fetching all the video_id
+@single_flight
 def fetch_existing_videos():
     try:
-        client = TwelveLabs(api_key=API_KEY)
+        client = make_client()
         videos_pager = client.indexes.videos.list(index_id=INDEX_ID, page=1, page_limit=10, sort_by="created_at", sort_option="desc")
         return [video for video in videos_pager]
     except Exception as e:
         raise Exception(f"Failed to fetch videos: {str(e)}")
 
 # Utility function to retrieve the URL of the video with video_id
-def get_video_url(video_id):
+@single_flight
+def get_video_url(video_id, client=None):
     try:
-        client = TwelveLabs(api_key=API_KEY)
+        client = client or make_client()
         video = client.indexes.videos.retrieve(index_id=INDEX_ID, video_id=video_id)
         
         # Check if HLS video URL is available
@@ -78,33 +166,134 @@ def get_video_url(video_id):
         raise Exception(f"Failed to get video URL: {str(e)}")
 
 
+# Utility function to fingerprint an uploaded video without reading the whole file
+def fingerprint_video(video_path, duration):
+    """
+    Compute a fast content fingerprint for a local video file.
+    Only the first, middle and last chunks are hashed, combined with the
+    file size and duration, so large uploads are fingerprinted in milliseconds.
+    """
+    size = os.path.getsize(video_path)
+    hasher = hashlib.sha256()
+    with open(video_path, "rb") as video_file:
+        for offset in (0, size // 2, size - FINGERPRINT_CHUNK_SIZE):
+            video_file.seek(max(offset, 0))
+            hasher.update(video_file.read(FINGERPRINT_CHUNK_SIZE))
+    hasher.update(f"{size}:{duration:.2f}".encode())
+    return hasher.hexdigest()
+
+def load_video_cache():
+    if not os.path.exists(VIDEO_CACHE_PATH):
+        return {}
+    try:
+        with open(VIDEO_CACHE_PATH, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        # A corrupted cache only costs a re-index, never a failed upload
+        return {}
+
+def save_video_cache(cache):
+    with atomic_output(VIDEO_CACHE_PATH) as temp_path:
+        with open(temp_path, "w") as cache_file:
+            json.dump(cache, cache_file, indent=2)
+
+# Cache entries are scoped to the index and processing mode that produced them
+def _video_cache_key(fingerprint, video_type):
+    return f"{INDEX_ID}:{video_type}:{fingerprint}"
+
+def _update_video_cache(key, entry=None):
+    # Read-modify-write under a lock, so concurrent uploads never drop each other's entries
+    with artifact_lock("video-cache"):
+        cache = load_video_cache()
+        if entry is None:
+            if cache.pop(key, None) is None:
+                return
+        else:
+            cache[key] = entry
+        save_video_cache(cache)
+
+def lookup_indexed_video(fingerprint, video_type, client=None):
+    """
+    Return the cached indexing result for an uploaded video, if its video still exists.
+
+    A cheap retrieve confirms that the video was not deleted from the index since it
+    was cached; entries of deleted videos are evicted so the upload is indexed again.
+    """
+    key = _video_cache_key(fingerprint, video_type)
+    cached = load_video_cache().get(key)
+    if not cached:
+        return None
+    try:
+        (client or make_client()).indexes.videos.retrieve(index_id=INDEX_ID, video_id=cached['video_id'])
+    except Exception as e:
+        if getattr(e, 'status_code', None) in (404, 410):
+            _update_video_cache(key)
+        return None
+    return cached
+
+def remember_indexed_video(fingerprint, video_type, video_id, timestamps):
+    _update_video_cache(_video_cache_key(fingerprint, video_type), {
+        'video_id': video_id,
+        'timestamps': timestamps,
+        'indexed_at': time.time()
+    })
+
+
+def wait_for_task(client, task_id, sleep_interval=TASK_POLL_SECONDS):
+    """
+    Poll an indexing task until it is ready or failed.
+    Like the SDK's wait_for_done, but the sleep between polls ends as soon as the work is cancelled.
+    """
+    task = client.tasks.retrieve(task_id)
+    while task.status not in ("ready", "failed"):
+        sleep_or_cancel(sleep_interval)
+        try:
+            task = client.tasks.retrieve(task_id)
+        except Exception as e:
+            logger.warning("Retrieving task %s failed, retrying: %s", task_id, e)
+    return task
+
+
 # Utility function to handle and process the video clips larger than 30 mins
-def process_video(client, video_path, video_type):
-    with VideoFileClip(video_path) as clip:
-        duration = clip.duration
+@cancellable("process_video")
+def process_video(client, video_path, video_type, job_id=None):
+    # Header-only probe; no need to spin up a MoviePy reader just for the duration
+    duration = probe_duration(video_path)
 
     if duration > 3600:
-        raise Exception("Video duration exceeds 1 hour. Please upload a shorter video.")
+        raise ValueError("Video duration exceeds 1 hour. Please upload a shorter video.")
+
+    # Duplicate uploads resolve to the already indexed video and its cached timestamps
+    fingerprint = fingerprint_video(video_path, duration)
+    cached = lookup_indexed_video(fingerprint, video_type, client)
+    record_cache("video_index", cached is not None)
+    if cached:
+        return cached['timestamps'], cached['video_id']
 
     if video_type == "Basic Video (less than 30 mins)":
         with open(video_path, "rb") as video_file:
             task = client.tasks.create(index_id=INDEX_ID, video_file=video_file, enable_video_stream=True)
         
-        task = client.tasks.wait_for_done(task_id=task.id, sleep_interval=5)
+        task = wait_for_task(client, task.id)
         if task.status == "ready":
             timestamps, _ = generate_timestamps(client, task.video_id)
+            remember_indexed_video(fingerprint, video_type, task.video_id, timestamps)
             return timestamps, task.video_id
         else:
             raise Exception(f"Indexing failed with status {task.status}")
     
     elif video_type == "Podcast (30 mins to 1 hour)":
-        trimmed_path = os.path.join(os.path.dirname(video_path), "trimmed_1.mp4")
-        trim_video(video_path, trimmed_path, 0, 1800)
-        
-        with open(trimmed_path, "rb") as video_file:
-            task1 = client.tasks.create(index_id=INDEX_ID, video_file=video_file, enable_video_stream=True)
-        task1 = client.tasks.wait_for_done(task_id=task1.id, sleep_interval=5)
-        os.remove(trimmed_path)
+        trimmed_path = artifact_path(job_id, "trimmed_1.mp4")
+        try:
+            trim_video(video_path, trimmed_path, 0, 1800)
+            check_cancelled()
+
+            with open(trimmed_path, "rb") as video_file:
+                task1 = client.tasks.create(index_id=INDEX_ID, video_file=video_file, enable_video_stream=True)
+            task1 = wait_for_task(client, task1.id)
+        finally:
+            if os.path.exists(trimmed_path):
+                os.remove(trimmed_path)
         
         if task1.status != "ready":
             raise Exception(f"Indexing failed with status {task1.status}")
@@ -112,13 +301,17 @@ def process_video(client, video_path, video_type):
         timestamps, end_time = generate_timestamps(client, task1.video_id)
         
         if duration > 1800:
-            trimmed_path = os.path.join(os.path.dirname(video_path), "trimmed_2.mp4")
-            trim_video(video_path, trimmed_path, 1800, int(duration))
-            
-            with open(trimmed_path, "rb") as video_file:
-                task2 = client.tasks.create(index_id=INDEX_ID, video_file=video_file, enable_video_stream=True)
-            task2 = client.tasks.wait_for_done(task_id=task2.id, sleep_interval=5)
-            os.remove(trimmed_path)
+            trimmed_path = artifact_path(job_id, "trimmed_2.mp4")
+            try:
+                trim_video(video_path, trimmed_path, 1800, int(duration))
+                check_cancelled()
+
+                with open(trimmed_path, "rb") as video_file:
+                    task2 = client.tasks.create(index_id=INDEX_ID, video_file=video_file, enable_video_stream=True)
+                task2 = wait_for_task(client, task2.id)
+            finally:
+                if os.path.exists(trimmed_path):
+                    os.remove(trimmed_path)
             
             if task2.status != "ready":
                 raise Exception(f"Indexing failed with status {task2.status}")
@@ -126,11 +319,22 @@ def process_video(client, video_path, video_type):
             timestamps_2, _ = generate_timestamps(client, task2.video_id, start_time=end_time)
             timestamps += "\n" + timestamps_2
         
+        remember_indexed_video(fingerprint, video_type, task1.video_id, timestamps)
         return timestamps, task1.video_id
 
 
 # Utility function to render the video on the UI
-def get_hls_player_html(video_url):
+def get_hls_player_html(video_url, markers=None, start_time=0):
+    """
+    Build the page's single HLS player. hls.js and the manifest are loaded once;
+    markers (dicts with 'time' in seconds and 'label') render as a clickable list
+    that seeks this player instead of spawning new ones; start_time (seconds) is
+    where the player is positioned once the stream is ready.
+    """
+    markers_json = json.dumps([
+        {'time': float(marker['time']), 'label': str(marker['label'])}
+        for marker in (markers or [])
+    ]).replace("</", "<\\/")  # Labels come from the API; keep them from closing the script tag
     return f"""
     <script src="https://cdn.jsdelivr.net/npm/hls.js@latest"></script>
     <style>
@@ -150,27 +354,72 @@ def get_hls_player_html(video_url):
             height: 100%;
             object-fit: contain;
         }}
+        #markers {{
+            list-style: none;
+            padding: 0;
+            margin: 8px 0 0 0;
+            font-family: sans-serif;
+            font-size: 14px;
+        }}
+        #markers li {{
+            cursor: pointer;
+            padding: 4px 8px;
+            border-radius: 6px;
+        }}
+        #markers li:hover {{
+            background: rgba(0, 0, 0, 0.08);
+        }}
     </style>
     <div id="video-container">
         <video id="video" controls></video>
     </div>
+    <ul id="markers"></ul>
     <script>
         var video = document.getElementById('video');
-        var videoSrc = "{video_url}";
+        var videoSrc = {json.dumps(video_url)};
+        var startTime = {float(start_time)};
+        var markers = {markers_json};
+        var ready = false;
+        var pendingSeek = startTime > 0 ? startTime : null;
+
+        function seekTo(seconds) {{
+            if (!ready) {{
+                pendingSeek = seconds;
+                return;
+            }}
+            video.currentTime = seconds;
+            video.play();
+        }}
+
+        function onReady() {{
+            ready = true;
+            if (pendingSeek !== null) {{
+                video.currentTime = pendingSeek;
+                pendingSeek = null;
+            }}
+            video.pause();
+        }}
+
         if (Hls.isSupported()) {{
             var hls = new Hls();
             hls.loadSource(videoSrc);
             hls.attachMedia(video);
-            hls.on(Hls.Events.MANIFEST_PARSED, function() {{
-                video.pause();
-            }});
+            hls.on(Hls.Events.MANIFEST_PARSED, onReady);
         }}
         else if (video.canPlayType('application/vnd.apple.mpegurl')) {{
             video.src = videoSrc;
-            video.addEventListener('loadedmetadata', function() {{
-                video.pause();
-            }});
+            video.addEventListener('loadedmetadata', onReady);
         }}
+
+        var list = document.getElementById('markers');
+        markers.forEach(function(marker) {{
+            var item = document.createElement('li');
+            var minutes = Math.floor(marker.time / 60);
+            var seconds = Math.floor(marker.time % 60);
+            item.textContent = (minutes < 10 ? '0' : '') + minutes + ':' + (seconds < 10 ? '0' : '') + seconds + '  ' + marker.label;
+            item.addEventListener('click', function() {{ seekTo(marker.time); }});
+            list.appendChild(item);
+        }});
     </script>
     """
 
@@ -180,8 +429,10 @@ def download_video_segment(video_id, start_time, end_time=None):
     if not video_url:
         raise Exception("Failed to get video URL")
 
+    # Segments live in the media playlists; a master playlist only lists variants
+    video_url = select_hls_rendition(video_url)
     playlist = m3u8.load(video_url)
-    
+
     start_seconds = mmss_to_seconds(start_time)
     end_seconds = mmss_to_seconds(end_time) if end_time else None
 
@@ -194,11 +445,21 @@ def download_video_segment(video_id, start_time, end_time=None):
         if end_seconds is not None and total_duration >= end_seconds:
             break
 
-    buffer = io.BytesIO()
+    # fMP4 segments are only playable after their init section (#EXT-X-MAP)
+    segment_uris = []
     for segment in segments_to_download:
-        segment_url = urljoin(video_url, segment.uri)
+        init_section = segment.init_section
+        if init_section is not None and init_section.uri and init_section.uri not in segment_uris:
+            segment_uris.append(init_section.uri)
+        segment_uris.append(segment.uri)
+
+    buffer = io.BytesIO()
+    for segment_uri in segment_uris:
+        check_cancelled()
+        segment_url = urljoin(video_url, segment_uri)
         response = requests.get(segment_url)
         if response.status_code == 200:
+            record_bytes("downloaded", len(response.content), "hls_segment")
             buffer.write(response.content)
         else:
             raise Exception(f"Failed to download segment: {segment_url}")
@@ -211,10 +472,14 @@ def download_video(url, output_filename):
     ydl_opts = {
         'format': 'best',
         'outtmpl': output_filename,
+        # Called for every downloaded chunk; raising aborts the download
+        'progress_hooks': [lambda _: check_cancelled()],
     }
     
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download([url])
+    if os.path.exists(output_filename):
+        record_bytes("downloaded", os.path.getsize(output_filename), "video_download")
 
 # Utitily Function to Parse the Segment
 def parse_segments(segment_text):
@@ -233,30 +498,107 @@ def parse_segments(segment_text):
 
 
 # Utiltiy function to segment the video
-def create_video_segments(video_url, segment_info):
-    full_video = "full_video.mp4"
+def create_video_segments(video_url, segment_info, job_id=None, profile=None):
+    work_dir = job_dir(job_id)
+    full_video = temp_path_for(os.path.join(work_dir, "full_video.mp4"))
     segments = parse_segments(segment_info)
+    # One deadline for the whole run; scopes never span a yield, since the consumer runs in between
+    token = CancelToken(OPERATION_DEADLINES['video_segments'] or None, parent=current_token())
 
     try:
         # Download the full video clip
-        download_video(video_url, full_video)
+        with cancel_scope(token):
+            download_video(video_url, full_video)
         
         for i, (start_time, end_time, description) in enumerate(segments):
-            output_file = f"{i+1:02d}_{description.replace(' ', '_').lower()}.mp4"
-            trim_video(full_video, output_file, start_time, end_time)
+            output_file = os.path.join(work_dir, f"{i+1:02d}_{description.replace(' ', '_').lower()}.mp4")
+            with cancel_scope(token), atomic_output(output_file) as temp_output:
+                token.raise_if_cancelled()
+                trim_video(full_video, temp_output, start_time, end_time, profile=profile)
             yield output_file, description
-        
-        os.remove(full_video)
     
     except yt_dlp.utils.DownloadError as e:
+        token.raise_if_cancelled()
         raise Exception(f"An error occurred while downloading: {str(e)}")
+    except OperationCancelled:
+        raise
     except Exception as e:
         raise Exception(f"An unexpected error occurred: {str(e)}")
+    finally:
+        if os.path.exists(full_video):
+            os.remove(full_video)
+        maybe_collect_garbage()
+
+
+# Utility function to cut a snippet straight out of an HLS stream with ffmpeg
+def cut_hls_snippet(video_url, start_time, end_time, output_filename, profile=None):
+    duration = end_time - start_time
+
+    # Read only the rendition the profile needs instead of whatever variant ffmpeg picks
+    if is_hls_url(video_url):
+        video_url = select_hls_rendition(video_url, get_encode_profile(profile)['max_height'])
+
+    # Stream copy when the cut starts on a segment boundary, otherwise re-encode
+    try:
+        plan = plan_cut(probe_video(video_url), start_time, end_time)
+    except Exception:
+        plan = {'mode': 'encode', 'start_ms': int(start_time * 1000)}
+
+    if plan['mode'] == 'copy':
+        copy_start = plan['start_ms'] / 1000
+        duration = end_time - copy_start
+        cmd = [
+            FFMPEG_BIN,
+            '-ss', str(copy_start),  # Input seeking: only the needed segments are fetched
+            '-i', video_url,
+            '-t', str(duration),
+            '-c', 'copy',
+            '-bsf:a', 'aac_adtstoasc',  # ADTS (MPEG-TS) audio to MP4 framing
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            output_filename,
+            '-y'
+        ]
+    else:
+        cmd = [
+            FFMPEG_BIN,
+            '-ss', str(start_time),
+            '-i', video_url,
+            '-t', str(duration),
+            # Re-encode with the requested speed/quality profile
+            *ffmpeg_encode_args(profile),
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',  # Optimize for web playback
+            output_filename,
+            '-y'  # Overwrite output file
+        ]
+
+    result = run_ffmpeg(cmd, duration=duration)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg failed: {result.stderr}")
+    if plan['mode'] != 'copy':
+        # run_seconds excludes the wait for an encode slot, which is not the profile's speed
+        record_encode_throughput(profile, duration, result.run_seconds)
+
+    # Verify the file was created and has content
+    if not os.path.exists(output_filename):
+        raise Exception("Output file was not created")
+
+    file_size = os.path.getsize(output_filename)
+    if file_size < 1000:  # Less than 1KB indicates a problem
+        raise Exception(f"Output file is too small ({file_size} bytes), likely corrupted")
+
+    return output_filename
 
 
 # QA Interface Functions
 
-def search_video_content(client, video_id=None, query="", max_results=5):
+# Transcript hits merged into remote results must match at least this share of the query
+TRANSCRIPT_MERGE_MIN_SCORE = 0.6
+
+
+@single_flight
+def search_video_content(client, video_id=None, query="", max_results=5, use_cache=True, search_mode="auto"):
     """
     Search for relevant content across videos based on a query.
     Uses TwelveLabs built-in search API - no manual embeddings needed.
@@ -266,7 +608,40 @@ def search_video_content(client, video_id=None, query="", max_results=5):
         video_id: If provided, search only within this video. If None, search across all videos in index
         query: Search query text
         max_results: Maximum number of results to return
+        use_cache: Answer near-duplicate queries from the local semantic cache
+            (cached results carry the original query in 'cached_from')
+        search_mode: 'auto' answers exact-phrase ("...") queries about one video from its local
+            transcript index and merges strong transcript hits into the remote results of every
+            other query; 'transcript' or 'remote' use only that side
     """
+    transcript_hits = []
+    if video_id and search_mode in ("auto", "transcript"):
+        try:
+            transcript_hits = search_transcript(client, INDEX_ID, video_id, query, max_results)
+        except Exception as e:
+            if search_mode == "transcript":
+                raise Exception(f"Error searching transcript: {str(e)}")
+            print(f"Warning: transcript search unavailable: {str(e)}")
+        # A quoted phrase asks for the spoken words; keywords may also be on screen, so they go remote too
+        if search_mode == "transcript" or (transcript_hits and classify_query(query) == 'phrase'):
+            return transcript_hits
+        transcript_hits = [hit for hit in transcript_hits if hit['score'] >= TRANSCRIPT_MERGE_MIN_SCORE]
+    
+    segments = _search_remote(client, video_id, query, max_results, use_cache)
+    if transcript_hits:
+        # Hits found by both sides collapse into one segment
+        segments = merge_search_segments(segments + transcript_hits, gap_tolerance=0)[:max_results]
+    return segments
+
+
+def _search_remote(client, video_id, query, max_results, use_cache):
+    cache_scope = f"{INDEX_ID}:{video_id or '*'}:{max_results}"
+    if use_cache:
+        cached = lookup_query(cache_scope, query)
+        record_cache("semantic_search", cached is not None)
+        if cached is not None:
+            return [dict(segment, cached_from=cached['matched_query']) for segment in cached['results']]
+    
     try:
         # TwelveLabs handles embeddings/vector search internally
         # Simple search call based on their documentation
@@ -284,27 +659,418 @@ def search_video_content(client, video_id=None, query="", max_results=5):
             # If video_id is specified, filter for that video only
             # If video_id is None, include results from all videos
             if (video_id is None or clip.video_id == video_id) and result_count < max_results:
-                segment_info = {
-                    'start_time': clip.start,
-                    'end_time': clip.end,
-                    'confidence': clip.confidence,
-                    'score': clip.score,
-                    'video_id': clip.video_id,  # Include video_id in results
-                    'text': getattr(clip, 'text', ''),  # May not always have text
-                    'metadata': getattr(clip, 'metadata', {}),
-                    'duration': clip.end - clip.start
-                }
-                segments.append(segment_info)
+                segments.append(_clip_to_segment(clip))
                 result_count += 1
         
         # Sort by score/confidence (highest first)
         segments.sort(key=lambda x: x.get('score', x.get('confidence', 0)), reverse=True)
+        if use_cache and segments:
+            store_query(cache_scope, query, segments)
         return segments
         
     except Exception as e:
         raise Exception(f"Error searching video content: {str(e)}")
 
 
+def _clip_to_segment(clip, video_id=None):
+    return {
+        'start_time': clip.start,
+        'end_time': clip.end,
+        'confidence': clip.confidence,
+        'score': clip.score,
+        'video_id': clip.video_id or video_id,  # Include video_id in results
+        'text': getattr(clip, 'text', ''),  # May not always have text
+        'metadata': getattr(clip, 'metadata', {}),
+        'duration': clip.end - clip.start
+    }
+
+
+# Cross-video search: hits kept per video, and how much each further hit from the same video is discounted
+FANOUT_PER_VIDEO_K = 3
+FANOUT_DIVERSITY = 0.8
+FANOUT_MAX_WORKERS = 8
+
+
+def merge_top_k(hits_by_video, max_results, per_video_k=FANOUT_PER_VIDEO_K, diversity=FANOUT_DIVERSITY):
+    """
+    Merge per-video hit lists into one global top-k with a heap.
+    
+    Each video contributes at most per_video_k hits, and its n-th hit competes with
+    score * diversity**n, so one long video cannot crowd out every other one.
+    
+    Args:
+        hits_by_video: Dictionary of video_id to that video's search results
+        max_results: Size of the merged list
+        per_video_k: Maximum hits taken from one video
+        diversity: Discount per additional hit from the same video (1.0 disables it)
+    
+    Returns:
+        Merged list of search results, in selection order
+    """
+    heap = []
+    for video_id, hits in hits_by_video.items():
+        top = heapq.nlargest(per_video_k, hits, key=lambda hit: hit.get('score') or 0)
+        if top:
+            heapq.heappush(heap, (-(top[0].get('score') or 0), video_id, 0, top))
+    
+    merged = []
+    while heap and len(merged) < max_results:
+        _, video_id, rank, top = heapq.heappop(heap)
+        merged.append(top[rank])
+        if rank + 1 < len(top):
+            next_score = (top[rank + 1].get('score') or 0) * diversity ** (rank + 1)
+            heapq.heappush(heap, (-next_score, video_id, rank + 1, top))
+    return merged
+
+
+def _search_one_video(client, video_id, query, per_video_k):
+    # Filtered to one video, so the first page already holds its best clips
+    search_pager = client.search.query(
+        index_id=INDEX_ID,
+        query_text=query,
+        search_options=["visual", "audio"],
+        filter=json.dumps({"id": [video_id]}),
+        page_limit=per_video_k
+    )
+    return [_clip_to_segment(clip, video_id) for clip in itertools.islice(search_pager, per_video_k)]
+
+
+def search_across_videos(client, query, video_ids=None, max_results=10,
+                         per_video_k=FANOUT_PER_VIDEO_K, diversity=FANOUT_DIVERSITY):
+    """
+    Search several videos with a per-video cap and a diversity-aware global top-k.
+    
+    Args:
+        client: TwelveLabs client instance
+        query: Search query text
+        video_ids: Subset of the catalog to search; each video is queried concurrently.
+            None searches the whole index with one query grouped by video.
+        max_results: Number of hits in the merged result
+        per_video_k: Maximum hits per video
+        diversity: Discount per additional hit from the same video
+    
+    Returns:
+        List of search results (same shape as search_video_content), best first
+    """
+    hits_by_video = {}
+    try:
+        if video_ids:
+            with ThreadPoolExecutor(max_workers=min(FANOUT_MAX_WORKERS, len(video_ids))) as executor:
+                futures = {
+                    executor.submit(contextvars.copy_context().run, _search_one_video, client, video_id, query,
+                                    per_video_k): video_id
+                    for video_id in video_ids
+                }
+                for future in as_completed(futures):
+                    try:
+                        hits_by_video[futures[future]] = future.result()
+                    except Exception as e:
+                        # One failing video should not sink the whole search
+                        print(f"Warning: search failed for video {futures[future]}: {str(e)}")
+        else:
+            # Grouped by video, each pager item is one video with its clips: reading
+            # max_results items answers "which videos match" without paging through every clip
+            search_pager = client.search.query(
+                index_id=INDEX_ID,
+                query_text=query,
+                search_options=["visual", "audio"],
+                group_by="video",
+                page_limit=max_results
+            )
+            for group in itertools.islice(search_pager, max_results):
+                hits_by_video[group.id] = [_clip_to_segment(clip, group.id) for clip in (group.clips or [])]
+    except Exception as e:
+        raise Exception(f"Error searching across videos: {str(e)}")
+    
+    return merge_top_k(hits_by_video, max_results, per_video_k, diversity)
+
+
+# How member scores combine into the score of a merged segment
+SCORE_AGGREGATIONS = {
+    'max': lambda scores, durations: max(scores),
+    'mean': lambda scores, durations: sum(scores) / len(scores),
+    'sum': lambda scores, durations: sum(scores),
+    'duration_weighted': lambda scores, durations: (
+        sum(score * duration for score, duration in zip(scores, durations)) / sum(durations)
+        if sum(durations) else max(scores)
+    )
+}
+
+
+def merge_search_segments(segments, gap_tolerance=1.0, score_agg="max"):
+    """
+    Merge overlapping or nearly adjacent search hits of the same video into consolidated segments.
+    
+    Args:
+        segments: Search results as returned by search_video_content()
+        gap_tolerance: Hits at most this many seconds apart are merged into one segment
+        score_agg: How member scores are combined: 'max', 'mean', 'sum' or 'duration_weighted'
+    
+    Returns:
+        List of merged segments (same keys as the input plus 'merged_count'), highest score first
+    """
+    if score_agg not in SCORE_AGGREGATIONS:
+        raise ValueError(f"Unknown score aggregation '{score_agg}'. Choose one of: {', '.join(SCORE_AGGREGATIONS)}")
+    
+    groups = []
+    for segment in sorted(segments, key=lambda s: (s['video_id'], s['start_time'])):
+        current = groups[-1] if groups else None
+        if (current and current['video_id'] == segment['video_id']
+                and segment['start_time'] <= current['end_time'] + gap_tolerance):
+            current['end_time'] = max(current['end_time'], segment['end_time'])
+            current['members'].append(segment)
+        else:
+            groups.append({
+                'video_id': segment['video_id'],
+                'start_time': segment['start_time'],
+                'end_time': segment['end_time'],
+                'members': [segment]
+            })
+    
+    merged = []
+    for group in groups:
+        scores = [member.get('score') or 0 for member in group['members']]
+        durations = [member['end_time'] - member['start_time'] for member in group['members']]
+        # Descriptive fields (text, confidence, metadata) come from the best member
+        best = max(group['members'], key=lambda member: member.get('score') or 0)
+        merged.append(dict(
+            best,
+            start_time=group['start_time'],
+            end_time=group['end_time'],
+            duration=group['end_time'] - group['start_time'],
+            score=SCORE_AGGREGATIONS[score_agg](scores, durations),
+            merged_count=len(group['members'])
+        ))
+    
+    merged.sort(key=lambda x: x.get('score') or 0, reverse=True)
+    return merged
+
+
+def create_highlight_reel(source, ranges, output_filename, profile=None):
+    """
+    Concatenate several time ranges of one video into a single MP4 with one ffmpeg encode.
+    
+    Args:
+        source: Local path, video URL or HLS URL
+        ranges: List of (start_time, end_time) tuples in seconds, in playback order
+        output_filename: Path of the reel
+        profile: Encode profile name
+    
+    Returns:
+        Path of the reel
+    """
+    if not ranges:
+        raise ValueError("No time ranges given for the highlight reel")
+    
+    if is_hls_url(source):
+        source = select_hls_rendition(source, get_encode_profile(profile)['max_height'])
+    try:
+        has_audio = probe_video(source, sample_keyframes=False)['audio_codec'] is not None
+    except Exception:
+        has_audio = True
+    
+    # One seeked input per range, so only the needed parts of the source are read and decoded
+    cmd = [FFMPEG_BIN, '-v', 'error']
+    for start_time, end_time in ranges:
+        cmd += ['-ss', f"{start_time:.3f}", '-t', f"{end_time - start_time:.3f}", '-i', source]
+    
+    inputs = "".join(f"[{i}:v:0][{i}:a:0]" if has_audio else f"[{i}:v:0]" for i in range(len(ranges)))
+    outputs = "[reel_v][a]" if has_audio else "[reel_v]"
+    filters = f"{inputs}concat=n={len(ranges)}:v=1:a={int(has_audio)}{outputs}"
+    filters += f";[reel_v]{scale_filter(profile) or 'null'}[v]"
+    
+    cmd += ['-filter_complex', filters, '-map', '[v]']
+    if has_audio:
+        cmd += ['-map', '[a]']
+    cmd += [*ffmpeg_encode_args(profile, scale=False), '-movflags', '+faststart', output_filename, '-y']
+    
+    reel_duration = sum(end - start for start, end in ranges)
+    result = run_ffmpeg(cmd, duration=reel_duration)
+    if result.returncode != 0 or not os.path.exists(output_filename):
+        raise Exception(f"Highlight reel encode failed: {result.stderr}")
+    record_encode_throughput(profile, reel_duration, result.run_seconds)
+    return output_filename
+
+
+def collect_time_ranges(items, gap_tolerance=0.0):
+    """
+    Turn chapters, highlights or search hits into sorted, non-overlapping (start, end) ranges.
+    
+    Args:
+        items: Dicts with start_sec/end_sec (generate_chapters, generate_highlights)
+            or start_time/end_time (search_video_content)
+        gap_tolerance: Ranges at most this many seconds apart are joined
+    
+    Returns:
+        List of (start_time, end_time) tuples in playback order
+    """
+    ranges = []
+    for item in items:
+        start_time = item.get('start_sec', item.get('start_time'))
+        end_time = item.get('end_sec', item.get('end_time'))
+        if start_time is None or end_time is None:
+            raise ValueError(f"Item has no start/end time: {item}")
+        if end_time > start_time:
+            ranges.append((float(start_time), float(end_time)))
+    
+    merged = []
+    for start_time, end_time in sorted(ranges):
+        if merged and start_time <= merged[-1][1] + gap_tolerance:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end_time))
+        else:
+            merged.append((start_time, end_time))
+    return merged
+
+
+def _concat_demux(list_entries, output_filename, work_dir):
+    # Concatenate already-compatible inputs with the concat demuxer, without re-encoding
+    list_path = temp_path_for(os.path.join(work_dir, "concat_list.txt"))
+    try:
+        with open(list_path, "w") as list_file:
+            for entry in list_entries:
+                list_file.write(entry + "\n")
+        cmd = [
+            FFMPEG_BIN, '-v', 'error',
+            '-f', 'concat', '-safe', '0',
+            '-i', list_path,
+            '-c', 'copy',
+            '-bsf:a', 'aac_adtstoasc',  # Harmless for MP4 audio, required for MPEG-TS parts
+            '-movflags', '+faststart',
+            output_filename,
+            '-y'
+        ]
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0 or not os.path.exists(output_filename):
+            raise Exception(f"Concat failed: {result.stderr}")
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def _concat_quote(path):
+    # Paths in a concat list are single-quoted; embedded quotes are escaped as '\''
+    return "'" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+
+def export_supercut(source, ranges, output_filename, profile=None, job_id=None):
+    """
+    Export several time ranges of one video as a single MP4.
+    
+    When every range starts on a keyframe (or HLS segment boundary) and the codecs
+    fit MP4, the ranges are stream-copied and joined with the concat demuxer, so
+    nothing is re-encoded. Otherwise they go through one encode (create_highlight_reel).
+    
+    Args:
+        source: Local path, video URL or HLS URL
+        ranges: List of (start_time, end_time) tuples, e.g. from collect_time_ranges()
+        output_filename: Path of the exported video
+        profile: Encode profile name, used for the rendition choice and the encode fallback
+        job_id: Artifact job whose directory holds the intermediate files
+    
+    Returns:
+        Dictionary with the output path, the mode used ('copy' or 'encode') and the ranges
+    """
+    if not ranges:
+        raise ValueError("No time ranges given for the export")
+    
+    if is_hls_url(source):
+        source = select_hls_rendition(source, get_encode_profile(profile)['max_height'])
+    try:
+        probe_info = probe_video(source)
+        plans = [plan_cut(probe_info, start_time, end_time) for start_time, end_time in ranges]
+    except Exception:
+        plans = []
+    
+    if not plans or any(plan['mode'] != 'copy' for plan in plans):
+        create_highlight_reel(source, ranges, output_filename, profile=profile)
+        return {'path': output_filename, 'mode': 'encode', 'ranges': ranges}
+    
+    work_dir = job_dir(job_id)
+    if os.path.exists(source) and not is_hls_url(source):
+        # Local file: the demuxer reads each range straight from the source, one pass in total
+        entries = []
+        for plan, (_, end_time) in zip(plans, ranges):
+            entries += [f"file {_concat_quote(source)}", f"inpoint {plan['start_ms'] / 1000:.3f}", f"outpoint {end_time:.3f}"]
+        _concat_demux(entries, output_filename, work_dir)
+        return {'path': output_filename, 'mode': 'copy', 'ranges': ranges}
+    
+    # Remote stream: copy each range out once (only its segments are fetched), then join the parts
+    parts = []
+    try:
+        for plan, (_, end_time) in zip(plans, ranges):
+            copy_start = plan['start_ms'] / 1000
+            part = temp_path_for(os.path.join(work_dir, f"supercut_part_{len(parts):02d}.ts"))
+            parts.append(part)
+            cmd = [
+                FFMPEG_BIN, '-v', 'error',
+                '-ss', str(copy_start),
+                '-i', source,
+                '-t', str(end_time - copy_start),
+                '-c', 'copy',
+                '-f', 'mpegts',
+                part,
+                '-y'
+            ]
+            result = run_ffmpeg(cmd, duration=end_time - copy_start)
+            if result.returncode != 0:
+                raise Exception(f"Copying range {copy_start:.1f}-{end_time:.1f}s failed: {result.stderr}")
+        _concat_demux([f"file {_concat_quote(part)}" for part in parts], output_filename, work_dir)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+    return {'path': output_filename, 'mode': 'copy', 'ranges': ranges}
+
+
+def create_supercut(video_url, items, title, job_id=None, profile=None):
+    """
+    Export chapters, highlights or search hits of one video as a single supercut file.
+    
+    Args:
+        video_url: Streaming URL of the video
+        items: Chapters, highlights and/or search hits (any mix)
+        title: Used in the file name
+        job_id: Artifact job the export belongs to
+        profile: Encode profile name
+    
+    Returns:
+        Dictionary with the output path, the mode used ('copy' or 'encode') and the ranges
+    """
+    try:
+        ranges = collect_time_ranges(items)
+        clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        clean_title = clean_title.replace(' ', '_').lower()[:30]
+        output_filename = artifact_path(job_id, f"supercut_{clean_title}_{len(ranges)}_ranges.mp4")
+        
+        with atomic_output(output_filename) as temp_output:
+            export = export_supercut(video_url, ranges, temp_output, profile=profile, job_id=job_id)
+        export['path'] = output_filename
+        return export
+    
+    except Exception as e:
+        raise Exception(f"Error creating supercut: {str(e)}")
+
+
+def create_qa_highlight_reel(video_url, segments, query, job_id=None, profile=None):
+    """
+    Build one highlight reel from search results, in playback order.
+    Overlapping hits should be merged first (merge_search_segments) so no second appears twice.
+    """
+    try:
+        ranges = sorted((segment['start_time'], segment['end_time']) for segment in segments)
+        clean_query = "".join(c for c in query if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        clean_query = clean_query.replace(' ', '_').lower()[:30]
+        output_filename = artifact_path(job_id, f"qa_reel_{clean_query}_{len(ranges)}_ranges.mp4")
+        
+        with atomic_output(output_filename) as temp_output:
+            create_highlight_reel(video_url, ranges, temp_output, profile=profile)
+        return output_filename
+    
+    except Exception as e:
+        raise Exception(f"Error creating highlight reel: {str(e)}")
+
+
+@single_flight
 def get_video_info(client, video_id):
     """
     Get video information including title/filename for display purposes.
@@ -336,28 +1102,46 @@ def get_video_info(client, video_id):
         raise Exception(f"Error searching video content: {str(e)}")
 
 
-def create_qa_video_snippet(video_url, start_time, end_time, query, snippet_index=1):
+def _qa_snippet_filename(work_dir, query, snippet_index, start_time, end_time):
+    # Clean query for filename
+    clean_query = "".join(c for c in query if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    clean_query = clean_query.replace(' ', '_').lower()[:30]  # Limit length
+    
+    # Create filename (replace colons with underscores for Windows compatibility)
+    start_mm_ss = seconds_to_mmss(start_time).replace(':', '_')
+    end_mm_ss = seconds_to_mmss(end_time).replace(':', '_')
+    return os.path.join(work_dir, f"qa_snippet_{snippet_index:02d}_{clean_query}_{start_mm_ss}-{end_mm_ss}.mp4")
+
+
+def _cut_snippet(source, start_time, end_time, output_filename, profile=None):
+    # HLS sources are cut in place (only the needed segments are fetched); local files are trimmed
+    with atomic_output(output_filename) as temp_output:
+        if is_hls_url(source):
+            cut_hls_snippet(source, start_time, end_time, temp_output, profile=profile)
+        else:
+            trim_video(source, temp_output, start_time, end_time, profile=profile)
+    return output_filename
+
+
+@cancellable("snippet")
+def create_qa_video_snippet(video_url, start_time, end_time, query, snippet_index=1, job_id=None, profile=None):
     """
     Create a video snippet based on search results.
     """
     try:
-        # Clean query for filename
-        clean_query = "".join(c for c in query if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        clean_query = clean_query.replace(' ', '_').lower()[:30]  # Limit length
-        
-        # Create filename
-        start_mm_ss = seconds_to_mmss(start_time)
-        end_mm_ss = seconds_to_mmss(end_time)
-        output_filename = f"qa_snippet_{snippet_index:02d}_{clean_query}_{start_mm_ss}-{end_mm_ss}.mp4"
+        work_dir = job_dir(job_id)
+        output_filename = _qa_snippet_filename(work_dir, query, snippet_index, start_time, end_time)
         
         # Download and trim video
-        temp_video = "temp_qa_video.mp4"
-        download_video(video_url, temp_video)
-        trim_video(temp_video, output_filename, start_time, end_time)
-        
-        # Clean up temp file
-        if os.path.exists(temp_video):
-            os.remove(temp_video)
+        temp_video = temp_path_for(os.path.join(work_dir, "qa_source.mp4"))
+        try:
+            download_video(video_url, temp_video)
+            with atomic_output(output_filename) as temp_output:
+                trim_video(temp_video, temp_output, start_time, end_time, profile=profile)
+        finally:
+            # Clean up temp file
+            if os.path.exists(temp_video):
+                os.remove(temp_video)
             
         return output_filename
         
@@ -365,6 +1149,82 @@ def create_qa_video_snippet(video_url, start_time, end_time, query, snippet_inde
         raise Exception(f"Error creating video snippet: {str(e)}")
 
 
+def stream_qa_snippets(video_url, segments, query, job_id=None, profile=None, max_workers=None, cancel_event=None):
+    """
+    Create snippets for a list of search results in parallel, yielding each one as soon as it is done.
+    
+    All cuts share one source: an HLS stream is resolved and probed once and then
+    cut in place, any other URL is downloaded once to the job directory.
+    
+    Args:
+        video_url: Streaming URL of the video the segments belong to
+        segments: Search results with 'start_time' and 'end_time'
+        query: Search query (used in file names)
+        job_id: Artifact job the snippets belong to
+        profile: Encode profile name
+        max_workers: Parallel cuts (defaults to the number of encode slots)
+        cancel_event: threading.Event; once set, no further cuts are started
+    
+    Cuts run under a child of the current cancellation token, so cancelling it (or closing
+    the generator) also kills the ffmpeg runs already in progress.
+    
+    Yields:
+        Dictionary with the result index (1-based), the segment, and either the snippet path or an error
+    """
+    cancel_event = cancel_event or threading.Event()
+    batch_token = CancelToken(parent=current_token())
+    work_dir = job_dir(job_id)
+    source = video_url
+    shared_download = None
+    executor = None
+    
+    try:
+        if is_hls_url(video_url):
+            source = select_hls_rendition(video_url, get_encode_profile(profile)['max_height'])
+        else:
+            shared_download = temp_path_for(os.path.join(work_dir, "qa_source.mp4"))
+            with cancel_scope(batch_token):
+                download_video(video_url, shared_download)
+            source = shared_download
+        
+        def cut(index, segment):
+            if cancel_event.is_set():
+                return None
+            output_filename = _qa_snippet_filename(work_dir, query, index, segment['start_time'], segment['end_time'])
+            with cancel_scope(batch_token):
+                return _cut_snippet(source, segment['start_time'], segment['end_time'], output_filename, profile)
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers or min(ENCODE_SLOTS, len(segments)) or 1)
+        # Each worker runs in a copy of the caller's context so encode_context() fairness still applies
+        futures = {
+            executor.submit(contextvars.copy_context().run, cut, index, segment): (index, segment)
+            for index, segment in enumerate(segments, 1)
+        }
+        for future in as_completed(futures):
+            if cancel_event.is_set():
+                break
+            batch_token.raise_if_cancelled()
+            index, segment = futures[future]
+            try:
+                yield {'index': index, 'segment': segment, 'path': future.result(), 'error': None}
+            except Exception as e:
+                yield {'index': index, 'segment': segment, 'path': None, 'error': str(e)}
+    
+    except OperationCancelled:
+        raise
+    except Exception as e:
+        raise Exception(f"Error creating video snippets: {str(e)}")
+    finally:
+        # Also reached when the consumer stops iterating (e.g. a Streamlit rerun)
+        cancel_event.set()
+        batch_token.cancel("snippet stream closed")
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if shared_download and os.path.exists(shared_download):
+            os.remove(shared_download)
+        maybe_collect_garbage()
+
+
 def format_qa_results(segments, query, client=None, include_rich_analysis=True):
     """
     Format search results for display in the UI with rich content analysis.
@@ -622,6 +1482,7 @@ def test_search_capability(client, video_id):
 
 # Enhanced Content Analysis Functions
 
+@single_flight
 def generate_summary(client, video_id, prompt=None, temperature=0.3):
     """
     Generate a concise summary of video content using TwelveLabs summarize API.
@@ -655,6 +1516,7 @@ def generate_summary(client, video_id, prompt=None, temperature=0.3):
         raise Exception(f"Error generating summary: {str(e)}")
 
 
+@single_flight
 def generate_chapters(client, video_id, prompt=None, temperature=0.3):
     """
     Generate chronological chapters with timestamps and headlines.
@@ -699,6 +1561,7 @@ def generate_chapters(client, video_id, prompt=None, temperature=0.3):
         raise Exception(f"Error generating chapters: {str(e)}")
 
 
+@single_flight
 def generate_highlights(client, video_id, prompt=None, temperature=0.3):
     """
     Generate the most significant events/highlights with timestamps.
@@ -757,18 +1620,8 @@ def generate_open_analysis(client, video_id, prompt, temperature=0.3, streaming=
     """
     try:
         if streaming:
-            # Use streaming response for real-time text generation
-            text_stream = client.analyze_stream(
-                video_id=video_id,
-                prompt=prompt,
-                temperature=temperature
-            )
-            
             # Collect streaming text
-            analysis_text = ""
-            for text in text_stream:
-                if text.event_type == "text_generation":
-                    analysis_text += text.text
+            analysis_text = "".join(stream_open_analysis(client, video_id, prompt, temperature))
             
             return {
                 'analysis': analysis_text,
@@ -798,6 +1651,23 @@ def generate_open_analysis(client, video_id, prompt, temperature=0.3, streaming=
         raise Exception(f"Error performing open-ended analysis: {str(e)}")
 
 
+def stream_open_analysis(client, video_id, prompt, temperature=0.3):
+    """
+    Yield the text of an open-ended analysis chunk by chunk as TwelveLabs generates it.
+    """
+    try:
+        text_stream = client.analyze_stream(
+            video_id=video_id,
+            prompt=prompt,
+            temperature=temperature
+        )
+        for text in text_stream:
+            if text.event_type == "text_generation":
+                yield text.text
+    except Exception as e:
+        raise Exception(f"Error streaming open-ended analysis: {str(e)}")
+
+
 def create_contextual_snippet_analysis(client, video_id, start_time, end_time, query):
     """
     Create a detailed analysis of a specific video segment based on the search query.
@@ -863,7 +1733,9 @@ def create_contextual_snippet_analysis(client, video_id, start_time, end_time, q
         }
 
 
-def create_analysis_video_snippet(video_url, start_time, end_time, title, snippet_type="analysis"):
+@cancellable("snippet")
+def create_analysis_video_snippet(video_url, start_time, end_time, title, snippet_type="analysis", job_id=None,
+                                  profile=None):
     """
     Create a video snippet for analysis results (chapters, highlights, etc.).
     Now handles HLS streaming URLs from TwelveLabs.
@@ -874,11 +1746,15 @@ def create_analysis_video_snippet(video_url, start_time, end_time, title, snippe
         end_time: End time in seconds (can be float)
         title: Title/description for the snippet
         snippet_type: Type of snippet (chapter, highlight, analysis)
+        job_id: Artifact job the snippet belongs to (a fresh job directory if None)
+        profile: Encode profile name (preview, share, archive)
     
     Returns:
-        Filename of the created snippet
+        Path of the created snippet
     """
     try:
+        work_dir = job_dir(job_id)
+
         # Clean title for filename
         clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
         clean_title = clean_title.replace(' ', '_').lower()[:40]  # Limit length
@@ -888,50 +1764,27 @@ def create_analysis_video_snippet(video_url, start_time, end_time, title, snippe
         end_mm_ss = seconds_to_mmss(end_time).replace(':', '_')
         duration = end_time - start_time
         
-        output_filename = f"{snippet_type}_{clean_title}_{start_mm_ss}-{end_mm_ss}_{duration:.1f}s.mp4"
+        output_filename = os.path.join(work_dir, f"{snippet_type}_{clean_title}_{start_mm_ss}-{end_mm_ss}_{duration:.1f}s.mp4")
         
         # Check if this is an HLS URL (from TwelveLabs streaming)
-        if video_url and '.m3u8' in video_url:
+        if is_hls_url(video_url):
             # Handle HLS streaming URL - use ffmpeg directly for HLS streams
             try:
-                # Use ffmpeg to extract segment from HLS stream with proper encoding
-                import subprocess
-                cmd = [
-                    'ffmpeg', 
-                    '-i', video_url,
-                    '-ss', str(start_time),
-                    '-t', str(duration),
-                    '-c:v', 'libx264',  # Re-encode video to ensure compatibility
-                    '-c:a', 'aac',      # Re-encode audio to ensure compatibility
-                    '-avoid_negative_ts', 'make_zero',
-                    '-movflags', '+faststart',  # Optimize for web playback
-                    output_filename,
-                    '-y'  # Overwrite output file
-                ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode != 0:
-                    raise Exception(f"FFmpeg failed: {result.stderr}")
-                
-                # Verify the file was created and has content
-                if not os.path.exists(output_filename):
-                    raise Exception("Output file was not created")
-                
-                file_size = os.path.getsize(output_filename)
-                if file_size < 1000:  # Less than 1KB indicates a problem
-                    raise Exception(f"Output file is too small ({file_size} bytes), likely corrupted")
-                        
+                with atomic_output(output_filename) as temp_output:
+                    cut_hls_snippet(video_url, start_time, end_time, temp_output, profile=profile)
             except Exception as e:
                 raise Exception(f"Could not create snippet from HLS stream: {str(e)}")
         else:
             # Handle regular video URLs (YouTube, etc.)
-            temp_video = f"temp_{snippet_type}_video.mp4"
-            download_video(video_url, temp_video)
-            trim_video(temp_video, output_filename, start_time, end_time)
-            
-            # Clean up temp file
-            if os.path.exists(temp_video):
-                os.remove(temp_video)
+            temp_video = temp_path_for(os.path.join(work_dir, f"{snippet_type}_source.mp4"))
+            try:
+                download_video(video_url, temp_video)
+                with atomic_output(output_filename) as temp_output:
+                    trim_video(temp_video, temp_output, start_time, end_time, profile=profile)
+            finally:
+                # Clean up temp file
+                if os.path.exists(temp_video):
+                    os.remove(temp_video)
             
         return output_filename
         
@@ -939,14 +1792,16 @@ def create_analysis_video_snippet(video_url, start_time, end_time, title, snippe
         raise Exception(f"Error creating {snippet_type} snippet: {str(e)}")
 
 
-def create_hls_snippet_alternative(video_id, start_time, end_time, title, snippet_type="analysis"):
+@cancellable("snippet")
+def create_hls_snippet_alternative(video_id, start_time, end_time, title, snippet_type="analysis", job_id=None,
+                                   profile=None, client=None):
     """
     Alternative method to create snippets from indexed TwelveLabs videos.
     Uses ffmpeg to properly handle HLS streams and create valid MP4 files.
     """
     try:
         # Get the HLS video URL for the indexed video
-        video_url = get_video_url(video_id)
+        video_url = get_video_url(video_id, client=client)
         if not video_url:
             raise Exception("Failed to get video URL for indexed video")
         
@@ -959,41 +1814,109 @@ def create_hls_snippet_alternative(video_id, start_time, end_time, title, snippe
         end_mm_ss = seconds_to_mmss(end_time).replace(':', '_')
         duration = end_time - start_time
         
-        output_filename = f"{snippet_type}_{clean_title}_{start_mm_ss}-{end_mm_ss}_{duration:.1f}s.mp4"
+        output_filename = artifact_path(job_id, f"{snippet_type}_{clean_title}_{start_mm_ss}-{end_mm_ss}_{duration:.1f}s.mp4")
         
         # Use ffmpeg to extract segment from HLS stream
-        import subprocess
-        cmd = [
-            'ffmpeg', 
-            '-i', video_url,
-            '-ss', str(start_time),
-            '-t', str(duration),
-            '-c:v', 'libx264',  # Re-encode video to ensure compatibility
-            '-c:a', 'aac',      # Re-encode audio to ensure compatibility
-            '-avoid_negative_ts', 'make_zero',
-            '-movflags', '+faststart',  # Optimize for web playback
-            output_filename,
-            '-y'  # Overwrite output file
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"FFmpeg failed: {result.stderr}")
-        
-        # Verify the file was created and has content
-        if not os.path.exists(output_filename):
-            raise Exception("Output file was not created")
-        
-        file_size = os.path.getsize(output_filename)
-        if file_size < 1000:  # Less than 1KB indicates a problem
-            raise Exception(f"Output file is too small ({file_size} bytes), likely corrupted")
-        
+        with atomic_output(output_filename) as temp_output:
+            cut_hls_snippet(video_url, start_time, end_time, temp_output, profile=profile)
         return output_filename
         
     except Exception as e:
         raise Exception(f"Error creating HLS snippet: {str(e)}")
 
 
+def snippet_cache_path(video_id, start_time, end_time, profile=None):
+    """
+    Location of the cached snippet for a (video_id, start, end, encode profile) range.
+    """
+    profile = profile or DEFAULT_PROFILE
+    key = hashlib.sha1(f"{video_id}:{float(start_time):.3f}:{float(end_time):.3f}:{profile}".encode()).hexdigest()[:20]
+    return os.path.join(SNIPPET_CACHE_DIR, f"{key}.mp4")
+
+
+def _snippet_entry(video_id, start_time, end_time, title, snippet_type, profile):
+    clean_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    clean_title = clean_title.replace(' ', '_').lower()[:40]
+    start_mm_ss = seconds_to_mmss(start_time).replace(':', '_')
+    end_mm_ss = seconds_to_mmss(end_time).replace(':', '_')
+    return {
+        'path': snippet_cache_path(video_id, start_time, end_time, profile),
+        'download_name': f"{snippet_type}_{clean_title}_{start_mm_ss}-{end_mm_ss}.mp4",
+        'cached': True
+    }
+
+
+def get_cached_snippet(video_id, start_time, end_time, title, snippet_type="analysis", profile=None):
+    """
+    Return the snippet for a range if it was already rendered (by any session), without rendering it.
+
+    Returns:
+        Dictionary like get_or_create_snippet() returns, or None when the range is not cached yet
+    """
+    snippet = _snippet_entry(video_id, start_time, end_time, title, snippet_type, profile)
+    if not os.path.exists(snippet['path']):
+        return None
+    touch_artifact(snippet['path'])
+    return snippet
+
+
+@cancellable("snippet")
+def get_or_create_snippet(video_id, start_time, end_time, title, snippet_type="analysis",
+                          profile=None, video_url=None, client=None):
+    """
+    Materialize a snippet on first use and serve it from the cache afterwards,
+    so the same range is never cut or encoded twice.
+
+    Args:
+        video_id: The unique identifier of the indexed video
+        start_time: Start time in seconds
+        end_time: End time in seconds
+        title: Title/description used for the download filename
+        snippet_type: Type of snippet (chapter, highlight, qa, analysis)
+        profile: Encode profile name the snippet is rendered with (part of the cache key)
+        video_url: Fallback source if the HLS stream cannot be cut directly
+        client: TwelveLabs client used to look up the stream (created from the environment if None)
+
+    Returns:
+        Dictionary with the cached file path, a friendly download name and whether it was a cache hit
+    """
+    cached = get_cached_snippet(video_id, start_time, end_time, title, snippet_type, profile)
+    record_cache("snippet", cached is not None)
+    if cached is not None:
+        return cached
+
+    snippet = _snippet_entry(video_id, start_time, end_time, title, snippet_type, profile)
+    os.makedirs(SNIPPET_CACHE_DIR, exist_ok=True)
+    # Per-range lock: concurrent sessions asking for the same range wait for one render
+    with artifact_lock(f"snippet-{os.path.basename(snippet['path'])}"):
+        if os.path.exists(snippet['path']):
+            touch_artifact(snippet['path'])
+            return snippet
+        try:
+            with atomic_output(snippet['path']) as temp_path:
+                try:
+                    hls_url = get_video_url(video_id, client=client)
+                    if not hls_url:
+                        raise Exception("Failed to get video URL for indexed video")
+                    cut_hls_snippet(hls_url, start_time, end_time, temp_path, profile=profile)
+                except OperationCancelled:
+                    raise
+                except Exception:
+                    if not video_url:
+                        raise
+                    # Fallback to URL-based method, then move its output into the cache
+                    created = create_analysis_video_snippet(video_url, start_time, end_time, title, snippet_type,
+                                                            profile=profile)
+                    os.replace(created, temp_path)
+        except Exception as e:
+            raise Exception(f"Error creating {snippet_type} snippet: {str(e)}")
+
+    maybe_collect_garbage(keep=[snippet['path']])
+    snippet['cached'] = False
+    return snippet
+
+
+@cancellable("batch_snippets")
 def batch_create_chapter_snippets(video_url, chapters_result):
     """
     Create video snippets for all chapters in a chapters result.
@@ -1009,6 +1932,7 @@ def batch_create_chapter_snippets(video_url, chapters_result):
     
     try:
         for chapter in chapters_result['chapters']:
+            check_cancelled()
             try:
                 snippet_filename = create_analysis_video_snippet(
                     video_url=video_url,
@@ -1027,6 +1951,8 @@ def batch_create_chapter_snippets(video_url, chapters_result):
                     'chapter_number': chapter['chapter_number']
                 })
                 
+            except OperationCancelled:
+                raise
             except Exception as e:
                 print(f"Error creating snippet for chapter {chapter['chapter_number']}: {str(e)}")
                 continue
@@ -1037,6 +1963,7 @@ def batch_create_chapter_snippets(video_url, chapters_result):
     return created_snippets
 
 
+@cancellable("batch_snippets")
 def batch_create_highlight_snippets(video_url, highlights_result):
     """
     Create video snippets for all highlights in a highlights result.
@@ -1052,6 +1979,7 @@ def batch_create_highlight_snippets(video_url, highlights_result):
     
     try:
         for i, highlight in enumerate(highlights_result['highlights'], 1):
+            check_cancelled()
             try:
                 snippet_filename = create_analysis_video_snippet(
                     video_url=video_url,
@@ -1070,6 +1998,8 @@ def batch_create_highlight_snippets(video_url, highlights_result):
                     'highlight_number': i
                 })
                 
+            except OperationCancelled:
+                raise
             except Exception as e:
                 print(f"Error creating snippet for highlight {i}: {str(e)}")
                 continue
@@ -1077,4 +2007,9 @@ def batch_create_highlight_snippets(video_url, highlights_result):
     except Exception as e:
         raise Exception(f"Error in batch highlight snippet creation: {str(e)}")
     
-    return created_snippets
\ No newline at end of file
+    return created_snippets
+
+# Time every function above (including calls between them); the tiny conversion
+# helpers run in tight loops and would only add noise
+instrument_module(globals(), exclude=("seconds_to_mmss", "mmss_to_seconds", "_clip_to_segment", "_concat_quote",
+                                      "_video_cache_key"))